@@ -22,3 +22,11 @@ print(msg)
 msg, _ = pipeline.string_array_step("sort words(by alphabet): 'my', 'hello', 'pen'")
 
 print(msg)
+
+answers, _ = pipeline.typed_batch({
+    "is_even": ("is 22 - 53 even?", bool),
+    "difference": ("22 - 53?", int),
+    "first_letter": ("first character of the word 'hello' is?", str),
+})
+
+print(answers)
@@ -1,29 +1,305 @@
 """An agent for executing user's instructions"""
 
+import asyncio
+import contextlib
+import functools
 import logging
+import time
 import uuid 
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_not_exception_type
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception
 
 from google.adk.sessions import InMemorySessionService
 from google.adk.sessions.base_session_service import GetSessionConfig
 from google.adk.runners import Runner
+from google.adk.events import Event
+from google.adk.models import LlmResponse
+from google.adk.agents.run_config import RunConfig, StreamingMode
 
 from google.genai import types as genai_types
 from google.api_core import exceptions as google_exceptions
 
-import threading
+from gemini_agents_toolkit import metrics as metric_names
+from gemini_agents_toolkit.llm import (HedgedLlm, ModelOptions, RateLimitedLlm, RetryingLlm, RetryPolicy, iter_llm_agents,
+                                       model_options, retry_listener, wrap_agent_models)
+from gemini_agents_toolkit.rate_limiter import default_rate_limiter
+from gemini_agents_toolkit.metrics import MetricsRecorder, estimate_tokens
+from gemini_agents_toolkit.prompt_cache import ContextCachedLlm
+from gemini_agents_toolkit.response_cache import ResponseCache
+from gemini_agents_toolkit.runner_pool import default_runner_pool
+from gemini_agents_toolkit.session_locks import SessionLockTable
+from gemini_agents_toolkit.tracing import TracedSessionService
 
 
-class TooManyFunctionCallsException(Exception):
-    def __init__(self,message):
+class TurnLimitExceeded(Exception):
+    """A turn was stopped by one of its limits, carries what the turn produced until then"""
+    code = "TURN_LIMIT_EXCEEDED"
+
+    def __init__(self, message, *, partial_response="", call_history=None):
         super().__init__(message)
+        self.partial_response = partial_response
+        self.call_history = call_history if call_history is not None else []
+
+
+class TooManyFunctionCallsException(TurnLimitExceeded):
+    code = "FUNCTION_CALL_LIMIT"
+
+
+class TurnTimeoutException(TurnLimitExceeded):
+    code = "TURN_TIMEOUT"
+
+
+class TokenBudgetExceededException(TurnLimitExceeded):
+    code = "TOKEN_BUDGET"
+
+
+@dataclass
+class StreamChunk:
+    """A piece of the response yielded by ADKAgentService.send_message_stream"""
+    TEXT = "text"
+    TOOL_CALL = "tool_call"
+    TOOL_RESPONSE = "tool_response"
+    FINAL = "final"
+
+    kind: str
+    # partial text for TEXT, tool name for TOOL_CALL/TOOL_RESPONSE, full response for FINAL
+    text: str = ""
+    # the ADK event the chunk was produced from, None for FINAL
+    event: object = None
+    # events returned by the turn, only set for FINAL
+    events: list = None
+
+
+@dataclass
+class BatchItemResult:
+    """Result of one message of ADKAgentService.send_messages"""
+    index: int
+    response: str = None
+    events: list = None
+    # the exception raised while sending the message, None if it succeeded
+    error: Exception = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+@dataclass
+class BatchResult:
+    """Results of ADKAgentService.send_messages in the order of the input batch plus aggregate stats"""
+    results: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def succeeded(self):
+        return sum(1 for result in self.results if result.ok)
+
+    @property
+    def failed(self):
+        return len(self.results) - self.succeeded
+
+    @property
+    def throughput(self):
+        """Messages per second over the whole batch"""
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+
+def _group_batch(batch):
+    """Splits a send_messages batch into groups that have to run sequentially.
+
+    Messages for the same (user_id, session_id) form one group in their input order, messages without
+    a session_id go to new sessions and get a group each.
+    """
+    groups = {}
+    for index, item in enumerate(batch):
+        kwargs = {"msg": item} if isinstance(item, str) else dict(item)
+        session_id = kwargs.get("session_id")
+        key = (kwargs.get("user_id", "default_user"), session_id) if session_id else index
+        groups.setdefault(key, []).append((index, kwargs))
+    return list(groups.values())
+
+
+def _get_event_text(event):
+    """Returns the first text part of the event or None"""
+    if not event.content or not event.content.parts:
+        return None
+    return next((part.text for part in event.content.parts if part.text), None)
+
+
+def _partial_response_text(events):
+    """Joins the texts the agents produced so far, used when a turn ends before its final response"""
+    return "\n".join(filter(None, (_get_event_text(event) for event in events if event.author != "user")))
+
+
+def _error_category(e):
+    """Short name of the kind of error, used as a metrics label"""
+    if isinstance(e, google_exceptions.DeadlineExceeded):
+        return "deadline"
+    if isinstance(e, google_exceptions.GoogleAPIError):
+        return "api_error"
+    if isinstance(e, TooManyFunctionCallsException):
+        return "function_call_limit"
+    if isinstance(e, TurnTimeoutException):
+        return "turn_timeout"
+    if isinstance(e, TokenBudgetExceededException):
+        return "token_budget"
+    # Matched by name, not every google-genai release defines these exception types
+    error_type = type(e).__name__
+    if error_type == "BlockedPromptException":
+        return "blocked"
+    if error_type == "StopCandidateException":
+        return "stopped"
+    return "unexpected"
+
+
+def _chain_callback(name, ours, theirs):
+    """Combines our agent callback with the one the user already set.
+
+    Our before callbacks run first and may short-circuit the call, our after callbacks run last and
+    see the response as altered by the user's callback.
+    """
+    if theirs is None:
+        return ours
+    if name.startswith("before_"):
+        def chained(**kwargs):
+            result = ours(**kwargs)
+            return result if result is not None else theirs(**kwargs)
+        return chained
+
+    response_arg = "llm_response" if name == "after_model_callback" else "tool_response"
+
+    def chained(**kwargs):
+        altered = theirs(**kwargs)
+        if altered:
+            kwargs[response_arg] = altered
+        result = ours(**kwargs)
+        return result if result is not None else altered
+    return chained
+
+
+_AGENT_CALLBACKS = ("before_model_callback", "after_model_callback", "before_tool_callback", "after_tool_callback")
+
+
+class _AgentCallbacks:
+    """The model/tool callbacks installed once on an LlmAgent, shared by every service using the agent.
+
+    Each call goes to the service whose turn it belongs to. Services are held through weak references, so
+    services that are gone are dropped and do not slow down the calls. The callbacks the user set before
+    are kept in user_callbacks and chained as by _chain_callback.
+    """
+
+    def __init__(self, agent):
+        self.user_callbacks = {name: getattr(agent, name) for name in _AGENT_CALLBACKS}
+        self.services = weakref.WeakSet()
+        for name in _AGENT_CALLBACKS:
+            callback = _chain_callback(name, functools.partial(self._dispatch, name), self.user_callbacks[name])
+            # marks the callback as ours, a service finds the installed instance through it
+            callback.agent_callbacks = self
+            setattr(agent, name, callback)
+
+    @staticmethod
+    def of(agent):
+        """The _AgentCallbacks installed on the agent, installs them on first use"""
+        callbacks = getattr(agent.before_model_callback, "agent_callbacks", None)
+        return callbacks if isinstance(callbacks, _AgentCallbacks) else _AgentCallbacks(agent)
+
+    def _dispatch(self, name, **kwargs):
+        context = kwargs.get("callback_context") or kwargs.get("tool_context")
+        for service in list(self.services):
+            if service._turn_for_callback(context) is not None:
+                return getattr(service, f"_{name}")(**kwargs)
+        return None
+
+
+class _TurnState:
+    """Mutable state of a single send_message turn"""
+
+    def __init__(self, msg):
+        self.started = time.monotonic()
+        self.user_content = genai_types.Content(role='user', parts=[genai_types.Part(text=msg)])
+        self.final_response_text = ""
+        # Limits of the turn (None for no limit) and the usage counted against them
+        self.timeout = None
+        self.deadline = None
+        self.max_function_calls = None
+        self.max_tokens = None
+        self.function_calls = 0
+        self.tokens = 0
+        # The TurnLimitExceeded to raise once the runner stopped, set when a limit is hit
+        self.limit_error = None
+        # Set when the turn ended with an error, such turns are never cached
+        self.failed = False
+        self.from_cache = False
+        # Events produced during this turn: the user message followed by every complete runner event.
+        # The runner stores its own copy of the user message event, it is not yielded so we mirror it.
+        self.events = [Event(author="user", content=self.user_content)]
+        # model calls in flight: agent name -> (start time, model, estimated prompt tokens, span)
+        self.model_calls = {}
+        # tool calls in flight: function call id -> (start time, span)
+        self.tool_calls = {}
+        # The session as fetched before the turn
+        self.session = None
+        # Set once the runner was called, from then on the turn must not be replayed
+        self.runner_started = False
+        # tracing.Trace of the turn, None when the service has no tracer or the turn was not sampled
+        self.trace = None
+        # tools offered in the running model call: agent name -> {tool name: tool}
+        self.tools = {}
+        # tool calls started concurrently by tools.ToolConcurrency: function call id -> Future
+        self.prefetched = {}
+        # JSON schema the final answer has to follow, requested from model calls that offer no tools
+        self.response_schema = None
+
+    def set_limits(self, *, timeout, max_function_calls, max_tokens):
+        self.timeout = timeout
+        self.deadline = self.started + timeout if timeout is not None else None
+        self.max_function_calls = max_function_calls
+        self.max_tokens = max_tokens
+
+    def check_limits(self):
+        """Returns the TurnLimitExceeded of the turn if one of its limits is hit, None otherwise"""
+        if self.limit_error is None:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                self.limit_error = TurnTimeoutException(f"Turn exceeded its timeout of {self.timeout}s")
+            elif self.max_tokens is not None and self.tokens >= self.max_tokens:
+                self.limit_error = TokenBudgetExceededException(
+                    f"Turn used {self.tokens} tokens, allowed: {self.max_tokens}")
+        return self.limit_error
+
+    def span(self, name, **attributes):
+        """Context manager timing a part of the turn, does nothing when the turn is not traced"""
+        return self.trace.span(name, **attributes) if self.trace else contextlib.nullcontext()
+
+    def start_span(self, name, **attributes):
+        return self.trace.start_span(name, **attributes) if self.trace else None
+
+    def add_event(self, event):
+        if not self.events[0].invocation_id:
+            self.events[0].invocation_id = event.invocation_id
+        self.events.append(event)
 
 
 def log_retry_error(retry_state):
     """Logs the retry attempt details including the error message."""
     logging.error(f"Retrying {retry_state.fn.__name__}... Attempt #{retry_state.attempt_number}, "
                   f"Last error: {retry_state.outcome.exception()}")
+    args = getattr(retry_state, "args", None)
+    if isinstance(args, tuple) and args and isinstance(args[0], ADKAgentService):
+        service = args[0]
+        service.metrics.increment(metric_names.RETRIES, labels={"app": service.app_name, "scope": "turn"})
+
+
+def _should_replay_turn(e):
+    """Whether send_message can be run again after the error.
+
+    Only turns that failed before the runner started are replayed, failed model requests are retried
+    in place by RetryingLlm and replaying a turn that already ran would execute its tools again.
+    """
+    return not isinstance(e, TurnLimitExceeded) and not getattr(e, "runner_started", False)
 
 
 # pylint: disable-next=too-many-instance-attributes
@@ -39,21 +315,261 @@ class ADKAgentService:
             on_message=None,
             session_service=None,
             app_name="adk_service",
-            events_per_session=-1
+            events_per_session=-1,
+            max_concurrent_requests=None,
+            runner_pool=None,
+            response_cache=None,
+            metrics=None,
+            tracer=None,
+            retry_policy=None,
+            rate_limiter=None,
+            compaction=None,
+            tool_concurrency=None,
+            turn_timeout=None,
+            max_tokens_per_turn=None,
+            hedging=None,
+            context_cache=None
     ):
         logging.info("ADKAgentService initializing...")
         self.agent = agent
+        # Default limits of a turn, send_message* can override them per call. Limits are checked between
+        # model and tool calls, a turn that hits one is stopped and raises a TurnLimitExceeded
         self.function_call_limit_per_chat = function_call_limit_per_chat
+        self.turn_timeout = turn_timeout
+        self.max_tokens_per_turn = max_tokens_per_turn
         self.on_message = on_message
         self.session_service = session_service if session_service else InMemorySessionService()
-        self.runners = {}
+        # Runners are shared by all sessions (and by services using the same pool)
+        self.runner_pool = runner_pool if runner_pool else default_runner_pool
         self.app_name = app_name
-        # Lock for thread-safe access to runners dictionary during creation
-        self.runner_lock = threading.Lock()
+        # Turns on the same session are serialized in arrival order, different sessions run in parallel
+        self.session_locks = SessionLockTable()
+        # Optional ResponseCache, turns are only answered from the cache when it is set
+        self.response_cache = response_cache
         self.events_per_session = events_per_session
+        # Limits the number of turns send_message_async drives at once, semaphores are created
+        # lazily per event loop since asyncio primitives can not be shared between loops
+        self.max_concurrent_requests = max_concurrent_requests
+        self._async_semaphores = weakref.WeakKeyDictionary()
+        # Turns in progress by (user_id, session_id), agent callbacks use it to find the turn they belong to
+        self._active_turns = {}
+        # Metrics are only collected when a recorder (e.g. metrics.InProcessMetrics) is given
+        self.metrics = metrics if metrics is not None else MetricsRecorder()
+        # Failed model requests are retried in place and every request (retries included) waits for the
+        # rate limiter, the models of the agent's LlmAgents are wrapped for it. The wrappers are shared with other
+        # services on the agent, the model callbacks hand them this service's options for its turns
+        self.retry_policy = retry_policy if retry_policy else RetryPolicy()
+        self.rate_limiter = rate_limiter if rate_limiter else default_rate_limiter
+        wrap_agent_models(self.agent, RetryingLlm, policy=self.retry_policy)
+        wrap_agent_models(self.agent, RateLimitedLlm, innermost=True, limiter=self.rate_limiter)
+        # Optional prompt_cache.PrefixCacheManager, the static prefix of model requests is then read from the
+        # model's context cache instead of being sent with every request
+        self.context_cache = context_cache
+        if context_cache is not None:
+            wrap_agent_models(self.agent, ContextCachedLlm, innermost=True, manager=context_cache)
+        # Optional llm.HedgingPolicy, slow model requests (retries included) are then raced against its fallback model
+        self.hedging = hedging
+        fallback = None
+        if hedging is not None:
+            fallback = hedging.fallback_llm()
+            if context_cache is not None:
+                fallback = ContextCachedLlm(inner=fallback, model=fallback.model, manager=context_cache)
+            fallback = RateLimitedLlm(inner=fallback, model=fallback.model, limiter=self.rate_limiter)
+            wrap_agent_models(self.agent, HedgedLlm, fallback=fallback, policy=hedging)
+        self._model_options = ModelOptions(retry_policy=self.retry_policy, rate_limiter=self.rate_limiter,
+                                           context_cache=context_cache, hedging=hedging, hedge_fallback=fallback)
+        # Optional compaction.CompactionPolicy, long sessions are summarized in the background after a turn
+        self.compaction = compaction
+        # Optional tracing.Tracer, session service calls are traced through a wrapper of the session service
+        self.tracer = tracer
+        if tracer is not None:
+            self.session_service = TracedSessionService(self.session_service, self._find_trace)
+        # Optional tools.ToolConcurrency, the function calls of one model response then run concurrently
+        self.tool_concurrency = tool_concurrency
+        # LlmAgents whose tool calls may run concurrently, a user before_tool_callback must see every call
+        self._concurrent_tool_agents = set()
+        # The callbacks enforce the turn limits, so they are installed even without metrics or tracing
+        self._install_agent_callbacks()
         logging.info(f"ADKAgentService initialized with: app_name='{self.app_name}', "
                      f"function_call_limit_per_chat={self.function_call_limit_per_chat}, "
-                     f"events_per_session={self.events_per_session}")
+                     f"turn_timeout={self.turn_timeout}, max_tokens_per_turn={self.max_tokens_per_turn}, "
+                     f"events_per_session={self.events_per_session}, "
+                     f"max_concurrent_requests={self.max_concurrent_requests}")
+
+    def _install_agent_callbacks(self):
+        """Registers the service with the model/tool callbacks of every LlmAgent of the agent tree"""
+        for agent in iter_llm_agents(self.agent):
+            callbacks = _AgentCallbacks.of(agent)
+            callbacks.services.add(self)
+            if callbacks.user_callbacks["before_tool_callback"] is None:
+                self._concurrent_tool_agents.add(agent.name)
+
+    def _turn_for_callback(self, context):
+        """Returns the turn of this service an agent callback was called for, None for other services' turns"""
+        invocation_context = context._invocation_context
+        if invocation_context.session_service is not self.session_service:
+            return None
+        session = invocation_context.session
+        return self._active_turns.get((session.user_id, session.id))
+
+    def _find_trace(self, user_id, session_id):
+        turn = self._active_turns.get((user_id, session_id))
+        return turn.trace if turn is not None else None
+
+    @staticmethod
+    def _stop_invocation(context, limit_error):
+        """Ends the agent run at the next step, the runner then finishes on its own"""
+        logging.warning(f"Stopping turn: {limit_error}")
+        context._invocation_context.end_invocation = True
+
+    def _before_model_callback(self, *, callback_context, llm_request):
+        turn = self._turn_for_callback(callback_context)
+        if turn is not None and turn.check_limits() is not None:
+            self._stop_invocation(callback_context, turn.limit_error)
+            # answering in place of the model ends the agent's loop without another request
+            return LlmResponse(error_code=turn.limit_error.code, error_message=str(turn.limit_error))
+        if turn is not None:
+            span = turn.start_span("model_call", agent=callback_context.agent_name, model=llm_request.model)
+            turn.model_calls[callback_context.agent_name] = (
+                time.monotonic(), llm_request.model, estimate_tokens(llm_request.contents), span)
+            retry_listener.set(lambda category, attempt, error: self._on_model_retry(turn, category))
+            model_options.set(self._model_options)
+            turn.tools[callback_context.agent_name] = llm_request.tools_dict
+            self._request_structured_output(turn, llm_request)
+        return None
+
+    @staticmethod
+    def _request_structured_output(turn, llm_request):
+        # models do not combine JSON output with function calling, requests offering tools rely on the prompt
+        if turn.response_schema is None or llm_request.tools_dict:
+            return
+        if llm_request.config is None:
+            llm_request.config = genai_types.GenerateContentConfig()
+        llm_request.config.response_mime_type = "application/json"
+        llm_request.config.response_schema = turn.response_schema
+
+    def _after_model_callback(self, *, callback_context, llm_response):
+        turn = self._turn_for_callback(callback_context)
+        if turn is None or llm_response.partial:
+            return None
+        retry_listener.set(None)
+        model_options.set(None)
+        call = turn.model_calls.pop(callback_context.agent_name, None)
+        if call is None:
+            return None
+        started, model, estimated_prompt_tokens, span = call
+        if span is not None:
+            span.finish(error_code=llm_response.error_code)
+        labels = {"app": self.app_name, "model": model or ""}
+        self.metrics.observe(metric_names.MODEL_CALL_DURATION, time.monotonic() - started, labels=labels)
+        prompt_tokens, completion_tokens = self._count_tokens(llm_response, estimated_prompt_tokens)
+        self.metrics.increment(metric_names.TOKENS, prompt_tokens, labels={**labels, "kind": "prompt"})
+        self.metrics.increment(metric_names.TOKENS, completion_tokens, labels={**labels, "kind": "completion"})
+        turn.tokens += prompt_tokens + completion_tokens
+        if turn.check_limits() is None:
+            self._prefetch_tool_calls(turn, callback_context.agent_name, llm_response)
+        return None
+
+    @staticmethod
+    def _count_tokens(llm_response, estimated_prompt_tokens):
+        usage = getattr(llm_response, "usage_metadata", None)
+        if usage is not None:
+            prompt_tokens, completion_tokens = usage.prompt_token_count or 0, usage.candidates_token_count or 0
+        else:
+            # ADK responses do not always carry usage metadata, fall back to an estimate
+            prompt_tokens = estimated_prompt_tokens
+            completion_tokens = estimate_tokens([llm_response.content] if llm_response.content else [])
+        return prompt_tokens, completion_tokens
+
+    def _prefetch_tool_calls(self, turn, agent_name, llm_response):
+        """Starts the function calls of the response on the tool_concurrency pool"""
+        if self.tool_concurrency is None or agent_name not in self._concurrent_tool_agents or not llm_response.content:
+            return
+        function_calls = [part.function_call for part in llm_response.content.parts or [] if part.function_call]
+        if turn.max_function_calls is not None and turn.function_calls + len(function_calls) > turn.max_function_calls:
+            # some of the calls will be refused, they run (or not) one by one in the runner
+            return
+        if len(function_calls) > 1:
+            turn.prefetched.update(self.tool_concurrency.prefetch(function_calls, turn.tools.get(agent_name) or {}))
+
+    def _before_tool_callback(self, *, tool, args, tool_context):
+        turn = self._turn_for_callback(tool_context)
+        if turn is None:
+            return None
+        turn.function_calls += 1
+        if turn.limit_error is None and turn.max_function_calls is not None and turn.function_calls > turn.max_function_calls:
+            turn.limit_error = TooManyFunctionCallsException(
+                f"Exceed allowed number of function calls: {turn.max_function_calls}")
+        if turn.check_limits() is not None:
+            self._stop_invocation(tool_context, turn.limit_error)
+            # the tool is not called, the model never sees this response since the run ends after the step
+            return {"error": str(turn.limit_error)}
+        span = turn.start_span("tool_call", tool=tool.name, agent=tool_context.agent_name)
+        turn.tool_calls[tool_context.function_call_id] = (time.monotonic(), span)
+        future = turn.prefetched.pop(tool_context.function_call_id, None)
+        # the runner uses the result as the tool response instead of calling the tool
+        return future.result() if future is not None else None
+
+    def _after_tool_callback(self, *, tool, args, tool_context, tool_response):
+        turn = self._turn_for_callback(tool_context)
+        if turn is None:
+            return None
+        call = turn.tool_calls.pop(tool_context.function_call_id, None)
+        # calls refused by the turn limits are not counted
+        if call is not None:
+            labels = {"app": self.app_name, "tool": tool.name}
+            self.metrics.increment(metric_names.TOOL_CALLS, labels=labels)
+            started, span = call
+            if span is not None:
+                span.finish()
+            self.metrics.observe(metric_names.TOOL_CALL_DURATION, time.monotonic() - started, labels=labels)
+        return None
+
+    def _on_model_retry(self, turn, category):
+        self.metrics.increment(metric_names.RETRIES, labels={"app": self.app_name, "scope": "model_call", "category": category})
+        if turn.trace is not None:
+            turn.trace.root.attributes["model_retries"] = turn.trace.root.attributes.get("model_retries", 0) + 1
+
+    def _record_error(self, category):
+        self.metrics.increment(metric_names.ERRORS, labels={"app": self.app_name, "category": category})
+
+    @contextlib.contextmanager
+    def _track_turn(self, msg, *, user_id, session_id, timeout=None, max_function_calls=None, max_tokens=None,
+                    response_schema=None):
+        """Creates the state of a new turn, registers it as active and records its duration once it is over"""
+        turn = _TurnState(msg)
+        turn.response_schema = response_schema
+        turn.set_limits(
+            timeout=timeout if timeout is not None else self.turn_timeout,
+            max_function_calls=max_function_calls if max_function_calls is not None else self.function_call_limit_per_chat,
+            max_tokens=max_tokens if max_tokens is not None else self.max_tokens_per_turn)
+        if self.tracer is not None:
+            turn.trace = self.tracer.start_trace("send_message", app=self.app_name, user_id=user_id, session_id=session_id)
+        key = (user_id, session_id)
+        # Turns of one session are serialized, so there is at most one active turn per key
+        self._active_turns[key] = turn
+        outcome = "ok"
+        try:
+            yield turn
+            if self.compaction is not None and turn.session is not None and not turn.failed:
+                self.compaction.maybe_schedule(self, user_id=user_id, session_id=session_id,
+                                               events=list(turn.session.events) + turn.events)
+        except Exception as e:
+            outcome = "error"
+            self._record_error(_error_category(e))
+            if turn.runner_started:
+                e.runner_started = True
+            raise
+        finally:
+            self._active_turns.pop(key, None)
+            if outcome == "ok" and turn.failed:
+                outcome = "error"
+            elif outcome == "ok" and turn.from_cache:
+                outcome = "cached"
+            self.metrics.observe(metric_names.TURN_DURATION, time.monotonic() - turn.started,
+                                 labels={"app": self.app_name, "outcome": outcome})
+            if turn.trace is not None:
+                self.tracer.finish_trace(turn.trace, outcome=outcome)
 
     def _maybe_create_chat_session(self, *, user_id, session_id, num_recent_events, events=[]):
         logging.debug(f"Attempting to get/create chat session for user_id='{user_id}', session_id='{session_id}', app_name='{self.app_name}'")
@@ -79,106 +595,102 @@ class ADKAgentService:
             logging.info(f"Fetched existing session for session_id='{session_id}', user_id='{user_id}', app_name='{self.app_name}'.")
 
         if events:
-            logging.debug(f"Appending {len(events)} events to session_id='{session_id}'.")
-            for event_count, event in enumerate(events, 1):
+            # Events already in the session (e.g. appended by an attempt that failed half way) are skipped
+            existing_ids = {getattr(event, "id", None) for event in chat_session.events}
+            new_events = [event for event in events if getattr(event, "id", None) not in existing_ids or not getattr(event, "id", None)]
+            if len(new_events) < len(events):
+                logging.info(f"Skipping {len(events) - len(new_events)} events already in session_id='{session_id}'.")
+            logging.debug(f"Appending {len(new_events)} events to session_id='{session_id}'.")
+            for event_count, event in enumerate(new_events, 1):
                 self.session_service.append_event(session=chat_session, event=event)
-            logging.info(f"Successfully appended {len(events)} events to session_id='{session_id}'.")
+            logging.info(f"Successfully appended {len(new_events)} events to session_id='{session_id}'.")
         return chat_session
 
-    @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=2, min=2, max=16), after=log_retry_error, retry=retry_if_not_exception_type(TooManyFunctionCallsException))
-    def send_message(self, msg: str, *, user_id="default_user", session_id=None, events=[]) -> tuple[str, list]:
-        """Initiate communication with LLM to execute user's instructions"""
-        # Log at the very beginning of the method
-        effective_session_id = session_id if session_id else "new_session"
-        logging.info(f"send_message called for user_id='{user_id}', session_id='{effective_session_id}'. Message: '{msg[:100]}{'...' if len(msg) > 100 else ''}'")
-
-        if not session_id:
-            session_id = str(uuid.uuid4())
-            logging.info(f"No session_id provided. Generated new session_id='{session_id}' for user_id='{user_id}'.")
-        
-        session = self._maybe_create_chat_session(user_id=user_id, session_id=session_id, num_recent_events=self.events_per_session, events=events)
-        
-        logging.debug(f"about to send msg: {msg}")
-        
-        runner_id = user_id + session_id
+    def _get_runner(self, *, session_id):
+        """Returns the runner for the agent from the runner pool (creating it if needed) and its id"""
+        runner_id = self.runner_pool.make_key(agent=self.agent, app_name=self.app_name, session_service=self.session_service)
         logging.debug(f"Runner ID for session_id='{session_id}' is '{runner_id}'.")
-        runner_instance = self.runners.get(runner_id)
-        if not runner_instance:
-            with self.runner_lock:
-                runner_instance = self.runners.get(runner_id) # Double-check
-                if not runner_instance:
-                    try:
-                        logging.info(f"Creating new Runner instance for runner_id='{runner_id}', session_id='{session_id}'.")
-                        runner_instance = Runner(
-                            agent=self.agent,
-                            app_name=self.app_name,
-                            session_service=self.session_service
-                        )
-                        self.runners[runner_id] = runner_instance
-                        logging.info(f"Runner instance created and cached for runner_id='{runner_id}', session_id='{session_id}'.")
-                    except Exception as e:
-                        # Original logging.exception is good here as it includes traceback
-                        logging.exception(f"Fatal Error creating agent/runner for session_id='{session_id}', runner_id='{runner_id}': {e}")
-                        # It might be appropriate to re-raise or return an error response here
-                        # For now, we'll let it proceed, which likely results in an error later if runner_instance is None
-                        # However, the original code also didn't explicitly handle this case beyond logging.
-        
-        if not runner_instance:
-            logging.critical(f"Runner instance is None for session_id='{session_id}', runner_id='{runner_id}'. Cannot proceed.")
-            # Option 1: Raise an exception
-            # raise RuntimeError("Failed to initialize agent runner.")
-            # Option 2: Return an error tuple (as per subtask preference)
-            return "Failed to initialize agent runner.", []
 
-        user_content = genai_types.Content(role='user', parts=[genai_types.Part(text=msg)])
-        final_response_text = ""
-        function_call_counter = 0
-        
-        logging.info(f"Preparing to call runner_instance.run() for session_id='{session_id}'.")
+        def create_runner():
+            logging.info(f"Creating new Runner instance for runner_id='{runner_id}', session_id='{session_id}'.")
+            return Runner(
+                agent=self.agent,
+                app_name=self.app_name,
+                session_service=self.session_service
+            )
+
         try:
-            for event in runner_instance.run( # This assumes runner_instance was successfully created.
-                user_id=user_id,
-                new_message=user_content,
-                session_id=session_id):
-                function_call_counter = function_call_counter + 1
-                if self.function_call_limit_per_chat is not None and function_call_counter >= self.function_call_limit_per_chat:
-                    raise TooManyFunctionCallsException(
-                        f"Exceed allowed number of function calls: {self.function_call_limit_per_chat}"
-                    )
-                
-
-                logging.debug(f"ADK Event ({session_id}): Author={event.author}, Content={event.content}")
-
-                if event.error_message:
-                    logging.error(f"ADK Runner Error ({session_id}): {event.error_message}")
-                    break
-                logging.debug(str(event))
+            runner_instance = self.runner_pool.get_runner(
+                agent=self.agent,
+                app_name=self.app_name,
+                session_service=self.session_service,
+                factory=create_runner)
+        except Exception as e:
+            # Original logging.exception is good here as it includes traceback
+            logging.exception(f"Fatal Error creating agent/runner for session_id='{session_id}', runner_id='{runner_id}': {e}")
+            # The caller checks for a missing runner and returns an error response.
+            runner_instance = None
+        return runner_instance, runner_id
 
-                if event.is_final_response() and event.content and event.content.parts:
-                    text_part = next((part.text for part in event.content.parts if part.text), None)
-                    if text_part:
-                        final_response_text = text_part
-                        logging.debug(f"ADK signaled final response with text ({session_id}): {final_response_text}")
-                    break
-        except genai_types.BlockedPromptException as e:
-                logging.warning(f"Prompt was blocked for session {session_id}: {e}")
-                # Potentially set a specific error message for the user
-                final_response_text = "Your prompt was blocked. Please modify your prompt and try again."
-        except genai_types.StopCandidateException as e:
-                logging.warning(f"Content generation stopped for session {session_id}: {e}")
-                # Potentially set a specific error message for the user
-                final_response_text = "The response could not be completed. Please try again."
-        except google_exceptions.DeadlineExceeded as e:
-                logging.error(f"API request timed out during runner.run for session_id='{session_id}': {e}")
-                final_response_text = "The request timed out. Please try again later."
-        except google_exceptions.GoogleAPIError as e:
-                logging.error(f"A Google API error occurred during runner.run for session_id='{session_id}': {e}")
-                final_response_text = "An API error occurred. Please try again later."
-        except Exception as e: # Keep a general exception handler as a fallback
-                logging.exception(f"An unexpected error occurred during runner.run for session_id='{session_id}': {e}")
-                # It might be good to set a generic error message for final_response_text here too
-                final_response_text = "An unexpected error occurred. Please try again."
-        
+    def _handle_event(self, event, *, session_id, turn):
+        """Processes one event produced by the runner, returns True when the turn is over"""
+        logging.debug(f"ADK Event ({session_id}): Author={event.author}, Content={event.content}")
+        turn.add_event(event)
+
+        if turn.check_limits() is not None:
+            # The agent callbacks stop the run at its next step, the runner is drained so no work is
+            # left running in its background thread after the turn returns
+            return False
+
+        if event.error_message:
+            logging.error(f"ADK Runner Error ({session_id}): {event.error_message}")
+            self._record_error("model_error")
+            turn.failed = True
+            return True
+        logging.debug(str(event))
+
+        if event.is_final_response() and event.content and event.content.parts:
+            text_part = _get_event_text(event)
+            if text_part:
+                turn.final_response_text = text_part
+                logging.debug(f"ADK signaled final response with text ({session_id}): {text_part}")
+            return True
+        return False
+
+    @staticmethod
+    def _raise_if_limited(turn, *, session_id):
+        """Raises the TurnLimitExceeded of a stopped turn with the partial results attached"""
+        error = turn.limit_error
+        if error is None:
+            return
+        error.partial_response = turn.final_response_text or _partial_response_text(turn.events)
+        error.call_history = turn.events
+        logging.warning(f"Turn for session_id='{session_id}' stopped by its limits: {error}")
+        raise error
+
+    def _handle_run_error(self, e, *, session_id):
+        """Logs an error raised while the runner was running and returns the text for the user"""
+        category = _error_category(e)
+        self._record_error(category)
+        if category == "blocked":
+            logging.warning(f"Prompt was blocked for session {session_id}: %s", e)
+            return "Your prompt was blocked. Please modify your prompt and try again."
+        if category == "stopped":
+            logging.warning(f"Content generation stopped for session {session_id}: %s", e)
+            return "The response could not be completed. Please try again."
+        if category == "deadline":
+            logging.error(f"API request timed out during runner.run for session_id='{session_id}': %s", e)
+            return "The request timed out. Please try again later."
+        if category == "api_error":
+            logging.error(f"A Google API error occurred during runner.run for session_id='{session_id}': %s", e)
+            return "An API error occurred. Please try again later."
+        # Keep a general exception handler as a fallback
+        logging.exception(f"An unexpected error occurred during runner.run for session_id='{session_id}': %s", e)
+        return "An unexpected error occurred. Please try again."
+
+    def _finish_turn(self, turn, *, user_id, session_id, notify=True, return_full_history=False):
+        """Delivers the final response to on_message and collects the events to return"""
+        final_response_text = turn.final_response_text
         logging.info(f"runner_instance.run() completed or errored for session_id='{session_id}'.")
 
         # The ADK may provide a final text response here. However, the agent's design might rely on
@@ -189,15 +701,348 @@ class ADKAgentService:
         else:
                 logging.debug(f"No final response text was set from runner.run() for session_id='{session_id}'.")
         
-        if self.on_message:
+        if self.on_message and notify:
             logging.info(f"Calling on_message callback for session_id='{session_id}'.")
             self.on_message(final_response_text)
             logging.info(f"on_message callback completed for session_id='{session_id}'.")
         
         logging.info(f"Returning final response for session_id='{session_id}'. Response: '{final_response_text[:100]}{'...' if len(final_response_text) > 100 else ''}'")
-        # The events returned here are from a fresh call to _maybe_create_chat_session, which fetches/creates and appends history.
-        # This is the original behavior.
-        returned_events = self._maybe_create_chat_session(
-            session_id=session_id, user_id=user_id, num_recent_events=self.events_per_session).events
+        if return_full_history:
+            # The whole session history requires another round trip to the session service
+            returned_events = self._maybe_create_chat_session(
+                session_id=session_id, user_id=user_id, num_recent_events=self.events_per_session).events
+        else:
+            returned_events = turn.events
         logging.debug(f"Returning {len(returned_events)} events for session_id='{session_id}'.")
         return final_response_text, returned_events
+
+    @staticmethod
+    def _resolve_session_id(msg, *, user_id, session_id):
+        """Returns the session id for the turn, generating a new one if the caller did not provide it"""
+        # Log at the very beginning of the method
+        effective_session_id = session_id if session_id else "new_session"
+        logging.info(f"send_message called for user_id='{user_id}', session_id='{effective_session_id}'. Message: '{msg[:100]}{'...' if len(msg) > 100 else ''}'")
+
+        if not session_id:
+            session_id = str(uuid.uuid4())
+            logging.info(f"No session_id provided. Generated new session_id='{session_id}' for user_id='{user_id}'.")
+        return session_id
+
+    def _start_turn(self, turn, msg, *, user_id, session_id, events):
+        """Prepares the session and the runner for a new turn"""
+        with turn.span("maybe_create_chat_session", events=len(events or [])):
+            session = self._maybe_create_chat_session(user_id=user_id, session_id=session_id, num_recent_events=self.events_per_session, events=events)
+        turn.session = session
+        
+        logging.debug(f"about to send msg: {msg}")
+        
+        with turn.span("get_runner"):
+            runner_instance, runner_id = self._get_runner(session_id=session_id)
+        if not runner_instance:
+            logging.critical(f"Runner instance is None for session_id='{session_id}', runner_id='{runner_id}'. Cannot proceed.")
+            self._record_error("runner_init")
+        return runner_instance, session
+
+    def _answer_from_cache(self, turn, *, msg, session):
+        """Completes the turn from the response cache if possible, returns the cache key (None when caching is off)"""
+        if not self.response_cache:
+            return None
+        with turn.span("response_cache.get") as span:
+            cache_key = ResponseCache.make_key(agent=self.agent, history=session.events, msg=msg)
+            cached = self.response_cache.get(cache_key)
+            if span is not None:
+                span.attributes["hit"] = cached is not None
+        if cached:
+            final_response_text, cached_events = cached
+            logging.info(f"Answering session_id='{session.id}' from the response cache.")
+            # The session has to look as if the agent answered, so later turns see the same history
+            self.session_service.append_event(session=session, event=turn.events[0])
+            for event in cached_events:
+                event.id = Event.new_id()
+                self.session_service.append_event(session=session, event=event)
+                turn.add_event(event)
+            turn.final_response_text = final_response_text
+            turn.from_cache = True
+        return cache_key
+
+    def _maybe_cache_response(self, cache_key, turn):
+        if not cache_key or turn.from_cache or turn.failed or not turn.final_response_text:
+            return
+        # The user message is part of the key, only the agent events are stored
+        if self.response_cache.is_cacheable(turn.events):
+            self.response_cache.put(cache_key, turn.final_response_text, turn.events[1:])
+
+    def _get_async_semaphore(self):
+        """Returns the semaphore limiting concurrent turns on the running event loop"""
+        if self.max_concurrent_requests is None:
+            return contextlib.nullcontext()
+        loop = asyncio.get_running_loop()
+        semaphore = self._async_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+            self._async_semaphores[loop] = semaphore
+        return semaphore
+
+    @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=2, min=2, max=16), after=log_retry_error, retry=retry_if_exception(_should_replay_turn))
+    def send_message(self, msg: str, *, user_id="default_user", session_id=None, events=[], return_full_history=False,
+                     timeout=None, max_function_calls=None, max_tokens=None, response_schema=None) -> tuple[str, list]:
+        """Initiate communication with LLM to execute user's instructions.
+
+        Returns the final response and the events produced during this turn (the user message and the agent events),
+        with return_full_history the whole session history is returned instead.
+        timeout (seconds), max_function_calls and max_tokens override the service's limits for this turn, a turn
+        hitting one of them is stopped and raises a TurnLimitExceeded carrying the partial response and events.
+        With response_schema (a JSON schema) model calls that offer no tools are asked for JSON following it.
+        """
+        session_id = self._resolve_session_id(msg, user_id=user_id, session_id=session_id)
+        options = {"timeout": timeout, "max_function_calls": max_function_calls, "max_tokens": max_tokens,
+                   "response_schema": response_schema}
+        with self.session_locks.hold((user_id, session_id)):
+            return self._send_message_locked(msg, user_id=user_id, session_id=session_id, events=events,
+                                             return_full_history=return_full_history, options=options)
+
+    def _send_message_locked(self, msg, *, user_id, session_id, events, return_full_history, options):
+        with self._track_turn(msg, user_id=user_id, session_id=session_id, **options) as turn:
+            return self._run_turn(turn, msg, user_id=user_id, session_id=session_id, events=events,
+                                  return_full_history=return_full_history)
+
+    def _run_turn(self, turn, msg, *, user_id, session_id, events, return_full_history):
+        runner_instance, session = self._start_turn(turn, msg, user_id=user_id, session_id=session_id, events=events)
+        if not runner_instance:
+            turn.failed = True
+            return "Failed to initialize agent runner.", []
+
+        cache_key = self._answer_from_cache(turn, msg=msg, session=session)
+        if not turn.from_cache:
+            logging.info(f"Preparing to call runner_instance.run() for session_id='{session_id}'.")
+            turn.runner_started = True
+            try:
+                for event in runner_instance.run( # This assumes runner_instance was successfully created.
+                    user_id=user_id,
+                    new_message=turn.user_content,
+                    session_id=session_id):
+                    if self._handle_event(event, session_id=session_id, turn=turn):
+                        break
+            except Exception as e:
+                turn.final_response_text = self._handle_run_error(e, session_id=session_id)
+                turn.failed = True
+            self._raise_if_limited(turn, session_id=session_id)
+            self._maybe_cache_response(cache_key, turn)
+
+        return self._finish_turn(turn, user_id=user_id, session_id=session_id, return_full_history=return_full_history)
+
+    @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=2, min=2, max=16), after=log_retry_error, retry=retry_if_exception(_should_replay_turn))
+    async def send_message_async(self, msg: str, *, user_id="default_user", session_id=None, events=[], return_full_history=False,
+                                 timeout=None, max_function_calls=None, max_tokens=None,
+                                 response_schema=None) -> tuple[str, list]:
+        """Asynchronous version of send_message, runs the agent on the caller's event loop instead of a thread"""
+        session_id = self._resolve_session_id(msg, user_id=user_id, session_id=session_id)
+        async with self.session_locks.hold_async((user_id, session_id)), self._get_async_semaphore():
+            with self._track_turn(msg, user_id=user_id, session_id=session_id, timeout=timeout,
+                                  max_function_calls=max_function_calls, max_tokens=max_tokens,
+                                  response_schema=response_schema) as turn:
+                return await self._run_turn_async(turn, msg, user_id=user_id, session_id=session_id, events=events,
+                                                  return_full_history=return_full_history)
+
+    async def _run_turn_async(self, turn, msg, *, user_id, session_id, events, return_full_history):
+        runner_instance, session = self._start_turn(turn, msg, user_id=user_id, session_id=session_id, events=events)
+        if not runner_instance:
+            turn.failed = True
+            return "Failed to initialize agent runner.", []
+
+        cache_key = self._answer_from_cache(turn, msg=msg, session=session)
+        if not turn.from_cache:
+            logging.info(f"Preparing to call runner_instance.run_async() for session_id='{session_id}'.")
+            turn.runner_started = True
+            try:
+                async for event in runner_instance.run_async(
+                    user_id=user_id,
+                    new_message=turn.user_content,
+                    session_id=session_id):
+                    if self._handle_event(event, session_id=session_id, turn=turn):
+                        break
+            except Exception as e:
+                turn.final_response_text = self._handle_run_error(e, session_id=session_id)
+                turn.failed = True
+            self._raise_if_limited(turn, session_id=session_id)
+            self._maybe_cache_response(cache_key, turn)
+
+        return self._finish_turn(turn, user_id=user_id, session_id=session_id, return_full_history=return_full_history)
+
+    async def send_message_events_async(self, msg: str, *, user_id="default_user", session_id=None, events=[],
+                                        timeout=None, max_function_calls=None, max_tokens=None, response_schema=None):
+        """Async iterator over the ADK events of a single turn, as they are produced by the runner.
+
+        Unlike send_message_async errors are not converted into a text response but raised to the caller,
+        on_message is called with the final response once the runner is done.
+        """
+        session_id = self._resolve_session_id(msg, user_id=user_id, session_id=session_id)
+        async with self.session_locks.hold_async((user_id, session_id)), self._get_async_semaphore():
+            with self._track_turn(msg, user_id=user_id, session_id=session_id, timeout=timeout,
+                                  max_function_calls=max_function_calls, max_tokens=max_tokens,
+                                  response_schema=response_schema) as turn:
+                runner_instance, _ = self._start_turn(turn, msg, user_id=user_id, session_id=session_id, events=events)
+                if not runner_instance:
+                    raise RuntimeError("Failed to initialize agent runner.")
+
+                logging.info(f"Preparing to call runner_instance.run_async() for session_id='{session_id}'.")
+                turn.runner_started = True
+                async for event in runner_instance.run_async(
+                    user_id=user_id,
+                    new_message=turn.user_content,
+                    session_id=session_id):
+                    done = self._handle_event(event, session_id=session_id, turn=turn)
+                    yield event
+                    if done:
+                        break
+
+                self._raise_if_limited(turn, session_id=session_id)
+                logging.info(f"runner_instance.run_async() completed for session_id='{session_id}'.")
+                if self.on_message:
+                    self.on_message(turn.final_response_text)
+
+    def send_message_stream(self, msg: str, *, user_id="default_user", session_id=None, events=[], on_message_per_chunk=False,
+                            return_full_history=False, timeout=None, max_function_calls=None, max_tokens=None,
+                            response_schema=None):
+        """Streams the response, yields StreamChunk objects as soon as the runner produces them.
+
+        Text is yielded in TEXT chunks while the model generates it, tool calls and tool responses as
+        TOOL_CALL/TOOL_RESPONSE chunks, the last chunk is always FINAL with the full response and the events
+        (same values send_message returns). With on_message_per_chunk on_message is called for every TEXT
+        chunk instead of once with the full response.
+        """
+        session_id = self._resolve_session_id(msg, user_id=user_id, session_id=session_id)
+        options = {"timeout": timeout, "max_function_calls": max_function_calls, "max_tokens": max_tokens,
+                   "response_schema": response_schema}
+        with self.session_locks.hold((user_id, session_id)):
+            yield from self._send_message_stream_locked(
+                msg, user_id=user_id, session_id=session_id, events=events,
+                on_message_per_chunk=on_message_per_chunk, return_full_history=return_full_history, options=options)
+
+    def _send_message_stream_locked(self, msg, *, user_id, session_id, events, on_message_per_chunk, return_full_history, options):
+        with self._track_turn(msg, user_id=user_id, session_id=session_id, **options) as turn:
+            yield from self._run_turn_stream(turn, msg, user_id=user_id, session_id=session_id, events=events,
+                                             on_message_per_chunk=on_message_per_chunk,
+                                             return_full_history=return_full_history)
+
+    def _run_turn_stream(self, turn, msg, *, user_id, session_id, events, on_message_per_chunk, return_full_history):
+        runner_instance, session = self._start_turn(turn, msg, user_id=user_id, session_id=session_id, events=events)
+        if not runner_instance:
+            turn.failed = True
+            yield StreamChunk(kind=StreamChunk.FINAL, text="Failed to initialize agent runner.", events=[])
+            return
+
+        cache_key = self._answer_from_cache(turn, msg=msg, session=session)
+        if turn.from_cache:
+            if on_message_per_chunk and self.on_message:
+                self.on_message(turn.final_response_text)
+            yield StreamChunk(kind=StreamChunk.TEXT, text=turn.final_response_text)
+        else:
+            yield from self._stream_runner_events(
+                runner_instance, turn, user_id=user_id, session_id=session_id,
+                on_message_per_chunk=on_message_per_chunk)
+            self._raise_if_limited(turn, session_id=session_id)
+            self._maybe_cache_response(cache_key, turn)
+
+        final_response_text, returned_events = self._finish_turn(
+            turn, user_id=user_id, session_id=session_id, notify=not on_message_per_chunk,
+            return_full_history=return_full_history)
+        yield StreamChunk(kind=StreamChunk.FINAL, text=final_response_text, events=returned_events)
+
+    def _stream_runner_events(self, runner_instance, turn, *, user_id, session_id, on_message_per_chunk):
+        # Whether text of the model response in progress was already yielded as partial chunks
+        streamed_text = False
+        logging.info(f"Preparing to call runner_instance.run() in streaming mode for session_id='{session_id}'.")
+        turn.runner_started = True
+        try:
+            for event in runner_instance.run(
+                user_id=user_id,
+                new_message=turn.user_content,
+                session_id=session_id,
+                run_config=RunConfig(streaming_mode=StreamingMode.SSE)):
+                if event.partial:
+                    text = _get_event_text(event)
+                    if text:
+                        streamed_text = True
+                        if on_message_per_chunk and self.on_message:
+                            self.on_message(text)
+                        yield StreamChunk(kind=StreamChunk.TEXT, text=text, event=event)
+                    continue
+
+                done = self._handle_event(event, session_id=session_id, turn=turn)
+                for function_call in event.get_function_calls():
+                    yield StreamChunk(kind=StreamChunk.TOOL_CALL, text=function_call.name, event=event)
+                for function_response in event.get_function_responses():
+                    yield StreamChunk(kind=StreamChunk.TOOL_RESPONSE, text=function_response.name, event=event)
+                text = _get_event_text(event)
+                if text and not streamed_text:
+                    # The model did not stream this response, deliver it as a single chunk
+                    if on_message_per_chunk and self.on_message:
+                        self.on_message(text)
+                    yield StreamChunk(kind=StreamChunk.TEXT, text=text, event=event)
+                streamed_text = False
+                if done:
+                    break
+        except Exception as e:
+            turn.final_response_text = self._handle_run_error(e, session_id=session_id)
+            turn.failed = True
+
+    def _run_batch_group(self, group):
+        results = []
+        for index, kwargs in group:
+            started = time.monotonic()
+            try:
+                response, events = self.send_message(**kwargs)
+                results.append(BatchItemResult(index=index, response=response, events=events, elapsed=time.monotonic() - started))
+            except Exception as e:
+                logging.exception(f"send_messages item #{index} failed: {e}")
+                results.append(BatchItemResult(index=index, error=e, elapsed=time.monotonic() - started))
+        return results
+
+    async def _run_batch_group_async(self, group, semaphore):
+        results = []
+        async with semaphore:
+            for index, kwargs in group:
+                started = time.monotonic()
+                try:
+                    response, events = await self.send_message_async(**kwargs)
+                    results.append(BatchItemResult(index=index, response=response, events=events, elapsed=time.monotonic() - started))
+                except Exception as e:
+                    logging.exception(f"send_messages_async item #{index} failed: {e}")
+                    results.append(BatchItemResult(index=index, error=e, elapsed=time.monotonic() - started))
+        return results
+
+    @staticmethod
+    def _collect_batch(batch_size, group_results, started):
+        results = [None] * batch_size
+        for group in group_results:
+            for result in group:
+                results[result.index] = result
+        batch_result = BatchResult(results=results, elapsed=time.monotonic() - started)
+        logging.info(f"Batch of {batch_size} messages done in {batch_result.elapsed:.2f}s: "
+                     f"{batch_result.succeeded} succeeded, {batch_result.failed} failed, "
+                     f"{batch_result.throughput:.2f} messages/s")
+        return batch_result
+
+    def send_messages(self, batch, *, max_concurrency=8) -> BatchResult:
+        """Sends a batch of messages, fanning them out over a pool of max_concurrency worker threads.
+
+        Each item is either a message string or a dict of send_message arguments (msg, user_id, session_id, events).
+        Messages for the same session are sent one after another in the input order, different sessions run in
+        parallel. Errors are reported per item instead of aborting the batch, results keep the input order.
+        """
+        started = time.monotonic()
+        groups = _group_batch(batch)
+        logging.info(f"send_messages: {len(batch)} messages in {len(groups)} sessions, max_concurrency={max_concurrency}")
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            group_results = list(executor.map(self._run_batch_group, groups))
+        return self._collect_batch(len(batch), group_results, started)
+
+    async def send_messages_async(self, batch, *, max_concurrency=8) -> BatchResult:
+        """Asynchronous version of send_messages, runs the batch on the caller's event loop"""
+        started = time.monotonic()
+        groups = _group_batch(batch)
+        logging.info(f"send_messages_async: {len(batch)} messages in {len(groups)} sessions, max_concurrency={max_concurrency}")
+        semaphore = asyncio.Semaphore(max_concurrency)
+        group_results = await asyncio.gather(*[self._run_batch_group_async(group, semaphore) for group in groups])
+        return self._collect_batch(len(batch), group_results, started)
@@ -0,0 +1,109 @@
+"""Small caching primitives shared by the toolkit"""
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache with an optional time-to-live for its entries.
+
+    Entries expire `ttl` seconds after they were stored, when the cache is full the least recently
+    used entry is evicted. Hit/miss/eviction counters are available through stats().
+    """
+
+    def __init__(self, capacity=128, ttl=None, *, clock=time.monotonic):
+        if capacity is not None and capacity <= 0:
+            raise ValueError("capacity should be a positive number or None for an unbounded cache")
+        self.capacity = capacity
+        self.ttl = ttl
+        self._clock = clock
+        # key -> (expires_at, value), ordered from the least to the most recently used
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _lookup(self, key):
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self._clock() + ttl if ttl is not None else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while self.capacity is not None and len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        """Returns the cached value or default if the key is missing or expired"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def put(self, key, value, *, ttl=None):
+        """Stores the value, ttl overrides the cache wide ttl for this entry"""
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def get_or_create(self, key, factory, *, ttl=None):
+        """Returns the cached value, creating and storing it with factory() on a miss"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+            value = factory()
+            self._store(key, value, ttl)
+            return value
+
+    def pop(self, key, default=None):
+        """Removes the key from the cache and returns its value"""
+        with self._lock:
+            entry = self._entries.pop(key, _MISSING)
+            return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup(key) is not _MISSING
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        """Returns counters describing the cache usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,221 @@
+"""Compact in-memory storage of conversation events for the toolkit's own bookkeeping"""
+
+import hashlib
+import sys
+from array import array
+from collections.abc import Sequence
+
+from google.adk.events import Event
+from google.genai import types as genai_types
+
+# Event kinds: text only events are rebuilt from the columns, any other event from its JSON in the buffer
+_TEXT = 0
+_JSON = 1
+
+_TEXT_EVENT_FIELDS = {"content", "invocation_id", "author", "id", "timestamp"}
+
+
+class TextBuffer:
+    """Append-only UTF-8 buffer shared by event logs, texts are addressed by (offset, length)"""
+
+    def __init__(self):
+        self._data = bytearray()
+
+    def append(self, text):
+        encoded = text.encode("utf-8")
+        offset = len(self._data)
+        self._data += encoded
+        return offset, len(encoded)
+
+    def get(self, offset, length):
+        return self._data[offset:offset + length].decode("utf-8")
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _text_event_parts(event):
+    """(role, text) of an event that is a single text part and nothing else, None for any other event"""
+    content = event.content
+    if content is None or not content.parts or len(content.parts) != 1:
+        return None
+    dump = event.model_dump(exclude_none=True, exclude_defaults=True)
+    if not dump.keys() <= _TEXT_EVENT_FIELDS or set(dump.get("content", {}).get("parts", [{}])[0]) != {"text"}:
+        return None
+    return content.role, content.parts[0].text
+
+
+class CompactEventLog(Sequence):
+    """A list of ADK events stored column-wise, converted back to Event objects only when they are read.
+
+    Authors, roles and invocation ids are interned, texts (and the JSON of events that are more than a single
+    text part, e.g. function calls) live in a TextBuffer that logs created from each other share. Reading an
+    item builds a new Event, mutating it does not change the log. The log can be passed wherever a list of
+    events is expected, e.g. as send_message(events=...).
+    """
+
+    def __init__(self, events=(), *, buffer=None):
+        self.buffer = buffer if buffer is not None else TextBuffer()
+        self._ids = []
+        self._invocation_ids = []
+        self._authors = []
+        self._roles = []
+        self._timestamps = array("d")
+        self._offsets = array("q")
+        self._lengths = array("q")
+        self._kinds = array("b")
+        self.extend(events)
+
+    def append(self, event):
+        parts = _text_event_parts(event)
+        if parts is not None:
+            role, text = parts
+            kind = _TEXT
+        else:
+            role, text = None, event.model_dump_json(exclude_none=True, exclude_defaults=True)
+            kind = _JSON
+        offset, length = self.buffer.append(text)
+        self._ids.append(event.id)
+        self._invocation_ids.append(sys.intern(event.invocation_id) if event.invocation_id else event.invocation_id)
+        self._authors.append(sys.intern(event.author) if event.author else event.author)
+        self._roles.append(sys.intern(role) if role else role)
+        self._timestamps.append(event.timestamp)
+        self._offsets.append(offset)
+        self._lengths.append(length)
+        self._kinds.append(kind)
+
+    def extend(self, events):
+        if isinstance(events, CompactEventLog) and events.buffer is self.buffer:
+            # the texts are in the shared buffer already, only the columns are copied
+            self._ids += events._ids
+            self._invocation_ids += events._invocation_ids
+            self._authors += events._authors
+            self._roles += events._roles
+            self._timestamps += events._timestamps
+            self._offsets += events._offsets
+            self._lengths += events._lengths
+            self._kinds += events._kinds
+            return
+        for event in events:
+            self.append(event)
+
+    def _event(self, index):
+        data = self.buffer.get(self._offsets[index], self._lengths[index])
+        if self._kinds[index] == _JSON:
+            return Event.model_validate_json(data)
+        return Event(id=self._ids[index], invocation_id=self._invocation_ids[index], author=self._authors[index],
+                     timestamp=self._timestamps[index],
+                     content=genai_types.Content(role=self._roles[index], parts=[genai_types.Part(text=data)]))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            log = CompactEventLog(buffer=self.buffer)
+            for name in ("_ids", "_invocation_ids", "_authors", "_roles", "_timestamps", "_offsets", "_lengths", "_kinds"):
+                setattr(log, name, getattr(self, name)[index])
+            return log
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("event index out of range")
+        return self._event(index)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __add__(self, events):
+        log = self[:]
+        log.extend(events)
+        return log
+
+    def __radd__(self, events):
+        log = CompactEventLog(events, buffer=self.buffer)
+        log.extend(self)
+        return log
+
+    def __iadd__(self, events):
+        self.extend(events)
+        return self
+
+    def texts(self):
+        """(author, text) of the text only events, read without building Event objects"""
+        for index, kind in enumerate(self._kinds):
+            if kind == _TEXT:
+                yield self._authors[index], self.buffer.get(self._offsets[index], self._lengths[index])
+
+    def __repr__(self):
+        return f"CompactEventLog({len(self)} events, {len(self.buffer)} bytes of text)"
+
+
+def _event_key(event):
+    return event.id or hashlib.sha256(event.model_dump_json(exclude_none=True).encode("utf-8")).hexdigest()
+
+
+class EventView(Sequence):
+    """Events of an EventStore given by their positions in it, a cheap stand-in for a list of events"""
+
+    def __init__(self, store, positions):
+        self.store = store
+        self.positions = positions
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return EventView(self.store, self.positions[index])
+        return self.store[self.positions[index]]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __add__(self, events):
+        if isinstance(events, EventView) and events.store is self.store:
+            return EventView(self.store, self.positions + events.positions)
+        return list(self) + list(events)
+
+    def __radd__(self, events):
+        return list(events) + list(self)
+
+    def __repr__(self):
+        return f"EventView({len(self)} events)"
+
+
+class CompactEventStore(CompactEventLog):
+    """Append-only CompactEventLog keeping every event once, events are identified by id (content hash without one).
+
+    add records histories that overlap (e.g. a step's input history followed by its new events) and returns
+    them as an EventView, so histories derived from each other share the stored events.
+    """
+
+    def __init__(self, events=()):
+        # event key -> position in the log
+        self._index = {}
+        super().__init__(events)
+
+    def add(self, *histories):
+        """Stores the events not stored yet, returns a view of the histories concatenated (each event once)"""
+        positions = array("q")
+        seen = set()
+        for history in histories:
+            if isinstance(history, EventView) and history.store is self:
+                # stored already, only the positions are copied
+                history_positions = history.positions
+            else:
+                history_positions = [self._add_event(event) for event in history or []]
+            for position in history_positions:
+                if position not in seen:
+                    seen.add(position)
+                    positions.append(position)
+        return EventView(self, positions)
+
+    def _add_event(self, event):
+        key = _event_key(event)
+        position = self._index.get(key)
+        if position is None:
+            position = len(self)
+            CompactEventLog.append(self, event)
+            self._index[key] = position
+        return position
+
+    def append(self, event):
+        self._add_event(event)
+
+    def extend(self, events):
+        self.add(events)
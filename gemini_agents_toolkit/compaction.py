@@ -0,0 +1,196 @@
+"""Background compaction of long sessions into a summary event"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from google.adk.agents import LlmAgent
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService
+from google.adk.sessions.state import State
+from google.genai import types as genai_types
+
+from gemini_agents_toolkit.config import SIMPLE_MODEL
+from gemini_agents_toolkit.metrics import estimate_tokens
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARIZER_INSTRUCTIONS = """You summarize the beginning of a conversation between a user and an AI agent so the agent can
+continue the conversation from the summary instead of the full transcript. Keep every fact, decision, number, name,
+tool result and open question the agent may need later, drop greetings and repetitions. Answer with the summary only."""
+
+
+def events_tokens(events):
+    """Estimated number of tokens the events add to the model context"""
+    return estimate_tokens([event.content for event in events if event.content])
+
+
+def _describe_part(part):
+    if part.text:
+        return part.text
+    if part.function_call:
+        return f"called {part.function_call.name}({part.function_call.args})"
+    if part.function_response:
+        return f"{part.function_response.name} returned {part.function_response.response}"
+    return ""
+
+
+def events_to_transcript(events):
+    lines = []
+    for event in events:
+        if event.content and event.content.parts:
+            text = " ".join(filter(None, (_describe_part(part) for part in event.content.parts)))
+            if text:
+                lines.append(f"{event.author}: {text}")
+    return "\n".join(lines)
+
+
+class AgentSummarizer:
+    """Summarizes events with a dedicated LlmAgent (a fresh session per summary)"""
+
+    def __init__(self, *, model=SIMPLE_MODEL, instruction=SUMMARIZER_INSTRUCTIONS):
+        self.model = model
+        self.instruction = instruction
+        self._service = None
+        self._lock = threading.Lock()
+
+    def _get_service(self):
+        with self._lock:
+            if self._service is None:
+                # imported here, agent.py does not depend on this module
+                from gemini_agents_toolkit.agent import ADKAgentService
+                self._service = ADKAgentService(
+                    agent=LlmAgent(model=self.model, name="session_summarizer", instruction=self.instruction),
+                    app_name="session_summarizer")
+            return self._service
+
+    def __call__(self, events):
+        summary, _ = self._get_service().send_message(events_to_transcript(events))
+        return summary
+
+
+class CompactionPolicy:
+    """Folds the older events of a session into one summary event once the session grows past max_tokens.
+
+    ADKAgentService checks the policy after every turn; compaction runs on a background thread. The summary
+    is written from a snapshot of the session without blocking it, the swap of the summarized events for the
+    summary event happens under the session lock and is skipped if the session changed in a way that
+    conflicts with the snapshot. The keep_recent_events last events are always kept as they are.
+    summarizer is a callable taking a list of events and returning the summary text.
+    """
+
+    def __init__(self, *, max_tokens=32000, keep_recent_events=10, summarizer=None, max_workers=1):
+        self.max_tokens = max_tokens
+        self.keep_recent_events = keep_recent_events
+        self.summarizer = summarizer if summarizer else AgentSummarizer()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="session_compaction")
+        self._lock = threading.Lock()
+        # sessions with a compaction queued or running, a session is never compacted twice at once
+        self._pending = {}
+        self.compactions = 0
+        self.failures = 0
+
+    def needs_compaction(self, events):
+        return len(events) > self.keep_recent_events + 1 and events_tokens(events) > self.max_tokens
+
+    def maybe_schedule(self, service, *, user_id, session_id, events):
+        """Queues a compaction of the session if events (the session as known after the turn) are over budget"""
+        if not self.needs_compaction(events):
+            return None
+        key = (service.app_name, user_id, session_id)
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            future = self._executor.submit(self._compact, service, user_id, session_id)
+            self._pending[key] = future
+        future.add_done_callback(lambda _: self._done(key))
+        return future
+
+    def _done(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def _split(self, events):
+        """Index of the first kept event, never between a function call and its response"""
+        split = len(events) - self.keep_recent_events
+        while split > 0 and events[split].get_function_responses():
+            split -= 1
+        return split
+
+    def _compact(self, service, user_id, session_id):
+        try:
+            return self._compact_session(service, user_id, session_id)
+        except Exception as e:
+            logging.exception(f"Compaction of session_id='{session_id}' failed: {e}")
+            with self._lock:
+                self.failures += 1
+            return False
+
+    def _compact_session(self, service, user_id, session_id):
+        # a tracing.TracedSessionService only records spans, the events are replaced in the store it wraps
+        session_service = getattr(service.session_service, "inner", service.session_service)
+        replace_events = getattr(session_service, "replace_events", None)
+        if replace_events is None and not isinstance(session_service, InMemorySessionService):
+            logging.warning(f"{type(session_service).__name__} can not replace session events atomically, "
+                            f"session_id='{session_id}' is not compacted.")
+            return False
+        snapshot = session_service.get_session(app_name=service.app_name, user_id=user_id, session_id=session_id)
+        if snapshot is None or not self.needs_compaction(snapshot.events):
+            return False
+        split = self._split(snapshot.events)
+        if split <= 1:
+            return False
+        summarized = snapshot.events[:split]
+        summary = self.summarizer(summarized)
+        summary_event = Event(author="user", content=genai_types.Content(
+            role="user", parts=[genai_types.Part(text=SUMMARY_PREFIX + summary)]))
+        summary_event.timestamp = summarized[-1].timestamp
+
+        summarized_ids = [event.id for event in summarized]
+        with service.session_locks.hold((user_id, session_id)):
+            if replace_events is not None:
+                # the store may be shared with other processes, the service checks the prefix in its transaction
+                kept = replace_events(app_name=service.app_name, user_id=user_id, session_id=session_id,
+                                      prefix_ids=summarized_ids, events=[summary_event])
+            else:
+                kept = self._rewrite_in_memory_session(session_service, service.app_name, user_id, session_id,
+                                                       summarized_ids, summary_event)
+        if kept is None:
+            logging.info(f"Session session_id='{session_id}' changed during compaction, compaction skipped.")
+            return False
+
+        logging.info(f"Compacted session_id='{session_id}': {len(summarized)} events folded into a summary, "
+                     f"{kept} kept.")
+        with self._lock:
+            self.compactions += 1
+        return True
+
+    @staticmethod
+    def _rewrite_in_memory_session(session_service, app_name, user_id, session_id, summarized_ids, summary_event):
+        """Recreates the session with the summary in place of the summarized events, returns the number of kept events.
+
+        Only safe for InMemorySessionService, the session lock of the service serializes it with the turns.
+        """
+        session = session_service.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        if session is None or [event.id for event in session.events[:len(summarized_ids)]] != summarized_ids:
+            return None
+        kept = session.events[len(summarized_ids):]
+        # app: and user: state lives outside the session and is merged back on read, temp: is never stored
+        state = {key: value for key, value in session.state.items()
+                 if not key.startswith((State.APP_PREFIX, State.USER_PREFIX, State.TEMP_PREFIX))}
+        session_service.delete_session(app_name=session.app_name, user_id=session.user_id, session_id=session.id)
+        new_session = session_service.create_session(
+            app_name=session.app_name, user_id=session.user_id, state=state, session_id=session.id)
+        for event in [summary_event] + kept:
+            session_service.append_event(session=new_session, event=event)
+        return len(kept)
+
+    def wait(self):
+        """Blocks until the queued compactions are done"""
+        with self._lock:
+            futures = list(self._pending.values())
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,349 @@
+"""Wrappers around ADK models (BaseLlm) adding behavior to every model request of an agent"""
+
+import asyncio
+import contextvars
+import logging
+import math
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.models import BaseLlm
+from google.adk.models.registry import LLMRegistry
+from google.api_core import exceptions as google_exceptions
+from google.genai import errors as genai_errors
+from pydantic import Field
+
+from gemini_agents_toolkit.config import SIMPLE_MODEL
+from gemini_agents_toolkit.metrics import estimate_tokens
+from gemini_agents_toolkit.rate_limiter import RateLimiter
+
+# Set by ADKAgentService for the model request in progress, called as listener(category, attempt, error)
+# before every retry so the service can attribute retries to its turn
+retry_listener = contextvars.ContextVar("retry_listener", default=None)
+# Set by ADKAgentService for the model request in progress to the ModelOptions of the service. The wrappers are
+# installed once per model, so services sharing an agent read their own policies from it per request
+model_options = contextvars.ContextVar("model_options", default=None)
+
+
+def iter_llm_agents(agent):
+    """Yields every LlmAgent of the agent tree"""
+    if not isinstance(agent, BaseAgent):
+        return
+    if isinstance(agent, LlmAgent):
+        yield agent
+    for sub_agent in agent.sub_agents:
+        yield from iter_llm_agents(sub_agent)
+
+
+def wrap_agent_models(agent, wrapper_class, *, innermost=False, **kwargs):
+    """Replaces the model of every LlmAgent of the tree with wrapper_class(inner=model, **kwargs).
+
+    With innermost the wrapper goes right around the actual model, below wrappers added before.
+    Agents whose model is already wrapped by wrapper_class are left alone, so several services can share an agent;
+    the wrapper's kwargs are only its defaults for requests sent without model_options.
+    """
+    for llm_agent in iter_llm_agents(agent):
+        model = llm_agent.canonical_model
+        if _find_wrapper(model, wrapper_class) is not None:
+            continue
+        parent = None
+        if innermost:
+            while isinstance(getattr(model, "inner", None), BaseLlm):
+                parent, model = model, model.inner
+        wrapper = wrapper_class(inner=model, model=model.model, **kwargs)
+        if parent is None:
+            llm_agent.model = wrapper
+        else:
+            parent.inner = wrapper
+
+
+def _option(name, default):
+    """The option of the service whose turn sent the request, default for requests sent outside of a service"""
+    options = model_options.get()
+    return default if options is None else getattr(options, name)
+
+
+def _find_wrapper(model, wrapper_class):
+    while model is not None:
+        if isinstance(model, wrapper_class):
+            return model
+        model = getattr(model, "inner", None)
+    return None
+
+
+@dataclass
+class Backoff:
+    """Backoff of one error category: up to max_attempts requests, full jitter delays of up to base * 2^n capped at cap"""
+    max_attempts: int
+    base: float
+    cap: float
+
+
+def _default_backoff():
+    return {
+        # quota errors need the longest pause before the window frees up
+        "rate_limit": Backoff(max_attempts=5, base=2.0, cap=32.0),
+        "server": Backoff(max_attempts=4, base=0.5, cap=8.0),
+        "timeout": Backoff(max_attempts=3, base=1.0, cap=8.0),
+        "network": Backoff(max_attempts=4, base=0.5, cap=8.0),
+    }
+
+
+@dataclass
+class RetryPolicy:
+    """Decides whether a failed model request is retried and how long to wait before it.
+
+    Errors are classified into categories (rate_limit, server, timeout, network) each with its own Backoff,
+    errors of any other kind (invalid request, permission denied, blocked prompt, ...) are never retried.
+    """
+    backoff: dict = field(default_factory=_default_backoff)
+
+    @staticmethod
+    def classify(error):
+        """Returns the retry category of the error, None if it should not be retried"""
+        if isinstance(error, (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted)):
+            return "rate_limit"
+        if isinstance(error, google_exceptions.DeadlineExceeded):
+            return "timeout"
+        if isinstance(error, google_exceptions.ServerError):
+            return "server"
+        if isinstance(error, genai_errors.APIError):
+            if error.code == 429:
+                return "rate_limit"
+            if error.code == 504:
+                return "timeout"
+            if error.code and error.code >= 500:
+                return "server"
+            return None
+        if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+            return "timeout"
+        if isinstance(error, ConnectionError):
+            return "network"
+        return None
+
+    def should_retry(self, category, attempt):
+        """Whether to make another request after attempt (1 based) failed with an error of category"""
+        backoff = self.backoff.get(category)
+        return backoff is not None and attempt < backoff.max_attempts
+
+    def delay(self, category, attempt):
+        backoff = self.backoff[category]
+        return random.uniform(0, min(backoff.cap, backoff.base * 2 ** (attempt - 1)))
+
+
+class RetryingLlm(BaseLlm):
+    """Retries a failed model request in place, so a transient error costs one more model call instead of a new turn.
+
+    A request is only retried while nothing of its response was yielded, a stream that fails half way
+    raises to the caller.
+    """
+    inner: BaseLlm
+    policy: RetryPolicy = Field(default_factory=RetryPolicy)
+
+    async def generate_content_async(self, llm_request, stream=False):
+        policy = _option("retry_policy", self.policy)
+        attempt = 0
+        while True:
+            attempt += 1
+            yielded = False
+            try:
+                async for llm_response in self.inner.generate_content_async(llm_request, stream=stream):
+                    yielded = True
+                    yield llm_response
+                return
+            except Exception as e:
+                category = policy.classify(e)
+                if yielded or category is None or not policy.should_retry(category, attempt):
+                    raise
+                delay = policy.delay(category, attempt)
+                logging.warning(f"Model request to '{self.model}' failed ({category}), retrying in {delay:.2f}s. "
+                                f"Attempt #{attempt}, Last error: {e}")
+                listener = retry_listener.get()
+                if listener is not None:
+                    listener(category, attempt, e)
+                await asyncio.sleep(delay)
+
+
+class RateLimitedLlm(BaseLlm):
+    """Waits for the RateLimiter before every model request (each retry included).
+
+    Prompt tokens are estimated before the request, the response tokens are charged once it arrived.
+    """
+    inner: BaseLlm
+    limiter: RateLimiter
+
+    async def generate_content_async(self, llm_request, stream=False):
+        limiter = _option("rate_limiter", self.limiter)
+        await limiter.acquire(self.model, estimate_tokens(llm_request.contents))
+        async for llm_response in self.inner.generate_content_async(llm_request, stream=stream):
+            if not llm_response.partial and llm_response.content:
+                limiter.record_tokens(self.model, estimate_tokens([llm_response.content]))
+            yield llm_response
+
+
+class LatencyTracker:
+    """Latencies of the last window model responses, per model"""
+
+    def __init__(self, *, window=200):
+        self.window = window
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def record(self, model, seconds):
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model, q, *, min_samples=1):
+        """The q (0..1) quantile of the model's recent latencies, None with fewer than min_samples of them"""
+        with self._lock:
+            latencies = sorted(self._latencies.get(model, ()))
+        if not latencies or len(latencies) < min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, max(0, math.ceil(q * len(latencies)) - 1))]
+
+    def stats(self):
+        with self._lock:
+            counts = {model: len(latencies) for model, latencies in self._latencies.items()}
+        return {model: {"count": count, "p50": self.percentile(model, 0.5), "p95": self.percentile(model, 0.95)}
+                for model, count in counts.items()}
+
+
+class HedgingPolicy:
+    """When to send a duplicate of a slow model request to a fallback model.
+
+    A request that has not answered after the percentile latency of its model (default_delay until
+    min_samples latencies are known) is sent to fallback as well, the first answer wins. fallback is a
+    model name or a BaseLlm, it may be the same model to hedge against a slow endpoint.
+    """
+
+    def __init__(self, *, fallback=SIMPLE_MODEL, percentile=0.95, min_samples=20, default_delay=2.0, tracker=None):
+        self.fallback = fallback
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.tracker = tracker if tracker else LatencyTracker()
+        self._lock = threading.Lock()
+        self.hedged = 0
+        self.fallback_wins = 0
+
+    def hedge_delay(self, model):
+        delay = self.tracker.percentile(model, self.percentile, min_samples=self.min_samples)
+        return delay if delay is not None else self.default_delay
+
+    def fallback_llm(self):
+        return LLMRegistry.new_llm(self.fallback) if isinstance(self.fallback, str) else self.fallback
+
+    def count(self, *, fallback_won):
+        with self._lock:
+            self.hedged += 1
+            self.fallback_wins += int(fallback_won)
+
+
+@dataclass
+class ModelOptions:
+    """How one service sends the model requests of its turns"""
+    retry_policy: RetryPolicy
+    rate_limiter: RateLimiter
+    # prompt_cache.PrefixCacheManager of the service, None sends the requests in full
+    context_cache: object = None
+    # slow requests are raced against hedge_fallback (the service's wrapped fallback model) when hedging is set
+    hedging: HedgingPolicy = None
+    hedge_fallback: BaseLlm = None
+
+
+class _Attempt:
+    """One request of a hedged call, its responses are pushed to a queue as ("response" | "done" | "error", value)"""
+
+    def __init__(self, llm, llm_request, stream):
+        self.llm = llm
+        self.started = time.monotonic()
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run(llm_request, stream))
+
+    async def _run(self, llm_request, stream):
+        try:
+            async for llm_response in self.llm.generate_content_async(llm_request, stream=stream):
+                await self.queue.put(("response", llm_response))
+            await self.queue.put(("done", None))
+        except Exception as e:
+            await self.queue.put(("error", e))
+
+
+class HedgedLlm(BaseLlm):
+    """Sends a duplicate of a slow model request to the policy's fallback model, the first response wins.
+
+    The race is decided by the first response (chunk), the losing request is cancelled. The time to the first
+    response of every request is recorded in the policy's LatencyTracker. Requests of a service without
+    hedging (model_options) are sent to the inner model only.
+    """
+    inner: BaseLlm
+    fallback: BaseLlm
+    policy: HedgingPolicy
+
+    def _hedge(self, fallback, attempts, llm_request, stream, reason):
+        logging.info(f"Model request to '{self.inner.model}' {reason}, hedging with '{fallback.model}'")
+        attempts.append(_Attempt(fallback, llm_request.model_copy(update={"model": fallback.model}), stream))
+
+    async def _race(self, policy, fallback, attempts, getters, llm_request, stream):
+        """Waits for the first attempt to answer, sends the hedge once the primary is late or overloaded"""
+        timeout = policy.hedge_delay(self.inner.model)
+        primary = attempts[0]
+        errors = {}
+        while True:
+            for attempt in attempts:
+                if attempt not in getters.values():
+                    getters[asyncio.ensure_future(attempt.queue.get())] = attempt
+            if not getters:
+                # every attempt failed, the error of the primary is the one to report
+                raise errors[primary]
+            done, _ = await asyncio.wait(getters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                self._hedge(fallback, attempts, llm_request, stream, f"takes longer than {timeout:.2f}s")
+                timeout = None
+                continue
+            for getter in done:
+                attempt = getters.pop(getter)
+                kind, value = getter.result()
+                if kind != "error":
+                    return attempt, (kind, value)
+                errors[attempt] = value
+                attempts.remove(attempt)
+                if timeout is not None and RetryPolicy.classify(value) is not None:
+                    # the primary is overloaded (its retries included), the fallback may still answer
+                    self._hedge(fallback, attempts, llm_request, stream, f"failed ({value})")
+                    timeout = None
+
+    async def generate_content_async(self, llm_request, stream=False):
+        options = model_options.get()
+        policy, fallback = (self.policy, self.fallback) if options is None else (options.hedging, options.hedge_fallback)
+        if policy is None:
+            async for llm_response in self.inner.generate_content_async(llm_request, stream=stream):
+                yield llm_response
+            return
+        attempts = [_Attempt(self.inner, llm_request, stream)]
+        getters = {}
+        try:
+            winner, (kind, value) = await self._race(policy, fallback, attempts, getters, llm_request, stream)
+            policy.tracker.record(winner.llm.model, time.monotonic() - winner.started)
+            if winner.llm is fallback or len(attempts) > 1:
+                policy.count(fallback_won=winner.llm is fallback)
+            for attempt in attempts:
+                if attempt is not winner:
+                    # a lower bound of its latency, slow requests have to count in the percentile as well
+                    policy.tracker.record(attempt.llm.model, time.monotonic() - attempt.started)
+                    attempt.task.cancel()
+
+            while kind == "response":
+                yield value
+                kind, value = await winner.queue.get()
+            if kind == "error":
+                raise value
+        finally:
+            for getter in getters:
+                getter.cancel()
+            for attempt in attempts:
+                attempt.task.cancel()
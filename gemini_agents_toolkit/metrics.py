@@ -0,0 +1,187 @@
+"""Metrics reported by ADKAgentService and an in-process registry exportable in Prometheus text format"""
+
+import bisect
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TURN_DURATION = "gemini_agents_turn_duration_seconds"
+MODEL_CALL_DURATION = "gemini_agents_model_call_duration_seconds"
+TOOL_CALL_DURATION = "gemini_agents_tool_call_duration_seconds"
+TOOL_CALLS = "gemini_agents_tool_calls_total"
+TOKENS = "gemini_agents_tokens_total"
+RETRIES = "gemini_agents_retries_total"
+ERRORS = "gemini_agents_errors_total"
+
+_HELP = {
+    TURN_DURATION: "Wall time of a send_message turn",
+    MODEL_CALL_DURATION: "Wall time of a single model call",
+    TOOL_CALL_DURATION: "Wall time of a single tool call",
+    TOOL_CALLS: "Number of tool calls",
+    TOKENS: "Number of tokens sent to (prompt) and received from (completion) the model",
+    RETRIES: "Number of retried attempts",
+    ERRORS: "Number of errors by category",
+}
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def estimate_tokens(contents):
+    """Rough token count of a list of genai Content objects (~4 characters per token), for responses without usage metadata"""
+    characters = 0
+    for content in contents or []:
+        for part in content.parts or []:
+            if part.text:
+                characters += len(part.text)
+            if part.function_call:
+                characters += len(part.function_call.name or "") + len(json.dumps(part.function_call.args or {}, default=str))
+            if part.function_response:
+                characters += len(json.dumps(part.function_response.response or {}, default=str))
+    return (characters + 3) // 4
+
+
+class MetricsRecorder:
+    """The interface ADKAgentService reports metrics to, this base implementation drops everything.
+
+    Implement increment() and observe() to forward metrics to another system (StatsD, OpenTelemetry, ...).
+    """
+
+    def increment(self, name, amount=1, labels=None):
+        """Adds amount to the counter name"""
+
+    def observe(self, name, value, labels=None):
+        """Records a value (e.g. a duration in seconds) of the histogram name"""
+
+
+class _Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimates the quantile by linear interpolation inside the bucket, like Prometheus does"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+def _labels_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(labels_key, extra=()):
+    items = list(labels_key) + list(extra)
+    if not items:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in items)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + "}"
+
+
+class InProcessMetrics(MetricsRecorder):
+    """Thread-safe in-process registry of counters and histograms.
+
+    Metrics can be exported in Prometheus text format with to_prometheus_text(), written to a file for the
+    node exporter textfile collector with write_prometheus_file() or served from a local endpoint with serve().
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def increment(self, name, amount=1, labels=None):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=None):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.observe(value)
+
+    def get_counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get((name, _labels_key(labels)), 0)
+
+    def get_histogram_count(self, name, **labels):
+        with self._lock:
+            histogram = self._histograms.get((name, _labels_key(labels)))
+            return histogram.count if histogram else 0
+
+    def quantile(self, name, q, **labels):
+        """Estimated quantile (e.g. 0.99) of the histogram name, None if nothing was observed"""
+        with self._lock:
+            histogram = self._histograms.get((name, _labels_key(labels)))
+            return histogram.quantile(q) if histogram else None
+
+    def to_prometheus_text(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            last_name = None
+            for (name, labels_key), value in counters:
+                if name != last_name:
+                    lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                    lines.append(f"# TYPE {name} counter")
+                    last_name = name
+                lines.append(f"{name}{_format_labels(labels_key)} {value}")
+            for (name, labels_key), histogram in histograms:
+                if name != last_name:
+                    lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                    lines.append(f"# TYPE {name} histogram")
+                    last_name = name
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels_key, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels_key, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels_key)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels_key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus_file(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus_text())
+
+    def serve(self, port=9464, host="127.0.0.1"):
+        """Serves the metrics on http://host:port/metrics from a daemon thread, returns the server (call shutdown())"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                body = metrics.to_prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
@@ -1,4 +1,12 @@
+import inspect
+import threading
+
 from gemini_agents_toolkit.history_utils import summarize, print_history
+from gemini_agents_toolkit.compact_events import CompactEventStore
+from gemini_agents_toolkit.pipeline.checkpoints import CheckpointStore, completed
+from gemini_agents_toolkit.pipeline.dag import DagStep, merge_histories, run_dag
+from gemini_agents_toolkit.pipeline.typed import (TypedAnswerError, batch_schema, parse_batch_answer, parse_typed_answer,
+                                                  response_schema)
 from gemini_agents_toolkit.config import SIMPLE_MODEL
 from gemini_agents_toolkit import agent
 from google.adk.agents import LlmAgent
@@ -59,27 +67,110 @@ STRING_ARRAY_SCHEMA = {
 }
 
 
+_RETURN_TYPE_KINDS = {str: "step", bool: "boolean", int: "int", float: "float", list: "string_array"}
+# kind of a typed question -> (its schema, conversion of the validated content to the result)
+_TYPED_KINDS = {
+    "boolean": (BOOLEAN_SCHEMA, lambda content: content == "True"),
+    "int": (INT_SCHEMA, int),
+    "float": (FLOAT_SCHEMA, float),
+    "char": (CHAR_SCHEMA, lambda content: content),
+    "string_array": (STRING_ARRAY_SCHEMA, lambda content: content),
+}
+
+
 class Pipeline(object):
-    def __init__(self, *, default_agent=None, logger=None, use_convert_to_bool_agent=False, use_convert_agent_helper=False, debug=False):
+    def __init__(self, *, default_agent=None, logger=None, use_convert_to_bool_agent=False, use_convert_agent_helper=False, debug=False,
+                 checkpoints=None):
         self.agent = default_agent
         self.logger = logger
-        self._full_history = []
+        # every event of the pipeline, stored once and compactly since long pipelines collect thousands of them,
+        # step histories are views of it
+        self._full_history = CompactEventStore()
+        self._history_lock = threading.Lock()
+        # set per thread while a DAG step runs, its events are recorded once the DAG is done
+        self._deferred_history = threading.local()
         self.debug = debug
+        self.convert_agent = None
+        # typed answers that did not pass the local validation and were sent to convert_agent
+        self.convert_fallbacks = 0
+        # Optional CheckpointStore (or the path of its file), completed steps are then stored and replayed
+        # from it when the pipeline runs again
+        self.checkpoints = CheckpointStore(checkpoints) if isinstance(checkpoints, str) else checkpoints
         if use_convert_agent_helper or use_convert_to_bool_agent:
             self.convert_agent = agent.ADKAgentService(agent=LlmAgent(
-                model=SIMPLE_MODEL, name="convert_agent", instruction=CONVERT_BOT_SYSTEM_INSTRUCTIONS))\
+                model=SIMPLE_MODEL, name="convert_agent", instruction=CONVERT_BOT_SYSTEM_INSTRUCTIONS))
 
     def _convert_to_type(self, message, return_type_schema):
-        if not self.convert_agent:
-            return message
+        """The content of a typed answer, convert_agent is only asked when the answer does not follow the schema"""
+        try:
+            return parse_typed_answer(message, return_type_schema)
+        except TypedAnswerError as e:
+            if not self.convert_agent:
+                raise TypedAnswerError(f"Answer does not follow the schema ({e}): {message}") from None
+            self._log_info(f"Typed answer does not follow the schema ({e}), converting it")
+        with self._history_lock:
+            self.convert_fallbacks += 1
         message_to_agent = f"response from other agent: {message}, expected schema: {return_type_schema}"
-        response, events = self.convert_agent.send_message(message_to_agent)
-        self._full_history.extend(events)
-        if "```json" in response:
-            response = response.replace("```json","").replace("```", "")
+        response, events = self._send_message(
+            self.convert_agent, message_to_agent, step_prompt=message_to_agent,
+            response_schema=response_schema(return_type_schema),
+            checkpoint_if=lambda answer: self._follows_schema(answer, return_type_schema))
+        self._record_history(events)
         if self.debug:
-            print("#### response after json: " + str(eval(response)))
-        return eval(response)["content"]
+            print("#### response after conversion: " + response)
+        return parse_typed_answer(response, return_type_schema)
+
+    @staticmethod
+    def _follows_schema(answer, type_schema):
+        try:
+            parse_typed_answer(answer, type_schema)
+        except TypedAnswerError:
+            return False
+        return True
+
+    @staticmethod
+    def _accepts_response_schema(agent_to_use):
+        """Whether agent_to_use.send_message takes response_schema (custom pipeline agents may not)"""
+        try:
+            parameters = inspect.signature(agent_to_use.send_message).parameters.values()
+        except (TypeError, ValueError):
+            return False
+        return any(parameter.name == "response_schema" or parameter.kind == inspect.Parameter.VAR_KEYWORD
+                   for parameter in parameters)
+
+    def _send_message(self, agent_to_use, prompt, *, step_prompt, events=None, checkpoint_if=None, **kwargs):
+        """agent_to_use.send_message, replayed from the checkpoint store when the same step completed before.
+
+        A completed step is only stored when checkpoint_if(answer) is true (if set), so an answer the caller
+        rejects is asked again on the next run instead of being replayed.
+        """
+        if "response_schema" in kwargs and not self._accepts_response_schema(agent_to_use):
+            # the step's answer is still parsed and validated locally
+            kwargs.pop("response_schema")
+        if self.checkpoints is None:
+            return agent_to_use.send_message(prompt, events=events, **kwargs)
+        key = self.checkpoints.make_key(agent=agent_to_use, prompt=prompt, history=events)
+        checkpoint = self.checkpoints.get(key)
+        if checkpoint is not None:
+            self._log_info(f"Replaying checkpointed step: {step_prompt}")
+            return checkpoint
+        answer, delta_events = agent_to_use.send_message(prompt, events=events, **kwargs)
+        if completed(delta_events):
+            if checkpoint_if is None or checkpoint_if(answer):
+                self.checkpoints.put(key, prompt=step_prompt, answer=answer, events=delta_events)
+            else:
+                self._log_info(f"Not checkpointing rejected answer of step: {step_prompt}")
+        return answer, delta_events
+
+    def _record_history(self, *histories):
+        """Adds the histories to the full history, returns them concatenated (each event once)"""
+        deferred = getattr(self._deferred_history, "events", None)
+        if deferred is not None:
+            merged = merge_histories(histories)
+            deferred.extend(merged)
+            return merged
+        with self._history_lock:
+            return self._full_history.add(*histories)
 
     def _get_agent(self, agent):
         if agent:
@@ -106,12 +197,106 @@ class Pipeline(object):
         final_history = events
         if isinstance(steps, list):
             for step in steps:
-                final_result, delta_history = self.step(step, agent=agent_to_use, events=final_history, debug=debug)
-                final_history += delta_history
+                # the history of a step is its input history followed by the step's events
+                final_result, final_history = self.step(step, agent=agent_to_use, events=final_history, debug=debug)
         else:
             final_result, final_history = self.step(steps, agent=agent_to_use, events=final_history, debug=debug)
         return final_result, final_history
 
+    def dag(self, steps, *, agent=None, events=None, max_concurrency=4, debug=False):
+        """Runs DagSteps, steps that do not depend on each other run concurrently (max_concurrency at a time).
+
+        Returns {step name: (result, history)}. The full history of the pipeline gets the events of the steps
+        in their declared order, whatever order they finished in.
+        """
+        for dag_step in steps:
+            if dag_step.kind not in self._step_kinds():
+                raise ValueError(f"Unknown kind of DAG step '{dag_step.name}': {dag_step.kind}")
+        self._log_info(f"dag: {len(steps)} steps, max_concurrency={max_concurrency}")
+        recorded = {}
+
+        def run_step(dag_step, prompt, history):
+            self._deferred_history.events = recorded[dag_step.name] = []
+            try:
+                step_method = self._step_kinds()[dag_step.kind]
+                return step_method(prompt, agent=dag_step.agent or agent, events=history, debug=debug)
+            finally:
+                self._deferred_history.events = None
+
+        try:
+            return run_dag(run_step, steps, events=events, max_concurrency=max_concurrency)
+        finally:
+            for dag_step in steps:
+                if dag_step.name in recorded:
+                    self._record_history(recorded[dag_step.name])
+
+    def map_step(self, prompt_template, items, *, agent=None, events=None, max_concurrency=8, return_type="step", debug=False):
+        """Runs prompt_template once per item ({item} is replaced with it), max_concurrency items at a time.
+
+        Every item starts from its own copy of events. return_type is a step kind (step, boolean, int, float,
+        char, string_array) or one of str, bool, int, float, list. Returns the results in the order of items
+        and the history: events followed by the events of every item, in the order of items.
+        """
+        kind = _RETURN_TYPE_KINDS.get(return_type, return_type)
+        items = list(items)
+        self._log_info(f"map_step: {prompt_template}, {len(items)} items")
+        steps = [DagStep(name=f"item_{index}", prompt=prompt_template.replace("{item}", str(item)), kind=kind)
+                 for index, item in enumerate(items)]
+        outputs = self.dag(steps, agent=agent, events=events, max_concurrency=max_concurrency, debug=debug)
+        results = [outputs[step.name][0] for step in steps]
+        history = merge_histories([events] + [outputs[step.name][1] for step in steps])
+        return results, history
+
+    def typed_batch(self, questions, *, agent=None, events=None, debug=False):
+        """Answers independent typed questions about the same history with a single request.
+
+        questions is {name: (prompt, type)}, type is boolean, int, float, char, string_array or one of bool,
+        int, float, str, list. Returns ({name: result}, history). Questions whose answer in the batch does not
+        follow their schema are asked again one by one, as the typed step of their type.
+        """
+        kinds = {}
+        for name, (_, return_type) in questions.items():
+            kind = "char" if return_type is str else _RETURN_TYPE_KINDS.get(return_type, return_type)
+            if kind not in _TYPED_KINDS:
+                raise ValueError(f"Unknown type of question '{name}': {return_type}")
+            kinds[name] = kind
+        debug_mode = self.debug or debug
+        self._log_info(f"typed_batch: {len(questions)} questions")
+        type_schemas = {name: _TYPED_KINDS[kind][0] for name, kind in kinds.items()}
+        schema = batch_schema(type_schemas)
+        question_lines = "\n".join(f"        {name}: {prompt}" for name, (prompt, _) in questions.items())
+        prompt = f"""this is one step in the pipeline, this steps are user command but not coming directly from the user:
+        User asks several questions, answer each of them under its name, user expects the answers to follow the json schema:
+        {schema}
+        you have to return respones with the JSON that comply with the schema ONLY.
+        Questions:
+{question_lines}
+
+        IMPORTANT: remember you ONLY can return answer that comply with the schema, no print(...) or any computational code or any other print statement"""
+        agent_to_use = self._get_agent(agent)
+
+        step_prompt = "\n".join(f"{name}: {question_prompt}" for name, (question_prompt, _) in questions.items())
+        answer, delta_events = self._send_message(agent_to_use, prompt, step_prompt=step_prompt, events=events,
+                                                  response_schema=schema)
+        history = self._record_history(events, delta_events)
+        values, errors = parse_batch_answer(answer, type_schemas)
+        if debug_mode:
+            print(f"###### => batch response from agent: {answer}")
+            print(f"###### => invalid answers: {errors}")
+
+        results = {name: _TYPED_KINDS[kinds[name]][1](value) for name, value in values.items()}
+        for name, error in errors.items():
+            self._log_info(f"Answer to '{name}' does not follow its schema ({error}), asking it separately")
+            question_prompt = questions[name][0]
+            results[name], question_history = self._step_kinds()[kinds[name]](question_prompt, agent=agent_to_use,
+                                                                               events=events, debug=debug)
+            history = self._record_history(history, question_history)
+        return {name: results[name] for name in questions}, history
+
+    def _step_kinds(self):
+        return {"step": self.step, "boolean": self.boolean_step, "int": self.int_step, "float": self.float_step,
+                "char": self.char_step, "string_array": self.string_array_step}
+
     def step(self, prompt, *, agent=None, events=None, debug=False):
         debug_mode = self.debug or debug
         if debug_mode:
@@ -121,11 +306,13 @@ class Pipeline(object):
 
         if self.logger:
             self.logger.info(f"step: {prompt}")
+        step_prompt = prompt
         prompt = f"""this is one step in the pipeline, this steps are user command but not coming directly from the user:
         user prompt: {prompt}"""
         agent_to_use = self._get_agent(agent)
-        result, updated_history = agent_to_use.send_message(prompt, events=events)
-        self._full_history.extend(updated_history)
+        result, delta_history = self._send_message(agent_to_use, prompt, step_prompt=step_prompt, events=events)
+        # send_message only returns the events of this turn, the step history is the input history plus them
+        updated_history = self._record_history(events, delta_history)
 
         if debug_mode:
             print(f"###### => response from agent: {result}")
@@ -145,7 +332,7 @@ class Pipeline(object):
     
     def boolean_step(self, prompt, *, agent=None, events=None, debug=False):
         bool_answer, events = self._typed_step(prompt, agent=agent, events=events, debug=debug, type_schema=BOOLEAN_SCHEMA)
-        return eval(bool_answer), events
+        return bool_answer == "True", events
 
     def int_step(self, prompt, *, agent=None, events=None, debug=False):
         int_answer, events = self._typed_step(prompt, agent=agent, events=events, debug=debug, type_schema=INT_SCHEMA)
@@ -168,6 +355,7 @@ class Pipeline(object):
             print("*** INPUT HISTORY ***\n\n")
             print_history(events)
 
+        step_prompt = prompt
         #TODO think to rename user prompt to simple user question.
         prompt = f"""this is one step in the pipeline, this steps are user command but not coming directly from the user:
         Following prompt provided by user, and user expects this to have answer following the json schema:
@@ -178,7 +366,11 @@ class Pipeline(object):
         IMPORTANT: remember you ONLY can return answer that comply with the schema, no print(...) or any computational code or any other print statement"""
         agent_to_use = self._get_agent(agent)
 
-        original_typed_answer, events = agent_to_use.send_message(prompt, events=events)
+        # an invalid answer is only worth replaying when convert_agent can still convert it
+        original_typed_answer, delta_events = self._send_message(
+            agent_to_use, prompt, step_prompt=step_prompt, events=events, response_schema=response_schema(type_schema),
+            checkpoint_if=lambda answer: bool(self.convert_agent) or self._follows_schema(answer, type_schema))
+        events = self._record_history(events, delta_events)
         typed_answer = self._convert_to_type(original_typed_answer, type_schema)
 
         if debug_mode:
@@ -189,14 +381,13 @@ class Pipeline(object):
             print_history(events)
             print(f"###### END OF\n=> user prompt: {prompt}\n#################\n\n\n")
 
-        self._full_history.extend(events)
         return typed_answer, events
         
     def summarize_full_history(self, *, agent=None):
         agent_to_use = self._get_agent(agent)
 
         summary_text, events = summarize(agent=agent_to_use, events=self._full_history)
-        self._full_history.extend(events)
+        self._record_history(events)
         return f"SUMMARY:\n{summary_text}", events
     
     def get_full_history(self):
@@ -0,0 +1,96 @@
+"""Local store of completed pipeline steps, so a re-run pipeline replays them instead of calling the agent again"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from google.adk.events import Event
+
+from gemini_agents_toolkit.response_cache import _describe_event, agent_fingerprint
+
+
+def completed(events):
+    """Whether a step that produced the events finished with an answer of the agent (failed turns are not stored)"""
+    if not events:
+        return False
+    last = events[-1]
+    return last.author != "user" and not last.error_code and last.is_final_response()
+
+
+class CheckpointStore:
+    """SQLite file of the answers and history deltas of pipeline steps.
+
+    A step is keyed by a hash of its prompt, its agent (instructions, model, tools) and its input history,
+    so changing any of them runs the step again. Stored steps never expire, they are dropped with
+    invalidate (by key or by prompt) or clear.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints (key TEXT PRIMARY KEY, prompt TEXT, created_at REAL, answer TEXT, events TEXT)")
+        self._db.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @staticmethod
+    def make_key(*, agent, prompt, history):
+        payload = {
+            # pipelines get ADKAgentService objects, what shapes the answers is the ADK agent inside
+            "agent": agent_fingerprint(getattr(agent, "agent", agent)),
+            "history": [_describe_event(event) for event in history or []],
+            "prompt": prompt,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns (answer, events) of the stored step or None"""
+        with self._lock:
+            row = self._db.execute("SELECT answer, events FROM checkpoints WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        answer, events = row
+        return answer, [Event.model_validate_json(event) for event in json.loads(events)]
+
+    def put(self, key, *, prompt, answer, events):
+        serialized = json.dumps([event.model_dump_json(exclude_none=True) for event in events])
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                             (key, prompt, time.time(), answer, serialized))
+            self._db.commit()
+            self.stores += 1
+
+    def invalidate(self, key=None, *, prompt=None):
+        """Drops the step stored under key, or every step sent with prompt, returns the number of dropped steps"""
+        if (key is None) == (prompt is None):
+            raise ValueError("either key or prompt should be set")
+        with self._lock:
+            if key is not None:
+                cursor = self._db.execute("DELETE FROM checkpoints WHERE key = ?", (key,))
+            else:
+                cursor = self._db.execute("DELETE FROM checkpoints WHERE prompt = ?", (prompt,))
+            self._db.commit()
+            return cursor.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM checkpoints")
+            self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self):
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+            return {"steps": count, "hits": self.hits, "misses": self.misses, "stores": self.stores}
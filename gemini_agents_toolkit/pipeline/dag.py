@@ -0,0 +1,119 @@
+"""Running pipeline steps as a DAG, independent steps run concurrently"""
+
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+
+@dataclass
+class DagStep:
+    """A step of Pipeline.dag.
+
+    {name} placeholders in the prompt are replaced with the results of the steps listed in inputs. The step
+    starts once its inputs and depends_on steps are done, with their histories merged as its input history.
+    kind is the pipeline step to run: step, boolean, int, float, char or string_array.
+    """
+    name: str
+    prompt: str
+    inputs: list = field(default_factory=list)
+    depends_on: list = field(default_factory=list)
+    kind: str = "step"
+    agent: object = None
+
+    @property
+    def dependencies(self):
+        return list(dict.fromkeys(list(self.inputs) + list(self.depends_on)))
+
+
+def validate_dag(steps):
+    """Raises ValueError for duplicate names, unknown dependencies and cycles, returns {name: step}"""
+    by_name = {}
+    for step in steps:
+        if step.name in by_name:
+            raise ValueError(f"Duplicate DAG step name: {step.name}")
+        by_name[step.name] = step
+    for step in steps:
+        unknown = [name for name in step.dependencies if name not in by_name]
+        if unknown:
+            raise ValueError(f"DAG step '{step.name}' depends on unknown steps: {unknown}")
+
+    visiting, done = set(), set()
+
+    def visit(name, path):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"DAG has a cycle: {' -> '.join(path + [name])}")
+        visiting.add(name)
+        for dependency in by_name[name].dependencies:
+            visit(dependency, path + [name])
+        visiting.discard(name)
+        done.add(name)
+
+    for step in steps:
+        visit(step.name, [])
+    return by_name
+
+
+def merge_histories(histories):
+    """Concatenates the histories in the given order, events already taken from an earlier history are skipped"""
+    merged, seen = [], set()
+    for history in histories:
+        for event in history or []:
+            event_id = getattr(event, "id", None)
+            if event_id:
+                if event_id in seen:
+                    continue
+                seen.add(event_id)
+            merged.append(event)
+    return merged
+
+
+def format_prompt(prompt, inputs):
+    for name, value in inputs.items():
+        prompt = prompt.replace("{" + name + "}", str(value))
+    return prompt
+
+
+def run_dag(run_step, steps, *, events=None, max_concurrency=4):
+    """Runs the steps on max_concurrency threads, returns {name: (result, history)}.
+
+    run_step(step, prompt, events) runs one step and returns its (result, history). A step's input history
+    is events followed by the histories of its dependencies in their declared order. If a step fails no new
+    steps are started and the first error is raised once the running ones finished.
+    """
+    by_name = validate_dag(steps)
+    outputs = {}
+    pending = {step.name for step in steps}
+    running = {}
+    error = None
+
+    def ready():
+        # declaration order, so runs with max_concurrency=1 are reproducible
+        return [step for step in steps if step.name in pending and all(name in outputs for name in step.dependencies)]
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="pipeline_dag") as executor:
+        while pending or running:
+            if error is None:
+                for step in ready():
+                    if len(running) >= max_concurrency:
+                        break
+                    pending.discard(step.name)
+                    prompt = format_prompt(step.prompt, {name: outputs[name][0] for name in step.inputs})
+                    history = merge_histories([events] + [outputs[name][1] for name in step.dependencies])
+                    logging.debug(f"Starting DAG step '{step.name}'")
+                    running[executor.submit(run_step, step, prompt, history)] = step
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step = running.pop(future)
+                try:
+                    outputs[step.name] = future.result()
+                except Exception as e:
+                    logging.error(f"DAG step '{step.name}' failed: {e}")
+                    if error is None:
+                        error = e
+    if error is not None:
+        raise error
+    return {name: outputs[name] for name in by_name}
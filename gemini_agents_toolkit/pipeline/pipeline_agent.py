@@ -14,5 +14,10 @@ class AbstractPipelineAgent(ABC):
 
     @abstractmethod
     def send_message(self, msg: str, *, events = None) -> tuple[str, list]:
-        """This method must be overridden by subclasses"""
+        """This method must be overridden by subclasses.
+
+        Returns the response and the events produced by this message (not including the input events).
+        Subclasses may also take a response_schema keyword, typed pipeline steps then pass the JSON schema
+        the answer should follow; agents without it only get the prompt.
+        """
         pass
@@ -0,0 +1,118 @@
+"""Local parsing and validation of the JSON answers of typed pipeline steps"""
+
+import copy
+import json
+
+
+class TypedAnswerError(ValueError):
+    """The answer is not JSON following the step's schema"""
+
+
+def response_schema(type_schema):
+    """The schema to request structured output with, the answer's content is required"""
+    schema = copy.deepcopy(type_schema)
+    schema.setdefault("required", list(schema.get("properties", {})))
+    return schema
+
+
+def _strip_code_fence(answer):
+    text = answer.strip()
+    if text.startswith("```"):
+        text = text[3:]
+        if text[:4].lower() == "json":
+            text = text[4:]
+        if text.endswith("```"):
+            text = text[:-3]
+    return text.strip()
+
+
+def validate_value(value, schema):
+    """Returns the value converted to the schema's type, raises TypedAnswerError if it can not be"""
+    kind = str(schema.get("type", "")).upper()
+    if kind == "STRING":
+        if isinstance(value, bool):
+            value = str(value)
+        if not isinstance(value, str):
+            raise TypedAnswerError(f"expected a string, got {value!r}")
+        if "enum" in schema:
+            matches = [option for option in schema["enum"] if option.lower() == value.strip().lower()]
+            if not matches:
+                raise TypedAnswerError(f"expected one of {schema['enum']}, got {value!r}")
+            return matches[0]
+        return value
+    if kind in ("NUMBER", "INTEGER"):
+        if isinstance(value, str):
+            try:
+                value = json.loads(value.strip())
+            except json.JSONDecodeError:
+                raise TypedAnswerError(f"expected a number, got {value!r}") from None
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise TypedAnswerError(f"expected a number, got {value!r}")
+        if kind == "INTEGER":
+            if isinstance(value, float) and not value.is_integer():
+                raise TypedAnswerError(f"expected an integer, got {value!r}")
+            return int(value)
+        return float(value)
+    if kind == "ARRAY":
+        if not isinstance(value, list):
+            raise TypedAnswerError(f"expected an array, got {value!r}")
+        return [validate_value(item, schema.get("items", {})) for item in value]
+    if kind == "OBJECT":
+        if not isinstance(value, dict):
+            raise TypedAnswerError(f"expected an object, got {value!r}")
+        missing = [name for name in schema.get("properties", {}) if name not in value]
+        if missing:
+            raise TypedAnswerError(f"missing {missing}")
+        return {name: validate_value(value[name], property_schema)
+                for name, property_schema in schema.get("properties", {}).items()}
+    return value
+
+
+def parse_typed_answer(answer, type_schema):
+    """The content of a typed step's answer ({"content": ...} JSON), validated against type_schema.
+
+    A bare value (e.g. 42 or True) is accepted as the content as well. Raises TypedAnswerError if the answer
+    does not follow the schema.
+    """
+    text = _strip_code_fence(answer or "")
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        parsed = text
+    if not isinstance(parsed, dict):
+        parsed = {"content": parsed}
+    return validate_value(parsed, type_schema)["content"]
+
+
+def batch_schema(type_schemas):
+    """One object schema answering several typed questions, {name: type schema} -> {name: content}"""
+    return {
+        "type": "object",
+        "properties": {name: copy.deepcopy(schema["properties"]["content"]) for name, schema in type_schemas.items()},
+        "required": list(type_schemas),
+    }
+
+
+def parse_batch_answer(answer, type_schemas):
+    """Validates the answer of a batch of typed questions, returns ({name: content}, {name: error}).
+
+    Every question is validated on its own, so one bad answer does not invalidate the others.
+    """
+    text = _strip_code_fence(answer or "")
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        parsed = None
+    if not isinstance(parsed, dict):
+        error = TypedAnswerError(f"expected a JSON object, got {text[:100]!r}")
+        return {}, {name: error for name in type_schemas}
+    values, errors = {}, {}
+    for name, schema in type_schemas.items():
+        if name not in parsed:
+            errors[name] = TypedAnswerError("no answer")
+            continue
+        try:
+            values[name] = validate_value(parsed[name], schema["properties"]["content"])
+        except TypedAnswerError as e:
+            errors[name] = e
+    return values, errors
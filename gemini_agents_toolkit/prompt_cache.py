@@ -0,0 +1,257 @@
+"""Reuse of the static prefix of model requests (instruction, tools, pinned history) through context caching"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from google.adk.models import BaseLlm
+from google.genai import types as genai_types
+
+from gemini_agents_toolkit.llm import model_options
+
+
+@dataclass
+class CachedPrefix:
+    """A prefix registered with the backend"""
+    name: str
+    # time.time() the backend drops the prefix at
+    expire_time: float
+    # prompt tokens of the prefix
+    tokens: int
+
+
+class PrefixCacheBackend:
+    """The context caching mechanism of a model provider, GenaiCacheBackend or a local stub in tests"""
+
+    async def create(self, *, model, system_instruction, tools, contents, ttl) -> CachedPrefix:
+        raise NotImplementedError
+
+    async def refresh(self, name, *, ttl) -> float:
+        """Extends the prefix's lifetime, returns its new expire time"""
+        raise NotImplementedError
+
+    async def delete(self, name):
+        raise NotImplementedError
+
+
+class GenaiCacheBackend(PrefixCacheBackend):
+    """Context caching of the Gemini API (google.genai caches)"""
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            # imported here, the client reads the project/API key settings from the environment
+            from google import genai
+            self._client = genai.Client()
+        return self._client
+
+    async def create(self, *, model, system_instruction, tools, contents, ttl):
+        cached = await self.client.aio.caches.create(model=model, config=genai_types.CreateCachedContentConfig(
+            system_instruction=system_instruction, tools=tools, contents=contents or None, ttl=f"{int(ttl)}s"))
+        usage = cached.usage_metadata
+        tokens = usage.total_token_count if usage and usage.total_token_count else None
+        expire_time = cached.expire_time.timestamp() if cached.expire_time else time.time() + ttl
+        return CachedPrefix(name=cached.name, expire_time=expire_time, tokens=tokens)
+
+    async def refresh(self, name, *, ttl):
+        cached = await self.client.aio.caches.update(
+            name=name, config=genai_types.UpdateCachedContentConfig(ttl=f"{int(ttl)}s"))
+        return cached.expire_time.timestamp() if cached.expire_time else time.time() + ttl
+
+    async def delete(self, name):
+        await self.client.aio.caches.delete(name=name)
+
+
+def _prefix_payload(model, system_instruction, tools, contents):
+    return json.dumps({
+        "model": model,
+        "system_instruction": system_instruction.model_dump(mode="json", exclude_none=True)
+        if hasattr(system_instruction, "model_dump") else system_instruction,
+        "tools": [tool.model_dump(mode="json", exclude_none=True) for tool in tools or []],
+        "contents": [content.model_dump(mode="json", exclude_none=True) for content in contents],
+    }, sort_keys=True)
+
+
+class PrefixCacheManager:
+    """Registers the stable prefix of model requests with a PrefixCacheBackend and points requests at it.
+
+    The prefix is the system instruction, the tool declarations and the first pinned_contents contents of the
+    request (e.g. a long document every session starts with). Prefixes smaller than min_tokens are sent as is,
+    the providers do not cache small prefixes. A prefix is kept for ttl seconds and refreshed when a request
+    uses it less than refresh_before seconds before it expires, unused prefixes just expire. Prefixes the
+    backend refused are not tried again for failure_ttl seconds.
+    """
+
+    def __init__(self, backend=None, *, ttl=3600, refresh_before=300, min_tokens=4096, pinned_contents=0,
+                 failure_ttl=600, clock=time.time):
+        self.backend = backend if backend else GenaiCacheBackend()
+        self.ttl = ttl
+        self.refresh_before = refresh_before
+        self.min_tokens = min_tokens
+        self.pinned_contents = pinned_contents
+        self.failure_ttl = failure_ttl
+        self._clock = clock
+        # prefix hash -> CachedPrefix, or the time.time() until which a refused prefix is not retried
+        self._prefixes = {}
+        # prefix hash -> concurrent.futures.Future of the CachedPrefix being created (None if refused), so
+        # concurrent first requests from any thread or event loop create the prefix once
+        self._creating = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.creations = 0
+        self.refreshes = 0
+        self.failures = 0
+        # prompt tokens read from the cache instead of being sent with the request
+        self.tokens_saved = 0
+
+    def _split(self, llm_request):
+        config = llm_request.config
+        pinned = list(llm_request.contents[:self.pinned_contents]) if self.pinned_contents else []
+        return config.system_instruction if config else None, config.tools if config else None, pinned
+
+    async def _get_prefix(self, key, *, model, system_instruction, tools, pinned, estimated_tokens):
+        now = self._clock()
+        creation = None
+        with self._lock:
+            entry = self._prefixes.get(key)
+            if entry is not None and not isinstance(entry, CachedPrefix):
+                if entry > now:
+                    return None
+                entry = None
+            if entry is not None and entry.expire_time <= now:
+                entry = None
+            if entry is None:
+                in_flight = self._creating.get(key)
+                if in_flight is None:
+                    creation = self._creating[key] = concurrent.futures.Future()
+        if entry is None:
+            if creation is None:
+                # another request is creating the prefix already, cancelling this one must not cancel the others
+                return await asyncio.shield(asyncio.wrap_future(in_flight))
+            try:
+                entry = await self._create_prefix(key, now, model=model, system_instruction=system_instruction,
+                                                  tools=tools, pinned=pinned, estimated_tokens=estimated_tokens)
+            finally:
+                with self._lock:
+                    self._creating.pop(key, None)
+                creation.set_result(entry)
+        elif entry.expire_time - now < self.refresh_before:
+            try:
+                entry.expire_time = await self.backend.refresh(entry.name, ttl=self.ttl)
+                with self._lock:
+                    self.refreshes += 1
+            except Exception as e:
+                # still usable until it expires, the next request tries again
+                logging.warning(f"Could not refresh the cached prompt prefix '{entry.name}': {e}")
+        return entry
+
+    async def _create_prefix(self, key, now, *, model, system_instruction, tools, pinned, estimated_tokens):
+        try:
+            entry = await self.backend.create(model=model, system_instruction=system_instruction, tools=tools,
+                                              contents=pinned, ttl=self.ttl)
+        except Exception as e:
+            logging.warning(f"Could not cache the prompt prefix of model '{model}': {e}")
+            with self._lock:
+                self._prefixes[key] = now + self.failure_ttl
+                self.failures += 1
+            return None
+        if entry.tokens is None:
+            entry.tokens = estimated_tokens
+        logging.info(f"Cached a prompt prefix of ~{entry.tokens} tokens for model '{model}' as '{entry.name}'")
+        with self._lock:
+            self._prefixes[key] = entry
+            self.creations += 1
+        return entry
+
+    async def apply(self, llm_request):
+        """Returns a copy of the request reading its prefix from the cache and the cache key, (request, None) if not cached"""
+        system_instruction, tools, pinned = self._split(llm_request)
+        if not system_instruction and not tools and not pinned:
+            return llm_request, None
+        payload = _prefix_payload(llm_request.model, system_instruction, tools, pinned)
+        estimated_tokens = (len(payload) + 3) // 4
+        if estimated_tokens < self.min_tokens:
+            return llm_request, None
+        key = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        entry = await self._get_prefix(key, model=llm_request.model, system_instruction=system_instruction,
+                                       tools=tools, pinned=pinned, estimated_tokens=estimated_tokens)
+        if entry is None:
+            return llm_request, None
+        with self._lock:
+            self.hits += 1
+            self.tokens_saved += entry.tokens
+        # the cached parts must not be sent again, the original request is left untouched for retries
+        config = llm_request.config.model_copy(update={
+            "system_instruction": None, "tools": None, "tool_config": None, "cached_content": entry.name})
+        contents = llm_request.contents[len(pinned):]
+        return llm_request.model_copy(update={"config": config, "contents": contents}), key
+
+    def invalidate(self, key):
+        with self._lock:
+            self._prefixes.pop(key, None)
+
+    async def clear(self):
+        """Deletes every prefix from the backend"""
+        with self._lock:
+            entries = [entry for entry in self._prefixes.values() if isinstance(entry, CachedPrefix)]
+            self._prefixes.clear()
+        for entry in entries:
+            try:
+                await self.backend.delete(entry.name)
+            except Exception as e:
+                logging.warning(f"Could not delete the cached prompt prefix '{entry.name}': {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "prefixes": sum(1 for entry in self._prefixes.values() if isinstance(entry, CachedPrefix)),
+                "hits": self.hits,
+                "creations": self.creations,
+                "refreshes": self.refreshes,
+                "failures": self.failures,
+                "tokens_saved": self.tokens_saved,
+            }
+
+
+class ContextCachedLlm(BaseLlm):
+    """Sends model requests with their static prefix read from the PrefixCacheManager's cache.
+
+    If a request using a cached prefix fails before anything was received (e.g. the cache was deleted on the
+    provider side), the prefix is forgotten and the request is sent once more in full. Requests of a service
+    without a context cache (llm.model_options) are sent in full.
+    """
+    inner: BaseLlm
+    manager: PrefixCacheManager
+
+    async def generate_content_async(self, llm_request, stream=False):
+        options = model_options.get()
+        manager = self.manager if options is None else options.context_cache
+        if manager is None:
+            async for llm_response in self.inner.generate_content_async(llm_request, stream=stream):
+                yield llm_response
+            return
+        cached_request, key = await manager.apply(llm_request)
+        if key is None:
+            async for llm_response in self.inner.generate_content_async(llm_request, stream=stream):
+                yield llm_response
+            return
+        yielded = False
+        try:
+            async for llm_response in self.inner.generate_content_async(cached_request, stream=stream):
+                yielded = True
+                yield llm_response
+        except Exception as e:
+            if yielded:
+                raise
+            logging.warning(f"Model request with cached prefix failed, sending it in full: {e}")
+            manager.invalidate(key)
+            async for llm_response in self.inner.generate_content_async(llm_request, stream=stream):
+                yield llm_response
@@ -0,0 +1,141 @@
+"""Process-wide requests-per-minute and tokens-per-minute limits for model calls"""
+
+import asyncio
+import logging
+import threading
+import time
+
+
+class TokenBucket:
+    """A token bucket refilled at per_minute / 60 tokens a second, holding at most burst tokens.
+
+    reserve() never fails: it takes the tokens even when the bucket runs into debt and returns how long the
+    caller has to wait for its turn, so concurrent callers queue up in the order they reserved.
+    """
+
+    def __init__(self, per_minute, *, burst=None, clock=time.monotonic):
+        if per_minute <= 0:
+            raise ValueError("per_minute must be positive")
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst else per_minute
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount):
+        """Takes amount tokens, returns the seconds to wait before they are actually available"""
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def refund(self, amount):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    @property
+    def available(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class _ModelLimits:
+
+    def __init__(self, rpm, tpm, burst_seconds, clock):
+        # the burst is a few seconds worth of quota, so a full minute of requests is not sent at once
+        self.requests = TokenBucket(rpm, burst=max(1.0, rpm * burst_seconds / 60), clock=clock) if rpm else None
+        self.tokens = TokenBucket(tpm, burst=max(1.0, tpm * burst_seconds / 60), clock=clock) if tpm else None
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute quotas per model name, shared by everything in the process.
+
+    Every ADKAgentService uses default_rate_limiter unless given another one, set the quota once with
+    default_rate_limiter.set_quota("gemini-2.0-flash", rpm=..., tpm=...). A model call waits (without failing)
+    until the quota allows it. Models without a quota (and no default_quota) are not limited.
+    """
+
+    def __init__(self, *, default_rpm=None, default_tpm=None, burst_seconds=10, clock=time.monotonic):
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.burst_seconds = burst_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._quotas = {}
+        self._limits = {}
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def set_quota(self, model, *, rpm=None, tpm=None):
+        with self._lock:
+            self._quotas[model] = (rpm, tpm)
+            self._limits.pop(model, None)
+
+    def _get_limits(self, model):
+        with self._lock:
+            limits = self._limits.get(model)
+            if limits is None:
+                rpm, tpm = self._quotas.get(model, (self.default_rpm, self.default_tpm))
+                if not rpm and not tpm:
+                    return None
+                limits = self._limits[model] = _ModelLimits(rpm, tpm, self.burst_seconds, self._clock)
+            return limits
+
+    def reserve(self, model, tokens):
+        """Reserves one request and tokens for the model, returns the seconds to wait before sending it"""
+        limits = self._get_limits(model)
+        if limits is None:
+            return 0.0
+        wait = 0.0
+        if limits.requests:
+            wait = max(wait, limits.requests.reserve(1))
+        if limits.tokens:
+            wait = max(wait, limits.tokens.reserve(tokens))
+        if wait > 0:
+            with self._lock:
+                self.waits += 1
+                self.wait_seconds += wait
+        return wait
+
+    def cancel(self, model, tokens):
+        """Gives back a reservation that was not used"""
+        limits = self._get_limits(model)
+        if limits is None:
+            return
+        if limits.requests:
+            limits.requests.refund(1)
+        if limits.tokens:
+            limits.tokens.refund(tokens)
+
+    def record_tokens(self, model, tokens):
+        """Charges tokens that were not known at reservation time (e.g. the response)"""
+        limits = self._get_limits(model)
+        if limits is not None and limits.tokens and tokens > 0:
+            limits.tokens.reserve(tokens)
+
+    async def acquire(self, model, tokens):
+        wait = self.reserve(model, tokens)
+        if wait <= 0:
+            return
+        logging.info(f"Rate limit for model '{model}' reached, waiting {wait:.2f}s")
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self.cancel(model, tokens)
+            raise
+
+    def stats(self):
+        with self._lock:
+            return {"waits": self.waits, "wait_seconds": self.wait_seconds}
+
+
+# Shared by every ADKAgentService that is not given its own limiter
+default_rate_limiter = RateLimiter()
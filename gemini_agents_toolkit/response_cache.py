@@ -0,0 +1,154 @@
+"""Opt-in cache of agent responses keyed by the agent, the conversation history and the message"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from google.adk.events import Event
+
+from gemini_agents_toolkit.cache_utils import TTLCache
+
+
+def _describe_tool(tool):
+    name = getattr(tool, "name", None) or getattr(tool, "__name__", repr(tool))
+    description = getattr(tool, "description", None) or getattr(tool, "__doc__", None) or ""
+    return {"name": name, "description": description}
+
+
+def agent_fingerprint(agent):
+    """Returns a JSON serializable description of everything in the agent that shapes its answers"""
+    model = getattr(agent, "model", "")
+    instruction = getattr(agent, "instruction", "")
+    global_instruction = getattr(agent, "global_instruction", "")
+    tools = getattr(agent, "tools", None)
+    sub_agents = getattr(agent, "sub_agents", None)
+    return {
+        "name": getattr(agent, "name", ""),
+        "model": model if isinstance(model, str) else getattr(model, "model", type(model).__name__),
+        # Instruction providers are functions, the best stable identity we have is their name
+        "instruction": instruction if isinstance(instruction, str) else getattr(instruction, "__qualname__", ""),
+        "global_instruction": global_instruction if isinstance(global_instruction, str) else getattr(global_instruction, "__qualname__", ""),
+        "tools": [_describe_tool(tool) for tool in tools] if isinstance(tools, list) else [],
+        "sub_agents": [agent_fingerprint(sub_agent) for sub_agent in sub_agents] if isinstance(sub_agents, list) else [],
+    }
+
+
+def _describe_event(event):
+    content = event.content.model_dump(mode="json", exclude_none=True) if event.content else None
+    return {"author": event.author, "content": content}
+
+
+class ResponseCache:
+    """Caches final responses (and the events that produced them) of ADKAgentService turns.
+
+    The key is a hash of the agent (instructions, model, tools), the session history the model sees and the
+    message. Entries live in an in-memory LRU with a ttl, optionally backed by a SQLite file shared between
+    runs and processes. Turns that call any of side_effecting_tools (or any tool at all when cache_tool_turns
+    is False) are never cached, neither are turns that ended with an error.
+    """
+
+    def __init__(self, *, capacity=1024, ttl=3600, sqlite_path=None, side_effecting_tools=None, cache_tool_turns=True):
+        self.ttl = ttl
+        self.side_effecting_tools = set(side_effecting_tools or [])
+        self.cache_tool_turns = cache_tool_turns
+        self._memory = TTLCache(capacity=capacity, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.stores = 0
+        self.bypasses = 0
+        self._db = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, created_at REAL, text TEXT, events TEXT)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(*, agent, history, msg):
+        payload = {
+            "agent": agent_fingerprint(agent),
+            "history": [_describe_event(event) for event in history],
+            "msg": msg,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns (response_text, events) for the key or None, the events are fresh copies"""
+        entry = self._memory.get(key)
+        if entry is None and self._db is not None:
+            entry = self._load(key)
+            if entry is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._memory.put(key, entry)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        text, serialized_events = entry
+        return text, [Event.model_validate_json(event) for event in serialized_events]
+
+    def put(self, key, text, events):
+        entry = (text, [event.model_dump_json(exclude_none=True) for event in events])
+        self._memory.put(key, entry)
+        if self._db is not None:
+            with self._lock:
+                self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                                 (key, time.time(), text, json.dumps(entry[1])))
+                self._db.commit()
+        with self._lock:
+            self.stores += 1
+
+    def _load(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT created_at, text, events FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        created_at, text, events = row
+        if self.ttl is not None and created_at + self.ttl <= time.time():
+            return None
+        return text, json.loads(events)
+
+    def is_cacheable(self, events):
+        """Whether a turn that produced the events can be cached"""
+        for event in events:
+            for function_call in event.get_function_calls():
+                if not self.cache_tool_turns or function_call.name in self.side_effecting_tools:
+                    logging.debug(f"Response not cached, the turn called tool '{function_call.name}'")
+                    with self._lock:
+                        self.bypasses += 1
+                    return False
+        return True
+
+    def clear(self):
+        self._memory.clear()
+        if self._db is not None:
+            with self._lock:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self):
+        """Returns hit/miss counters of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "disk_hits": self.disk_hits,
+                "stores": self.stores,
+                "bypasses": self.bypasses,
+                "memory": self._memory.stats(),
+            }
@@ -0,0 +1,48 @@
+"""A bounded pool of ADK runners shared between sessions and services"""
+
+import logging
+
+from gemini_agents_toolkit.cache_utils import TTLCache
+
+
+class RunnerPool:
+    """Caches one ADK Runner per (agent, app_name, session_service).
+
+    Runners do not keep any per-session state, so a single runner serves every session of an agent.
+    The pool is an LRU cache bounded by capacity, with an optional ttl (seconds) after which a runner
+    is rebuilt. Pass the same pool to several ADKAgentService instances to share runners between them.
+    """
+
+    def __init__(self, capacity=128, ttl=3600):
+        self._cache = TTLCache(capacity=capacity, ttl=ttl)
+
+    @staticmethod
+    def make_key(*, agent, app_name, session_service):
+        return id(agent), app_name, id(session_service)
+
+    def get_runner(self, *, agent, app_name, session_service, factory):
+        """Returns the cached runner for the agent/app/session service, creates it with factory() on a miss"""
+        key = self.make_key(agent=agent, app_name=app_name, session_service=session_service)
+
+        def create_entry():
+            logging.info(f"RunnerPool miss, creating new Runner for app_name='{app_name}'.")
+            # The agent and the session service are kept alongside the runner, so their ids
+            # (part of the key) can not be reused by other objects while the entry is cached.
+            return factory(), agent, session_service
+
+        runner, _, _ = self._cache.get_or_create(key, create_entry)
+        return runner
+
+    def stats(self):
+        """Returns hit/miss/eviction counters of the pool"""
+        return self._cache.stats()
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+
+# Used by every ADKAgentService that is not given its own pool
+default_runner_pool = RunnerPool()
@@ -0,0 +1,107 @@
+"""Per-session FIFO locks shared by threads and asyncio tasks"""
+
+import asyncio
+import contextlib
+import threading
+from collections import deque
+
+
+class _ThreadWaiter:
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def wake(self):
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+
+
+class _AsyncWaiter:
+
+    def __init__(self, loop):
+        self._loop = loop
+        self.future = loop.create_future()
+
+    def wake(self):
+        # May be called from another thread or another event loop
+        self._loop.call_soon_threadsafe(self._set_result)
+
+    def _set_result(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class SessionLockTable:
+    """A lock per session key, created on first use and dropped once nobody holds or waits for it.
+
+    Callers on the same key are served strictly in arrival order, callers on different keys never contend
+    (the table lock is only held to enqueue/dequeue waiters). Threads use hold() and coroutines hold_async(),
+    both can wait for the same key.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> deque of waiters, the first one holds the lock
+        self._queues = {}
+
+    def _enqueue(self, key, waiter):
+        with self._lock:
+            queue = self._queues.setdefault(key, deque())
+            queue.append(waiter)
+            if len(queue) == 1:
+                waiter.wake()
+
+    def _release_locked(self, key):
+        queue = self._queues[key]
+        queue.popleft()
+        if queue:
+            queue[0].wake()
+        else:
+            del self._queues[key]
+
+    def acquire(self, key):
+        waiter = _ThreadWaiter()
+        self._enqueue(key, waiter)
+        waiter.wait()
+
+    async def acquire_async(self, key):
+        waiter = _AsyncWaiter(asyncio.get_running_loop())
+        self._enqueue(key, waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                queue = self._queues[key]
+                if queue[0] is waiter:
+                    # The lock was handed over right before the cancellation, pass it on
+                    self._release_locked(key)
+                else:
+                    queue.remove(waiter)
+            raise
+
+    def release(self, key):
+        with self._lock:
+            self._release_locked(key)
+
+    @contextlib.contextmanager
+    def hold(self, key):
+        self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+    @contextlib.asynccontextmanager
+    async def hold_async(self, key):
+        await self.acquire_async(key)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+    def __len__(self):
+        """Number of keys that are currently held"""
+        with self._lock:
+            return len(self._queues)
@@ -0,0 +1,218 @@
+"""Session services bundled with the toolkit"""
+
+import contextlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import ListEventsResponse, ListSessionsResponse
+from google.adk.sessions.state import State
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_by_session ON events (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+
+class SqliteSessionService(BaseSessionService):
+    """A session service storing sessions in a local SQLite file, a drop-in for InMemorySessionService.
+
+    Events are append-only rows indexed by app/user/session, so appending an event does not rewrite the
+    session and get_session with GetSessionConfig(num_recent_events=n) (ADKAgentService events_per_session)
+    only reads the last n events. The database runs in WAL mode, several processes can share one file.
+    """
+
+    def __init__(self, path, *, timeout=30):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _transaction(self, write=True):
+        """Runs the block in one transaction, writes take the database lock up front so other processes wait"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def create_session(self, *, app_name, user_id, state=None, session_id=None):
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        session = Session(app_name=app_name, user_id=user_id, id=session_id, state=state or {},
+                          last_update_time=time.time())
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?)",
+                       (app_name, user_id, session_id, json.dumps(session.state), session.last_update_time))
+            # a replaced session starts without the old events, like in InMemorySessionService
+            db.execute("DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                       (app_name, user_id, session_id))
+            self._merge_state(db, session)
+        return session
+
+    def get_session(self, *, app_name, user_id, session_id, config=None):
+        with self._transaction(write=False) as db:
+            row = db.execute("SELECT state, update_time FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                             (app_name, user_id, session_id)).fetchone()
+            if row is None:
+                return None
+            state, update_time = row
+            session = Session(app_name=app_name, user_id=user_id, id=session_id, state=json.loads(state),
+                              last_update_time=update_time)
+            session.events = self._load_events(db, app_name, user_id, session_id, config)
+            self._merge_state(db, session)
+        return session
+
+    @staticmethod
+    def _load_events(db, app_name, user_id, session_id, config):
+        key = (app_name, user_id, session_id)
+        if config and config.num_recent_events:
+            rows = db.execute(
+                "SELECT data FROM (SELECT seq, data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? "
+                "ORDER BY seq DESC LIMIT ?) ORDER BY seq", key + (config.num_recent_events,)).fetchall()
+        elif config and config.after_timestamp:
+            rows = db.execute(
+                "SELECT data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND timestamp >= ? "
+                "ORDER BY seq", key + (config.after_timestamp,)).fetchall()
+        else:
+            rows = db.execute("SELECT data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? ORDER BY seq",
+                              key).fetchall()
+        return [Event.model_validate_json(data) for (data,) in rows]
+
+    @staticmethod
+    def _merge_state(db, session):
+        row = db.execute("SELECT state FROM app_states WHERE app_name = ?", (session.app_name,)).fetchone()
+        if row:
+            for key, value in json.loads(row[0]).items():
+                session.state[State.APP_PREFIX + key] = value
+        row = db.execute("SELECT state FROM user_states WHERE app_name = ? AND user_id = ?",
+                         (session.app_name, session.user_id)).fetchone()
+        if row:
+            for key, value in json.loads(row[0]).items():
+                session.state[State.USER_PREFIX + key] = value
+
+    def list_sessions(self, *, app_name, user_id):
+        with self._transaction(write=False) as db:
+            rows = db.execute("SELECT session_id, update_time FROM sessions WHERE app_name = ? AND user_id = ?",
+                              (app_name, user_id)).fetchall()
+        return ListSessionsResponse(sessions=[
+            Session(app_name=app_name, user_id=user_id, id=session_id, last_update_time=update_time)
+            for session_id, update_time in rows])
+
+    def delete_session(self, *, app_name, user_id, session_id):
+        with self._transaction() as db:
+            db.execute("DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                       (app_name, user_id, session_id))
+            db.execute("DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                       (app_name, user_id, session_id))
+
+    def list_events(self, *, app_name, user_id, session_id):
+        with self._transaction(write=False) as db:
+            events = self._load_events(db, app_name, user_id, session_id, None)
+        return ListEventsResponse(events=events)
+
+    def append_event(self, session, event):
+        if event.partial:
+            return event
+        # updates the state and the events of the session object the caller holds
+        super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+        key = (session.app_name, session.user_id, session.id)
+        with self._transaction() as db:
+            row = db.execute("SELECT state FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?", key).fetchone()
+            if row is None:
+                return event
+            db.execute("INSERT INTO events (app_name, user_id, session_id, timestamp, data) VALUES (?, ?, ?, ?, ?)",
+                       key + (event.timestamp, event.model_dump_json(exclude_none=True)))
+            state_delta = event.actions.state_delta if event.actions else None
+            if state_delta:
+                self._apply_state_delta(db, key, json.loads(row[0]), state_delta)
+            db.execute("UPDATE sessions SET update_time = ? WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                       (event.timestamp,) + key)
+        return event
+
+    def replace_events(self, *, app_name, user_id, session_id, prefix_ids, events):
+        """Replaces the first events of the session with events if their ids are still prefix_ids.
+
+        The check and the swap run in one transaction, so events other processes append meanwhile are kept
+        and a crash leaves the session as it was. Returns the number of events kept after the new ones, None
+        if the session is gone or its first events changed.
+        """
+        key = (app_name, user_id, session_id)
+        with self._transaction() as db:
+            if db.execute("SELECT 1 FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?", key).fetchone() is None:
+                return None
+            rows = db.execute("SELECT timestamp, data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? "
+                              "ORDER BY seq", key).fetchall()
+            if len(rows) < len(prefix_ids):
+                return None
+            if [Event.model_validate_json(data).id for _, data in rows[:len(prefix_ids)]] != list(prefix_ids):
+                return None
+            kept = rows[len(prefix_ids):]
+            db.execute("DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+            db.executemany("INSERT INTO events (app_name, user_id, session_id, timestamp, data) VALUES (?, ?, ?, ?, ?)",
+                           [key + (event.timestamp, event.model_dump_json(exclude_none=True)) for event in events] +
+                           [key + row for row in kept])
+        return len(kept)
+
+    @staticmethod
+    def _apply_state_delta(db, key, session_state, state_delta):
+        app_name, user_id, _ = key
+        app_delta, user_delta = {}, {}
+        for name, value in state_delta.items():
+            if name.startswith(State.TEMP_PREFIX):
+                continue
+            session_state[name] = value
+            if name.startswith(State.APP_PREFIX):
+                app_delta[name.removeprefix(State.APP_PREFIX)] = value
+            elif name.startswith(State.USER_PREFIX):
+                user_delta[name.removeprefix(State.USER_PREFIX)] = value
+        db.execute("UPDATE sessions SET state = ? WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                   (json.dumps(session_state),) + key)
+        if app_delta:
+            row = db.execute("SELECT state FROM app_states WHERE app_name = ?", (app_name,)).fetchone()
+            db.execute("INSERT OR REPLACE INTO app_states VALUES (?, ?)",
+                       (app_name, json.dumps({**(json.loads(row[0]) if row else {}), **app_delta})))
+        if user_delta:
+            row = db.execute("SELECT state FROM user_states WHERE app_name = ? AND user_id = ?", (app_name, user_id)).fetchone()
+            db.execute("INSERT OR REPLACE INTO user_states VALUES (?, ?, ?)",
+                       (app_name, user_id, json.dumps({**(json.loads(row[0]) if row else {}), **user_delta})))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
@@ -0,0 +1,41 @@
+"""Fake models and clocks shared by the tests"""
+
+from typing import Callable
+
+from google.adk.models import BaseLlm, LlmResponse
+from google.genai import types as genai_types
+
+
+def model_response(part):
+    return LlmResponse(content=genai_types.Content(role="model", parts=[part]))
+
+
+class ScriptedLlm(BaseLlm):
+    """Returns the scripted responses one per model call, exceptions in the script are raised"""
+    responses: list = []
+    calls: int = 0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        yield response
+
+
+class EchoLlm(BaseLlm):
+    """Answers with answer(llm_request), by default the text of the last content it was sent"""
+    answer: Callable = lambda llm_request: f"echo {llm_request.contents[-1].parts[0].text}"
+
+    async def generate_content_async(self, llm_request, stream=False):
+        yield model_response(genai_types.Part(text=self.answer(llm_request)))
+
+
+class FakeClock:
+    """Time that only moves when the test sets now"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
@@ -1,12 +1,20 @@
 import unittest
 from unittest.mock import Mock, patch, MagicMock
 
-from gemini_agents_toolkit.agent import ADKAgentService, TooManyFunctionCallsException, log_retry_error
+from gemini_agents_toolkit.agent import ADKAgentService, StreamChunk, TooManyFunctionCallsException, log_retry_error
 from google.genai import types as genai_types
 from google.api_core import exceptions as google_exceptions
+from google.adk.events import Event
+import asyncio
 import logging
+import threading
+import time
 import uuid
 
+# Not every google-genai release defines these, the service recognizes them by name
+BlockedPromptException = getattr(genai_types, "BlockedPromptException", None) or type("BlockedPromptException", (Exception,), {})
+StopCandidateException = getattr(genai_types, "StopCandidateException", None) or type("StopCandidateException", (Exception,), {})
+
 # Basic configuration for logging to see output during test development if necessary
 # logging.basicConfig(level=logging.DEBUG)
 
@@ -61,17 +69,39 @@ class TestADKAgentService(unittest.TestCase):
         except ValueError:
             self.fail("send_message raised ValueError unexpectedly")
 
-        mock_maybe_create_session.assert_any_call(
+        # The turn events are collected from the runner, the session is not fetched a second time
+        mock_maybe_create_session.assert_called_once_with(
             user_id="test_user",
             session_id=test_session_id,
             num_recent_events=self.adk_service.events_per_session,
             events=test_events
         )
-        mock_maybe_create_session.assert_called_with( # Last call
-            session_id=test_session_id,
-            user_id="test_user",
-            num_recent_events=self.adk_service.events_per_session
-        )
+
+    @patch('gemini_agents_toolkit.agent.ADKAgentService._maybe_create_chat_session')
+    def test_send_message_returns_turn_events(self, mock_maybe_create_session):
+        mock_maybe_create_session.return_value = self.mock_chat_session
+        agent_event = _text_event("hello")
+        self.mock_runner_instance.run.return_value = iter([agent_event])
+
+        response, events = self.adk_service.send_message(msg="hi", user_id="test_user", session_id="s1")
+
+        self.assertEqual(response, "hello")
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[0].author, "user")
+        self.assertEqual(events[0].content.parts[0].text, "hi")
+        self.assertIs(events[1], agent_event)
+        mock_maybe_create_session.assert_called_once()
+
+    @patch('gemini_agents_toolkit.agent.ADKAgentService._maybe_create_chat_session')
+    def test_send_message_returns_full_history_on_request(self, mock_maybe_create_session):
+        full_history_session = Mock()
+        full_history_session.events = ["old event", "user event", "agent event"]
+        mock_maybe_create_session.return_value = full_history_session
+        self.mock_runner_instance.run.return_value = iter([_text_event("hello")])
+
+        _, events = self.adk_service.send_message(msg="hi", user_id="test_user", session_id="s1", return_full_history=True)
+
+        self.assertEqual(events, full_history_session.events)
         self.assertEqual(mock_maybe_create_session.call_count, 2)
 
     @patch('uuid.uuid4')
@@ -82,7 +112,7 @@ class TestADKAgentService(unittest.TestCase):
         mock_session = Mock()
         mock_session.events = []
         mock_maybe_create_session.return_value = mock_session
-        self.mock_runner_instance.run.side_effect = genai_types.BlockedPromptException("Test BlockedPromptException")
+        self.mock_runner_instance.run.side_effect = BlockedPromptException("Test BlockedPromptException")
 
         final_response, _ = self.adk_service.send_message(msg="Test message", user_id="test_user")
         
@@ -101,7 +131,7 @@ class TestADKAgentService(unittest.TestCase):
         mock_session = Mock()
         mock_session.events = []
         mock_maybe_create_session.return_value = mock_session
-        self.mock_runner_instance.run.side_effect = genai_types.StopCandidateException("Test StopCandidateException")
+        self.mock_runner_instance.run.side_effect = StopCandidateException("Test StopCandidateException")
 
         final_response, _ = self.adk_service.send_message(msg="Test message", user_id="test_user")
 
@@ -191,7 +221,7 @@ class TestADKAgentService(unittest.TestCase):
         mock_log_critical.assert_called_once()
         logged_message = mock_log_critical.call_args[0][0]
         self.assertIn("Runner instance is None for session_id='fixed_uuid_for_runner_fail_test'", logged_message)
-        self.assertIn("runner_id='test_user_runner_failfixed_uuid_for_runner_fail_test'", logged_message)
+        self.assertIn("runner_id=", logged_message)
         
         # Assert that the original exception from Runner creation was logged by the general exception handler in __init__
         # This requires inspecting the logging.exception call within the Runner creation block.
@@ -200,6 +230,50 @@ class TestADKAgentService(unittest.TestCase):
         # However, the critical log specific to runner_instance being None is the primary check here.
 
 
+    @patch('gemini_agents_toolkit.agent.ADKAgentService._maybe_create_chat_session')
+    def test_send_message_shares_runner_between_sessions(self, mock_maybe_create_session):
+        mock_maybe_create_session.return_value = self.mock_chat_session
+        self.mock_runner_instance.run.side_effect = lambda **kwargs: iter([])
+
+        self.adk_service.send_message(msg="first", user_id="user_1", session_id="session_1")
+        self.adk_service.send_message(msg="second", user_id="user_2", session_id="session_2")
+        self.adk_service.send_message(msg="third")
+
+        self.MockRunnerClass.assert_called_once_with(
+            agent=self.mock_agent,
+            app_name=self.adk_service.app_name,
+            session_service=self.mock_session_service
+        )
+        self.assertEqual(self.mock_runner_instance.run.call_count, 3)
+
+    @patch('gemini_agents_toolkit.agent.ADKAgentService._maybe_create_chat_session')
+    def test_send_message_serializes_turns_of_the_same_session(self, mock_maybe_create_session):
+        mock_maybe_create_session.return_value = self.mock_chat_session
+        running = {}
+        overlaps = []
+        lock = threading.Lock()
+
+        def run(session_id, **kwargs):
+            with lock:
+                running[session_id] = running.get(session_id, 0) + 1
+                overlaps.append(dict(running))
+            time.sleep(0.02)
+            with lock:
+                running[session_id] -= 1
+            return iter([])
+        self.mock_runner_instance.run.side_effect = run
+
+        threads = [threading.Thread(target=self.adk_service.send_message, args=(f"msg {i}",),
+                                    kwargs={"session_id": f"session_{i % 2}"}) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # never two turns of one session at once, but both sessions were running at the same time
+        self.assertTrue(all(count <= 1 for snapshot in overlaps for count in snapshot.values()))
+        self.assertTrue(any(snapshot.get("session_0") == 1 and snapshot.get("session_1") == 1 for snapshot in overlaps))
+
     @patch('logging.error')
     def test_log_retry_error_uses_logging(self, mock_log_error):
         mock_retry_state = Mock()
@@ -219,5 +293,193 @@ class TestADKAgentService(unittest.TestCase):
         self.assertIn(expected_message_part2, logged_message)
 
 
+def _text_event(text, author="test_agent"):
+    return Event(author=author, content=genai_types.Content(role="model", parts=[genai_types.Part(text=text)]))
+
+
+class TestADKAgentServiceAsync(unittest.TestCase):
+
+    def setUp(self):
+        patcher_runner = patch('gemini_agents_toolkit.agent.Runner')
+        self.MockRunnerClass = patcher_runner.start()
+        self.addCleanup(patcher_runner.stop)
+        self.mock_runner_instance = self.MockRunnerClass.return_value
+
+        self.mock_session_service = Mock()
+        mock_chat_session = Mock()
+        mock_chat_session.events = []
+        self.mock_session_service.get_session.return_value = mock_chat_session
+
+    def _set_run_async_events(self, events, delay=0):
+        async def run_async(**kwargs):
+            for event in events:
+                if delay:
+                    await asyncio.sleep(delay)
+                yield event
+        self.mock_runner_instance.run_async.side_effect = run_async
+
+    def test_send_message_async_returns_final_response(self):
+        on_message = Mock()
+        service = ADKAgentService(agent=Mock(), session_service=self.mock_session_service, on_message=on_message)
+        self._set_run_async_events([_text_event("hello from agent")])
+
+        response, _ = asyncio.run(service.send_message_async("hi", user_id="test_user", session_id="s1"))
+
+        self.assertEqual(response, "hello from agent")
+        on_message.assert_called_once_with("hello from agent")
+        self.mock_runner_instance.run.assert_not_called()
+
+    def test_send_message_async_respects_max_concurrent_requests(self):
+        service = ADKAgentService(agent=Mock(), session_service=self.mock_session_service, max_concurrent_requests=2)
+        in_flight = 0
+        max_in_flight = 0
+
+        async def run_async(**kwargs):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            yield _text_event("done")
+        self.mock_runner_instance.run_async.side_effect = run_async
+
+        async def send_all():
+            return await asyncio.gather(*[service.send_message_async(f"msg {i}") for i in range(6)])
+
+        results = asyncio.run(send_all())
+
+        self.assertEqual([r[0] for r in results], ["done"] * 6)
+        self.assertEqual(max_in_flight, 2)
+
+    def test_send_message_events_async_yields_events(self):
+        service = ADKAgentService(agent=Mock(), session_service=self.mock_session_service)
+        expected_events = [_text_event("final")]
+        self._set_run_async_events(expected_events)
+
+        async def collect():
+            return [event async for event in service.send_message_events_async("hi", session_id="s1")]
+
+        self.assertEqual(asyncio.run(collect()), expected_events)
+
+
+class TestADKAgentServiceStream(unittest.TestCase):
+
+    def setUp(self):
+        patcher_runner = patch('gemini_agents_toolkit.agent.Runner')
+        self.MockRunnerClass = patcher_runner.start()
+        self.addCleanup(patcher_runner.stop)
+        self.mock_runner_instance = self.MockRunnerClass.return_value
+
+        self.mock_session_service = Mock()
+        mock_chat_session = Mock()
+        mock_chat_session.events = []
+        self.mock_session_service.get_session.return_value = mock_chat_session
+
+    def _partial_event(self, text):
+        event = _text_event(text)
+        event.partial = True
+        return event
+
+    def test_send_message_stream_yields_chunks_before_final(self):
+        on_message = Mock()
+        service = ADKAgentService(agent=Mock(), session_service=self.mock_session_service, on_message=on_message)
+        function_call_event = Event(author="test_agent", content=genai_types.Content(
+            role="model", parts=[genai_types.Part(function_call=genai_types.FunctionCall(name="say_to_duck", args={}))]))
+        self.mock_runner_instance.run.return_value = iter([
+            function_call_event,
+            self._partial_event("Hello "),
+            self._partial_event("duck"),
+            _text_event("Hello duck"),
+        ])
+
+        chunks = list(service.send_message_stream("hi", session_id="s1"))
+
+        self.assertEqual([(c.kind, c.text) for c in chunks], [
+            (StreamChunk.TOOL_CALL, "say_to_duck"),
+            (StreamChunk.TEXT, "Hello "),
+            (StreamChunk.TEXT, "duck"),
+            (StreamChunk.FINAL, "Hello duck"),
+        ])
+        on_message.assert_called_once_with("Hello duck")
+
+    def test_send_message_stream_calls_on_message_per_chunk(self):
+        on_message = Mock()
+        service = ADKAgentService(agent=Mock(), session_service=self.mock_session_service, on_message=on_message)
+        self.mock_runner_instance.run.return_value = iter([
+            self._partial_event("Hello "),
+            self._partial_event("duck"),
+            _text_event("Hello duck"),
+        ])
+
+        list(service.send_message_stream("hi", session_id="s1", on_message_per_chunk=True))
+
+        self.assertEqual([c.args[0] for c in on_message.call_args_list], ["Hello ", "duck"])
+
+    def test_send_message_stream_delivers_non_streamed_text(self):
+        service = ADKAgentService(agent=Mock(), session_service=self.mock_session_service)
+        self.mock_runner_instance.run.return_value = iter([_text_event("whole answer")])
+
+        chunks = list(service.send_message_stream("hi", session_id="s1"))
+
+        self.assertEqual([(c.kind, c.text) for c in chunks], [
+            (StreamChunk.TEXT, "whole answer"),
+            (StreamChunk.FINAL, "whole answer"),
+        ])
+
+
+class TestADKAgentServiceBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.service = ADKAgentService(agent=Mock(), session_service=Mock())
+
+    def test_send_messages_keeps_input_order_and_reports_errors(self):
+        def send_message(msg, **kwargs):
+            if msg == "bad":
+                raise RuntimeError("boom")
+            return msg.upper(), [msg]
+        self.service.send_message = Mock(side_effect=send_message)
+
+        batch_result = self.service.send_messages(["a", "bad", {"msg": "c", "user_id": "u1"}], max_concurrency=3)
+
+        self.assertEqual([r.index for r in batch_result.results], [0, 1, 2])
+        self.assertEqual(batch_result.results[0].response, "A")
+        self.assertIsInstance(batch_result.results[1].error, RuntimeError)
+        self.assertEqual(batch_result.results[2].events, ["c"])
+        self.assertEqual(batch_result.succeeded, 2)
+        self.assertEqual(batch_result.failed, 1)
+        self.assertGreater(batch_result.throughput, 0)
+        self.service.send_message.assert_any_call(msg="c", user_id="u1")
+
+    def test_send_messages_keeps_per_session_order(self):
+        calls = []
+        lock = threading.Lock()
+
+        def send_message(msg, **kwargs):
+            time.sleep(0.01 if msg.endswith("1") else 0)
+            with lock:
+                calls.append(msg)
+            return msg, []
+        self.service.send_message = Mock(side_effect=send_message)
+
+        batch = [{"msg": f"{session}-{i}", "session_id": session} for i in (1, 2, 3) for session in ("s1", "s2")]
+        self.service.send_messages(batch, max_concurrency=4)
+
+        self.assertEqual([c for c in calls if c.startswith("s1")], ["s1-1", "s1-2", "s1-3"])
+        self.assertEqual([c for c in calls if c.startswith("s2")], ["s2-1", "s2-2", "s2-3"])
+
+    def test_send_messages_async(self):
+        async def send_message_async(msg, **kwargs):
+            await asyncio.sleep(0)
+            if msg == "bad":
+                raise RuntimeError("boom")
+            return msg.upper(), []
+        self.service.send_message_async = send_message_async
+
+        batch_result = asyncio.run(self.service.send_messages_async(["a", "bad", "c"], max_concurrency=2))
+
+        self.assertEqual([r.response for r in batch_result.results], ["A", None, "C"])
+        self.assertFalse(batch_result.results[1].ok)
+
+
 if __name__ == '__main__':
     unittest.main()
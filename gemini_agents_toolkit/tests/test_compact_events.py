@@ -0,0 +1,96 @@
+import tracemalloc
+import unittest
+
+from google.adk.events import Event, EventActions
+from google.genai import types as genai_types
+
+from gemini_agents_toolkit.compact_events import CompactEventLog, CompactEventStore, EventView
+
+
+def _text_event(text, author="user", role="user"):
+    return Event(author=author, invocation_id="inv-1", content=genai_types.Content(role=role, parts=[genai_types.Part(text=text)]))
+
+
+def _function_call_event():
+    return Event(author="agent", invocation_id="inv-1", content=genai_types.Content(role="model", parts=[
+        genai_types.Part(function_call=genai_types.FunctionCall(id="adk-1", name="lookup", args={"q": "ducks"}))]),
+        actions=EventActions(state_delta={"looked_up": True}))
+
+
+class TestCompactEventLog(unittest.TestCase):
+
+    def test_events_round_trip(self):
+        events = [_text_event("héllo"), _function_call_event(), _text_event("done", author="agent", role="model")]
+
+        log = CompactEventLog(events)
+
+        self.assertEqual(len(log), 3)
+        self.assertEqual(list(log), events)
+        self.assertEqual(log[-1], events[-1])
+        self.assertEqual(log[1].actions.state_delta, {"looked_up": True})
+        self.assertEqual(list(log.texts()), [("user", "héllo"), ("agent", "done")])
+        with self.assertRaises(IndexError):
+            log[3]
+
+    def test_slices_and_concatenation_share_the_buffer(self):
+        log = CompactEventLog([_text_event(f"message {i}") for i in range(4)])
+        size = len(log.buffer)
+
+        head = log[:2]
+        combined = head + log[2:]
+        prefixed = [_text_event("first")] + head
+        combined += [_text_event("last")]
+
+        self.assertIsInstance(head, CompactEventLog)
+        self.assertEqual([event.content.parts[0].text for event in combined][1:4], ["message 1", "message 2", "message 3"])
+        self.assertEqual(prefixed[0].content.parts[0].text, "first")
+        self.assertIs(combined.buffer, log.buffer)
+        # only the appended texts were added to the shared buffer
+        self.assertEqual(len(log.buffer), size + len("first") + len("last"))
+
+    def test_uses_less_memory_than_events(self):
+        def allocated(build):
+            tracemalloc.start()
+            kept = build()
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del kept
+            return size
+
+        events = [_text_event(f"step {i} finished") for i in range(500)]
+        as_list = allocated(lambda: [event.model_copy(deep=True) for event in events])
+        compact = allocated(lambda: CompactEventLog(events))
+
+        self.assertLess(compact * 4, as_list)
+
+
+class TestCompactEventStore(unittest.TestCase):
+
+    def test_overlapping_histories_are_stored_once(self):
+        store = CompactEventStore()
+        first = [_text_event("question"), _text_event("answer", author="agent", role="model")]
+
+        history = store.add(first)
+        second = [_text_event("follow up"), _function_call_event()]
+        longer = store.add(history, second)
+        again = store.add(list(longer), [first[0]])
+
+        self.assertEqual(len(store), 4)
+        self.assertIsInstance(longer, EventView)
+        self.assertEqual(list(longer), first + second)
+        self.assertEqual(list(again), first + second)
+        self.assertEqual(list(longer[1:3]), [first[1], second[0]])
+        self.assertEqual(list(history + longer[2:]), first + second)
+
+    def test_events_without_id_are_identified_by_content(self):
+        store = CompactEventStore()
+        event = _text_event("no id")
+        event.id = ""
+
+        store.add([event, event.model_copy()])
+
+        self.assertEqual(len(store), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+
+from google.adk.agents import LlmAgent
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService
+from google.genai import types as genai_types
+
+from gemini_agents_toolkit.agent import ADKAgentService
+from gemini_agents_toolkit.compaction import SUMMARY_PREFIX, CompactionPolicy, events_to_transcript
+from gemini_agents_toolkit.sessions import SqliteSessionService
+from gemini_agents_toolkit.tracing import Tracer
+from gemini_agents_toolkit.tests.fakes import EchoLlm
+
+
+def _text_event(text, author="user"):
+    return Event(author=author, content=genai_types.Content(role="user", parts=[genai_types.Part(text=text)]))
+
+
+class TestCompactionPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.summarized = []
+
+        def summarizer(events):
+            self.summarized.append(events)
+            return f"{len(events)} events"
+
+        self.policy = CompactionPolicy(max_tokens=10, keep_recent_events=2, summarizer=summarizer)
+        self.addCleanup(self.policy.shutdown)
+        self.session_service = InMemorySessionService()
+        self.service = ADKAgentService(agent=LlmAgent(model=EchoLlm(model="echo"), name="echo_agent"),
+                                       session_service=self.session_service, compaction=self.policy)
+
+    def _session(self):
+        return self.session_service.get_session(app_name=self.service.app_name, user_id="default_user", session_id="s1")
+
+    def test_long_session_is_folded_into_a_summary(self):
+        for i in range(3):
+            self.service.send_message(f"message number {i} " + "padding " * 10, session_id="s1")
+            self.policy.wait()
+
+        events = self._session().events
+        self.assertTrue(events[0].content.parts[0].text.startswith(SUMMARY_PREFIX))
+        # the last exchange is kept verbatim
+        self.assertEqual(len(events), 3)
+        self.assertTrue(events[-1].content.parts[0].text.startswith("echo message number 2"))
+        self.assertGreaterEqual(self.policy.compactions, 1)
+
+        # the agent keeps working on top of the summary
+        response, _ = self.service.send_message("next", session_id="s1")
+        self.assertEqual(response, "echo next")
+
+    def test_traced_sessions_are_compacted(self):
+        service = ADKAgentService(agent=LlmAgent(model=EchoLlm(model="echo"), name="echo_agent"),
+                                  session_service=self.session_service, compaction=self.policy, tracer=Tracer())
+        for i in range(3):
+            service.send_message(f"message number {i} " + "padding " * 10, session_id="s1")
+            self.policy.wait()
+
+        self.assertGreaterEqual(self.policy.compactions, 1)
+        self.assertTrue(self._session().events[0].content.parts[0].text.startswith(SUMMARY_PREFIX))
+
+    def test_short_sessions_are_left_alone(self):
+        self.policy.max_tokens = 10 ** 6
+        for i in range(3):
+            self.service.send_message(f"message {i}", session_id="s1")
+        self.policy.wait()
+
+        self.assertEqual(len(self._session().events), 6)
+        self.assertEqual(self.summarized, [])
+
+    def test_split_keeps_function_calls_with_their_responses(self):
+        call = Event(author="agent", content=genai_types.Content(role="model", parts=[
+            genai_types.Part(function_call=genai_types.FunctionCall(name="lookup", args={}))]))
+        response = Event(author="agent", content=genai_types.Content(role="user", parts=[
+            genai_types.Part(function_response=genai_types.FunctionResponse(name="lookup", response={"price": 1}))]))
+        events = [_text_event("a"), _text_event("b"), call, response, _text_event("c", author="agent")]
+
+        # keeping 2 events would start with the function response, the call is kept as well
+        self.assertEqual(self.policy._split(events), 2)
+        self.assertIn("called lookup", events_to_transcript(events))
+        self.assertIn("lookup returned {'price': 1}", events_to_transcript(events))
+
+
+class TestCompactionOfSqliteSessions(unittest.TestCase):
+
+    def test_events_appended_by_another_process_during_compaction_are_kept(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "sessions.db")
+        session_service = SqliteSessionService(path)
+        other_process = SqliteSessionService(path)
+        self.addCleanup(session_service.close)
+        self.addCleanup(other_process.close)
+
+        def summarizer(events):
+            session = other_process.get_session(app_name="adk_service", user_id="default_user", session_id="s1")
+            other_process.append_event(session=session, event=_text_event("appended elsewhere"))
+            return f"{len(events)} events"
+
+        policy = CompactionPolicy(max_tokens=10, keep_recent_events=2, summarizer=summarizer)
+        self.addCleanup(policy.shutdown)
+        service = ADKAgentService(agent=LlmAgent(model=EchoLlm(model="echo"), name="echo_agent"),
+                                  session_service=session_service)
+        for i in range(2):
+            service.send_message(f"message number {i} " + "padding " * 10, session_id="s1")
+
+        self.assertTrue(policy._compact(service, "default_user", "s1"))
+
+        texts = [event.content.parts[0].text for event in
+                 session_service.get_session(app_name="adk_service", user_id="default_user", session_id="s1").events]
+        self.assertTrue(texts[0].startswith(SUMMARY_PREFIX))
+        self.assertEqual(texts[-1], "appended elsewhere")
+        self.assertEqual(len(texts), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
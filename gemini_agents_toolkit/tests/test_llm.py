@@ -0,0 +1,247 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from google.adk.agents import LlmAgent
+from google.adk.events import Event
+from google.adk.models import BaseLlm, LlmRequest
+from google.adk.sessions import InMemorySessionService
+from google.api_core import exceptions as google_exceptions
+from google.genai import errors as genai_errors
+from google.genai import types as genai_types
+
+from gemini_agents_toolkit import metrics
+from gemini_agents_toolkit.agent import ADKAgentService, TooManyFunctionCallsException, _should_replay_turn
+from gemini_agents_toolkit.llm import (Backoff, HedgedLlm, HedgingPolicy, LatencyTracker, RateLimitedLlm, RetryingLlm,
+                                       RetryPolicy)
+from gemini_agents_toolkit.metrics import InProcessMetrics
+from gemini_agents_toolkit.tests.fakes import ScriptedLlm, model_response
+
+
+def _no_wait_policy():
+    return RetryPolicy(backoff={category: Backoff(max_attempts=3, base=0, cap=0)
+                                for category in ("rate_limit", "server", "timeout", "network")})
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_classify(self):
+        self.assertEqual(RetryPolicy.classify(google_exceptions.ResourceExhausted("quota")), "rate_limit")
+        self.assertEqual(RetryPolicy.classify(google_exceptions.ServiceUnavailable("down")), "server")
+        self.assertEqual(RetryPolicy.classify(google_exceptions.DeadlineExceeded("slow")), "timeout")
+        self.assertEqual(RetryPolicy.classify(genai_errors.ClientError(429, {})), "rate_limit")
+        self.assertEqual(RetryPolicy.classify(genai_errors.ServerError(503, {})), "server")
+        self.assertEqual(RetryPolicy.classify(ConnectionResetError()), "network")
+        self.assertIsNone(RetryPolicy.classify(genai_errors.ClientError(400, {})))
+        self.assertIsNone(RetryPolicy.classify(google_exceptions.InvalidArgument("bad request")))
+        self.assertIsNone(RetryPolicy.classify(ValueError()))
+
+    def test_delay_is_jittered_and_capped(self):
+        policy = RetryPolicy(backoff={"server": Backoff(max_attempts=10, base=1, cap=4)})
+        delays = [policy.delay("server", attempt) for attempt in range(1, 10) for _ in range(20)]
+        self.assertTrue(all(0 <= delay <= 4 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+        self.assertTrue(policy.should_retry("server", 9))
+        self.assertFalse(policy.should_retry("server", 10))
+        self.assertFalse(policy.should_retry("unknown", 1))
+
+
+class TestRetryingLlm(unittest.TestCase):
+
+    def test_failed_model_request_is_retried_without_replaying_the_turn(self):
+        tool_calls = []
+
+        def get_weather(city: str) -> str:
+            """returns the weather in the city"""
+            tool_calls.append(city)
+            return f"sunny in {city}"
+
+        llm = ScriptedLlm(model="scripted", responses=[
+            model_response(genai_types.Part(function_call=genai_types.FunctionCall(name="get_weather", args={"city": "Paris"}))),
+            google_exceptions.ServiceUnavailable("overloaded"),
+            model_response(genai_types.Part(text="It is sunny")),
+        ])
+        agent = LlmAgent(model=llm, name="weather_agent", tools=[get_weather])
+        registry = InProcessMetrics()
+        session_service = InMemorySessionService()
+        service = ADKAgentService(agent=agent, session_service=session_service, metrics=registry,
+                                  retry_policy=_no_wait_policy())
+
+        response, events = service.send_message("weather in Paris?", session_id="s1")
+
+        self.assertEqual(response, "It is sunny")
+        self.assertEqual(tool_calls, ["Paris"])
+        self.assertEqual(llm.calls, 3)
+        # user message, function call, function response, final answer
+        self.assertEqual(len(events), 4)
+        session = session_service.get_session(app_name=service.app_name, user_id="default_user", session_id="s1")
+        self.assertEqual(len(session.events), 4)
+        self.assertEqual(registry.get_counter(metrics.RETRIES, app=service.app_name, scope="model_call", category="server"), 1)
+
+    def test_services_sharing_an_agent_use_their_own_retry_policy(self):
+        llm = ScriptedLlm(model="scripted", responses=[
+            google_exceptions.ServiceUnavailable("overloaded"),
+            model_response(genai_types.Part(text="answered")),
+        ])
+        agent = LlmAgent(model=llm, name="shared_agent")
+        # the first service never retries, its wrappers are the ones installed on the agent
+        ADKAgentService(agent=agent, session_service=InMemorySessionService(), retry_policy=RetryPolicy(backoff={}))
+        service = ADKAgentService(agent=agent, session_service=InMemorySessionService(), retry_policy=_no_wait_policy())
+
+        response, _ = service.send_message("hi")
+
+        self.assertEqual(response, "answered")
+        self.assertEqual(llm.calls, 2)
+
+    def test_agent_model_is_wrapped_once(self):
+        llm = ScriptedLlm(model="scripted")
+        agent = LlmAgent(model=llm, name="agent")
+
+        ADKAgentService(agent=agent, session_service=InMemorySessionService())
+        ADKAgentService(agent=agent, session_service=InMemorySessionService())
+
+        # retries go through the rate limiter, which sits right around the model
+        self.assertIsInstance(agent.model, RetryingLlm)
+        self.assertIsInstance(agent.model.inner, RateLimitedLlm)
+        self.assertIs(agent.model.inner.inner, llm)
+        self.assertEqual(agent.model.model, "scripted")
+
+
+class FakeLlm(BaseLlm):
+    """Answers with its model name after delay seconds, or raises error"""
+    delay: float = 0
+    error: Exception = None
+    calls: int = 0
+    cancelled: int = 0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        yield model_response(genai_types.Part(text=f"{self.model} answered {llm_request.model}"))
+
+
+def _generate(llm):
+    async def collect():
+        request = LlmRequest(model=llm.model, contents=[genai_types.Content(role="user", parts=[genai_types.Part(text="hi")])])
+        return [response.content.parts[0].text async for response in llm.generate_content_async(request)]
+    return asyncio.run(collect())
+
+
+class TestHedgedLlm(unittest.TestCase):
+
+    def setUp(self):
+        self.primary = FakeLlm(model="pro", delay=1)
+        self.fallback = FakeLlm(model="flash")
+        self.policy = HedgingPolicy(fallback=self.fallback, default_delay=0.05, min_samples=3)
+        self.llm = HedgedLlm(inner=self.primary, model="pro", fallback=self.fallback, policy=self.policy)
+
+    def test_slow_request_is_answered_by_the_fallback(self):
+        started = time.monotonic()
+        self.assertEqual(_generate(self.llm), ["flash answered flash"])
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual((self.policy.hedged, self.policy.fallback_wins), (1, 1))
+        self.assertEqual(self.primary.cancelled, 1)
+
+    def test_fast_request_is_not_hedged(self):
+        self.primary.delay = 0
+        self.assertEqual(_generate(self.llm), ["pro answered pro"])
+        self.assertEqual(self.fallback.calls, 0)
+        self.assertEqual(self.policy.hedged, 0)
+
+    def test_overloaded_primary_falls_back_and_errors_are_raised_when_all_fail(self):
+        self.primary.delay, self.primary.error = 0, google_exceptions.ServiceUnavailable("overloaded")
+        self.assertEqual(_generate(self.llm), ["flash answered flash"])
+
+        self.fallback.error = ValueError("fallback broken")
+        with self.assertRaises(google_exceptions.ServiceUnavailable):
+            _generate(self.llm)
+
+        self.primary.error = google_exceptions.InvalidArgument("bad request")
+        calls = self.fallback.calls
+        with self.assertRaises(google_exceptions.InvalidArgument):
+            _generate(self.llm)
+        self.assertEqual(self.fallback.calls, calls)
+
+    def test_error_of_the_primary_is_raised_when_the_fallback_failed_first(self):
+        self.primary.delay, self.primary.error = 0.2, google_exceptions.InvalidArgument("bad request")
+        self.fallback.error = ValueError("fallback broken")
+
+        with self.assertRaises(google_exceptions.InvalidArgument):
+            _generate(self.llm)
+        self.assertEqual(self.fallback.calls, 1)
+
+    def test_hedge_delay_follows_the_latency_percentile(self):
+        tracker = LatencyTracker(window=4)
+        for latency in (5, 0.1, 0.2, 0.3, 0.4):
+            tracker.record("pro", latency)
+        policy = HedgingPolicy(fallback=self.fallback, percentile=0.5, min_samples=4, tracker=tracker)
+
+        self.assertAlmostEqual(policy.hedge_delay("pro"), 0.2)
+        self.assertEqual(policy.hedge_delay("flash"), policy.default_delay)
+        self.assertEqual(tracker.stats()["pro"]["count"], 4)
+
+    def test_service_hedges_agent_models(self):
+        service = ADKAgentService(agent=LlmAgent(model=self.primary, name="hedged_agent"), hedging=self.policy)
+
+        response, _ = service.send_message("hi")
+
+        self.assertEqual(response, "flash answered flash")
+        chain = service.agent.model
+        self.assertIsInstance(chain, HedgedLlm)
+        self.assertIsInstance(chain.inner, RetryingLlm)
+        self.assertIsInstance(chain.fallback, RateLimitedLlm)
+
+    def test_services_sharing_an_agent_hedge_only_their_own_requests(self):
+        self.primary.delay = 0.3
+        agent = LlmAgent(model=self.primary, name="shared_agent")
+        unhedged = ADKAgentService(agent=agent, session_service=InMemorySessionService())
+        hedged = ADKAgentService(agent=agent, session_service=InMemorySessionService(), hedging=self.policy)
+
+        self.assertEqual(unhedged.send_message("hi")[0], "pro answered pro")
+        self.assertEqual(hedged.send_message("hi")[0], "flash answered flash")
+        self.assertEqual(self.fallback.calls, 1)
+        self.assertEqual(self.policy.hedged, 1)
+
+
+class TestTurnReplay(unittest.TestCase):
+
+    def test_only_turns_that_did_not_reach_the_runner_are_replayed(self):
+        self.assertTrue(_should_replay_turn(google_exceptions.ServiceUnavailable("session store down")))
+        self.assertFalse(_should_replay_turn(TooManyFunctionCallsException("limit")))
+        error = RuntimeError("on_message failed")
+        error.runner_started = True
+        self.assertFalse(_should_replay_turn(error))
+
+    @patch('gemini_agents_toolkit.agent.Runner')
+    def test_error_after_the_runner_started_is_not_replayed(self, MockRunnerClass):
+        runner = MockRunnerClass.return_value
+        runner.run.side_effect = lambda **kwargs: iter([Event(author="test_agent", content=genai_types.Content(
+            role="model", parts=[genai_types.Part(text="done")]))])
+        on_message = Mock(side_effect=RuntimeError("on_message failed"))
+        service = ADKAgentService(agent=Mock(), session_service=InMemorySessionService(), on_message=on_message)
+
+        with self.assertRaises(RuntimeError):
+            service.send_message("hello", session_id="s1")
+
+        self.assertEqual(runner.run.call_count, 1)
+
+    def test_events_already_in_the_session_are_not_appended_again(self):
+        session_service = InMemorySessionService()
+        service = ADKAgentService(agent=Mock(), session_service=session_service)
+        events = [Event(author="user", content=genai_types.Content(role="user", parts=[genai_types.Part(text="hi")]))]
+
+        service._maybe_create_chat_session(user_id="u", session_id="s1", num_recent_events=-1, events=events)
+        session = service._maybe_create_chat_session(user_id="u", session_id="s1", num_recent_events=-1, events=events)
+
+        self.assertEqual(len(session.events), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
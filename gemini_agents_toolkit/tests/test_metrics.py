@@ -0,0 +1,128 @@
+import os
+import tempfile
+import unittest
+import urllib.request
+from unittest.mock import patch, Mock
+
+from google.adk.agents import LlmAgent
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService
+from google.genai import types as genai_types
+from google.api_core import exceptions as google_exceptions
+
+from gemini_agents_toolkit import metrics
+from gemini_agents_toolkit.agent import ADKAgentService, TooManyFunctionCallsException, _error_category, log_retry_error
+from gemini_agents_toolkit.metrics import InProcessMetrics, estimate_tokens
+from gemini_agents_toolkit.tests.fakes import ScriptedLlm, model_response
+
+
+def get_weather(city: str) -> str:
+    """returns the weather in the city"""
+    return f"sunny in {city}"
+
+
+class TestInProcessMetrics(unittest.TestCase):
+
+    def test_prometheus_text_contains_counters_and_histograms(self):
+        registry = InProcessMetrics(buckets=(1, 5))
+        registry.increment(metrics.TOOL_CALLS, labels={"app": "a", "tool": "t"})
+        registry.increment(metrics.TOOL_CALLS, 2, labels={"app": "a", "tool": "t"})
+        registry.observe(metrics.TURN_DURATION, 0.5, labels={"app": "a"})
+        registry.observe(metrics.TURN_DURATION, 3, labels={"app": "a"})
+
+        text = registry.to_prometheus_text()
+
+        self.assertIn(f"# TYPE {metrics.TOOL_CALLS} counter", text)
+        self.assertIn(f'{metrics.TOOL_CALLS}{{app="a",tool="t"}} 3', text)
+        self.assertIn(f"# TYPE {metrics.TURN_DURATION} histogram", text)
+        self.assertIn(f'{metrics.TURN_DURATION}_bucket{{app="a",le="1"}} 1', text)
+        self.assertIn(f'{metrics.TURN_DURATION}_bucket{{app="a",le="5"}} 2', text)
+        self.assertIn(f'{metrics.TURN_DURATION}_bucket{{app="a",le="+Inf"}} 2', text)
+        self.assertIn(f'{metrics.TURN_DURATION}_count{{app="a"}} 2', text)
+
+    def test_quantile_is_interpolated_inside_the_bucket(self):
+        registry = InProcessMetrics(buckets=(1, 2))
+        for _ in range(10):
+            registry.observe("latency", 1.5)
+
+        self.assertAlmostEqual(registry.quantile("latency", 0.5), 1.5)
+        self.assertIsNone(registry.quantile("other", 0.5))
+
+    def test_file_and_http_export(self):
+        registry = InProcessMetrics()
+        registry.increment(metrics.RETRIES, labels={"app": "a"})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "metrics.prom")
+            registry.write_prometheus_file(path)
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(f.read(), registry.to_prometheus_text())
+
+        server = registry.serve(port=0)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url) as response:
+                self.assertIn(f'{metrics.RETRIES}{{app="a"}} 1', response.read().decode("utf-8"))
+        finally:
+            server.shutdown()
+
+    def test_estimate_tokens(self):
+        content = genai_types.Content(role="user", parts=[genai_types.Part(text="x" * 40)])
+        self.assertEqual(estimate_tokens([content]), 10)
+        self.assertEqual(estimate_tokens([]), 0)
+
+
+class TestADKAgentServiceMetrics(unittest.TestCase):
+
+    def test_turn_model_and_tool_metrics_are_recorded(self):
+        llm = ScriptedLlm(model="scripted", responses=[
+            model_response(genai_types.Part(function_call=genai_types.FunctionCall(name="get_weather", args={"city": "Paris"}))),
+            model_response(genai_types.Part(text="It is sunny")),
+        ])
+        user_callback = Mock(return_value=None)
+        agent = LlmAgent(model=llm, name="weather_agent", tools=[get_weather], after_tool_callback=user_callback)
+        registry = InProcessMetrics()
+        service = ADKAgentService(agent=agent, session_service=InMemorySessionService(), app_name="app", metrics=registry)
+
+        response, _ = service.send_message("weather in Paris?")
+
+        self.assertEqual(response, "It is sunny")
+        self.assertEqual(registry.get_histogram_count(metrics.TURN_DURATION, app="app", outcome="ok"), 1)
+        self.assertEqual(registry.get_histogram_count(metrics.MODEL_CALL_DURATION, app="app", model="scripted"), 2)
+        self.assertEqual(registry.get_counter(metrics.TOOL_CALLS, app="app", tool="get_weather"), 1)
+        self.assertEqual(registry.get_histogram_count(metrics.TOOL_CALL_DURATION, app="app", tool="get_weather"), 1)
+        self.assertGreater(registry.get_counter(metrics.TOKENS, app="app", model="scripted", kind="prompt"), 0)
+        self.assertGreater(registry.get_counter(metrics.TOKENS, app="app", model="scripted", kind="completion"), 0)
+        # the callback the agent already had still runs
+        user_callback.assert_called_once()
+
+    @patch('gemini_agents_toolkit.agent.Runner')
+    def test_errors_are_counted_by_category(self, MockRunnerClass):
+        MockRunnerClass.return_value.run.return_value = iter([Event(author="test_agent", error_message="quota")])
+        registry = InProcessMetrics()
+        service = ADKAgentService(agent=Mock(), session_service=Mock(), app_name="app", metrics=registry)
+
+        service.send_message("hello", session_id="s1")
+
+        self.assertEqual(registry.get_counter(metrics.ERRORS, app="app", category="model_error"), 1)
+        self.assertEqual(registry.get_histogram_count(metrics.TURN_DURATION, app="app", outcome="error"), 1)
+
+    def test_error_category(self):
+        self.assertEqual(_error_category(google_exceptions.DeadlineExceeded("timeout")), "deadline")
+        self.assertEqual(_error_category(google_exceptions.ResourceExhausted("quota")), "api_error")
+        self.assertEqual(_error_category(TooManyFunctionCallsException("limit")), "function_call_limit")
+
+    def test_retries_are_counted(self):
+        registry = InProcessMetrics()
+        service = ADKAgentService(agent=Mock(), session_service=Mock(), app_name="app", metrics=registry)
+        retry_state = Mock()
+        retry_state.fn.__name__ = "send_message"
+        retry_state.args = (service, "hello")
+
+        with patch('logging.error'):
+            log_retry_error(retry_state)
+
+        self.assertEqual(registry.get_counter(metrics.RETRIES, app="app", scope="turn"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
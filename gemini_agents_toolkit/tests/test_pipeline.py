@@ -0,0 +1,362 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from google.adk.agents import LlmAgent
+from google.adk.events import Event
+from google.adk.models import BaseLlm, LlmResponse
+from google.genai import types as genai_types
+
+from gemini_agents_toolkit.agent import ADKAgentService
+from gemini_agents_toolkit.pipeline import INT_SCHEMA, CheckpointStore, DagStep, Pipeline
+from gemini_agents_toolkit.pipeline.pipeline_agent import AbstractPipelineAgent
+from gemini_agents_toolkit.pipeline.typed import TypedAnswerError, parse_typed_answer
+
+
+def _event(text, author):
+    return Event(author=author, content=genai_types.Content(role="user" if author == "user" else "model",
+                                                            parts=[genai_types.Part(text=text)]))
+
+
+class FakeAgent:
+    """Answers every message with a scripted function of it after delay seconds, like ADKAgentService.send_message"""
+
+    def __init__(self, answer=lambda msg: "ok", delay=0.0):
+        self.answer = answer
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.received = []
+        self.response_schemas = []
+
+    def send_message(self, msg, *, events=None, response_schema=None):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            self.received.append((msg, list(events or [])))
+            self.response_schemas.append(response_schema)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        answer = self.answer(msg)
+        return answer, [_event(msg, "user"), _event(answer, "agent")]
+
+
+def _prompt(msg):
+    """The user prompt inside the pipeline's step prompt"""
+    return msg.split("Prompt: ")[-1].split("user prompt: ")[-1].split("\n")[0].strip()
+
+
+class TestPipelineDag(unittest.TestCase):
+
+    def test_independent_steps_run_concurrently_and_histories_merge_in_order(self):
+        fake = FakeAgent(answer=lambda msg: f"answer to {_prompt(msg)}", delay=0.2)
+        pipeline = Pipeline(default_agent=fake)
+        steps = [
+            DagStep("price", "price of TQQQ"),
+            DagStep("shares", "shares of TQQQ"),
+            DagStep("orders", "open orders"),
+            DagStep("decide", "decide with {price} and {shares}", inputs=["price", "shares"], depends_on=["orders"]),
+        ]
+
+        started = time.monotonic()
+        results = pipeline.dag(steps, max_concurrency=3)
+
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertEqual(fake.max_running, 3)
+        self.assertEqual(results["decide"][0], "answer to decide with answer to price of TQQQ and answer to shares of TQQQ")
+        decide_input = next(events for msg, events in fake.received if "decide" in msg)
+        self.assertEqual([_prompt(event.content.parts[0].text) for event in decide_input if event.author == "user"],
+                         ["price of TQQQ", "shares of TQQQ", "open orders"])
+        # the full history follows the declared order of the steps
+        recorded = [_prompt(text) for author, text in pipeline.get_full_history().texts() if author == "user"]
+        self.assertEqual(recorded[:3], ["price of TQQQ", "shares of TQQQ", "open orders"])
+
+    def test_typed_steps_and_parallelism_limit(self):
+        fake = FakeAgent(answer=lambda msg: "3" if "how many" in msg else "True", delay=0.05)
+        pipeline = Pipeline(default_agent=fake)
+
+        results = pipeline.dag([DagStep("count", "how many shares", kind="int"),
+                                DagStep("exists", "order exists?", kind="boolean")], max_concurrency=1)
+
+        self.assertEqual(results["count"][0], 3)
+        self.assertIs(results["exists"][0], True)
+        self.assertEqual(fake.max_running, 1)
+
+    def test_invalid_dags(self):
+        pipeline = Pipeline(default_agent=FakeAgent())
+        with self.assertRaisesRegex(ValueError, "cycle"):
+            pipeline.dag([DagStep("a", "a", depends_on=["b"]), DagStep("b", "b", depends_on=["a"])])
+        with self.assertRaisesRegex(ValueError, "unknown"):
+            pipeline.dag([DagStep("a", "a", inputs=["missing"])])
+        with self.assertRaisesRegex(ValueError, "Duplicate"):
+            pipeline.dag([DagStep("a", "a"), DagStep("a", "b")])
+
+    def test_failed_step_stops_the_dag(self):
+        def answer(msg):
+            if "broken" in msg:
+                raise RuntimeError("agent down")
+            return "ok"
+        fake = FakeAgent(answer=answer)
+        pipeline = Pipeline(default_agent=fake)
+
+        with self.assertRaisesRegex(RuntimeError, "agent down"):
+            pipeline.dag([DagStep("a", "broken"), DagStep("b", "after", depends_on=["a"])], max_concurrency=1)
+        self.assertFalse(any("after" in msg for msg, _ in fake.received))
+
+
+class TestPipelineHistory(unittest.TestCase):
+
+    def test_full_history_grows_linearly(self):
+        pipeline = Pipeline(default_agent=FakeAgent())
+        base = [_event("start", "user")]
+
+        _, history = pipeline.steps([f"step {i}" for i in range(10)], events=base)
+
+        # the input history plus a message and an answer per step, nothing recorded twice
+        self.assertEqual(len(history), 21)
+        self.assertEqual(len(pipeline.get_full_history()), 21)
+        self.assertEqual([event.id for event in pipeline.get_full_history()], [event.id for event in history])
+        self.assertEqual(len(base), 1)
+
+    def test_step_histories_are_views_of_the_full_history(self):
+        pipeline = Pipeline(default_agent=FakeAgent())
+
+        _, first = pipeline.step("first")
+        _, second = pipeline.step("second", events=first)
+
+        self.assertIs(second.store, pipeline.get_full_history())
+        self.assertEqual(list(second[:2]), list(first))
+
+
+class TestPipelineMapStep(unittest.TestCase):
+
+    def test_items_run_concurrently_with_isolated_histories(self):
+        fake = FakeAgent(answer=lambda msg: str(len(_prompt(msg))), delay=0.2)
+        pipeline = Pipeline(default_agent=fake)
+        base = [_event("portfolio review", "user")]
+        tickers = ["GOOG", "TQQQ", "MSFT", "NVDA", "AAPL", "META", "AMZN", "TSLA"]
+
+        started = time.monotonic()
+        results, history = pipeline.map_step("length of {item} report", tickers, events=base, return_type=int)
+
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertEqual(results, [len(f"length of {ticker} report") for ticker in tickers])
+        # each item saw only the base history
+        self.assertTrue(all([event.id for event in events] == [base[0].id] for _, events in fake.received))
+        user_prompts = [_prompt(event.content.parts[0].text) for event in history if event.author == "user"]
+        self.assertEqual(user_prompts, ["portfolio review"] + [f"length of {ticker} report" for ticker in tickers])
+
+    def test_max_concurrency(self):
+        fake = FakeAgent(delay=0.05)
+        pipeline = Pipeline(default_agent=fake)
+
+        results, _ = pipeline.map_step("check {item}", ["a", "b", "c", "d"], max_concurrency=2)
+
+        self.assertEqual(results, ["ok"] * 4)
+        self.assertEqual(fake.max_running, 2)
+
+
+class JsonLlm(BaseLlm):
+    """Answers with the JSON it is given, records the config of every request"""
+    answer: str = '{"content": 42}'
+    configs: list = []
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.configs.append(llm_request.config)
+        yield LlmResponse(content=genai_types.Content(role="model", parts=[genai_types.Part(text=self.answer)]))
+
+
+class TestPipelineTypedSteps(unittest.TestCase):
+
+    def test_typed_step_requests_structured_output(self):
+        llm = JsonLlm(model="json", configs=[])
+        pipeline = Pipeline(default_agent=ADKAgentService(agent=LlmAgent(model=llm, name="json_agent")))
+
+        answer, history = pipeline.int_step("6 * 7?")
+
+        self.assertEqual(answer, 42)
+        self.assertEqual(len(llm.configs), 1)
+        self.assertEqual(llm.configs[0].response_mime_type, "application/json")
+        self.assertEqual(llm.configs[0].response_schema["required"], ["content"])
+        self.assertEqual(pipeline.convert_fallbacks, 0)
+
+    def test_convert_agent_is_only_asked_for_invalid_answers(self):
+        pipeline = Pipeline(default_agent=FakeAgent(answer=lambda msg: '{"content": "False"}'))
+        pipeline.convert_agent = FakeAgent(answer=lambda msg: '{"content": 3}')
+
+        self.assertIs(pipeline.boolean_step("is it?")[0], False)
+        self.assertEqual(pipeline.convert_fallbacks, 0)
+        self.assertEqual(pipeline.convert_agent.received, [])
+
+        pipeline.agent = FakeAgent(answer=lambda msg: "three, I think")
+        answer, _ = pipeline.int_step("how many?")
+
+        self.assertEqual(answer, 3)
+        self.assertEqual(pipeline.convert_fallbacks, 1)
+        self.assertEqual(pipeline.convert_agent.response_schemas[0]["required"], ["content"])
+
+    def test_invalid_answer_without_convert_agent(self):
+        pipeline = Pipeline(default_agent=FakeAgent(answer=lambda msg: "many"))
+
+        with self.assertRaises(TypedAnswerError):
+            pipeline.int_step("how many?")
+
+    def test_parse_typed_answer(self):
+        self.assertEqual(parse_typed_answer('```json\n{"content": 7.0}\n```', INT_SCHEMA), 7)
+        self.assertEqual(parse_typed_answer("12", INT_SCHEMA), 12)
+        with self.assertRaises(TypedAnswerError):
+            parse_typed_answer('{"content": 7.5}', INT_SCHEMA)
+
+
+class TestPipelineTypedBatch(unittest.TestCase):
+
+    def test_questions_are_answered_in_one_request(self):
+        fake = FakeAgent(answer=lambda msg: '{"rising": "True", "count": 3, "tickers": ["GOOG", "TQQQ"]}')
+        pipeline = Pipeline(default_agent=fake)
+        base = [_event("market data", "user")]
+
+        results, history = pipeline.typed_batch({
+            "rising": ("is the market rising?", bool),
+            "count": ("how many tickers are up?", "int"),
+            "tickers": ("which tickers are up?", list),
+        }, events=base)
+
+        self.assertEqual(results, {"rising": True, "count": 3, "tickers": ["GOOG", "TQQQ"]})
+        self.assertEqual(len(fake.received), 1)
+        self.assertEqual(fake.response_schemas[0]["required"], ["rising", "count", "tickers"])
+        self.assertEqual(len(history), 3)
+
+    def test_invalid_answers_are_asked_separately(self):
+        def answer(msg):
+            if "Questions:" in msg:
+                return '{"rising": "maybe", "count": 3}'
+            return '{"content": "False"}'
+        fake = FakeAgent(answer=answer)
+        pipeline = Pipeline(default_agent=fake)
+
+        results, history = pipeline.typed_batch({
+            "rising": ("is the market rising?", "boolean"),
+            "count": ("how many tickers are up?", int),
+        })
+
+        self.assertEqual(results, {"rising": False, "count": 3})
+        self.assertEqual(len(fake.received), 2)
+        self.assertEqual(_prompt(fake.received[1][0]), "is the market rising?")
+        self.assertEqual(len(history), 4)
+
+    def test_unknown_type(self):
+        with self.assertRaises(ValueError):
+            Pipeline(default_agent=FakeAgent()).typed_batch({"when": ("when?", dict)})
+
+
+class TestPipelineCustomAgents(unittest.TestCase):
+
+    class JsonPipelineAgent(AbstractPipelineAgent):
+        """A pipeline agent with the plain send_message signature, without response_schema"""
+
+        def __init__(self, pipeline, answer):
+            super().__init__(pipeline)
+            self.answer = answer
+            self.received = []
+
+        def send_message(self, msg, *, events=None):
+            self.received.append(msg)
+            return self.answer, [_event(msg, "user"), _event(self.answer, "agent")]
+
+    def test_typed_step(self):
+        pipeline = Pipeline()
+        custom = self.JsonPipelineAgent(pipeline, '{"content": 42}')
+
+        answer, history = pipeline.int_step("6 * 7?", agent=custom)
+
+        self.assertEqual(answer, 42)
+        self.assertEqual(len(custom.received), 1)
+        self.assertEqual(len(history), 2)
+
+    def test_typed_batch(self):
+        pipeline = Pipeline()
+        custom = self.JsonPipelineAgent(pipeline, '{"rising": true, "count": 3}')
+
+        results, _ = pipeline.typed_batch({
+            "rising": ("is the market rising?", bool),
+            "count": ("how many tickers are up?", int),
+        }, agent=custom)
+
+        self.assertEqual(results, {"rising": True, "count": 3})
+        self.assertEqual(len(custom.received), 1)
+
+
+class TestPipelineCheckpoints(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "checkpoints.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _run(self, fake):
+        pipeline = Pipeline(default_agent=fake, checkpoints=self.path)
+        tickers, history = pipeline.string_array_step("which tickers?")
+        answer, history = pipeline.step(f"review {tickers[0]}", events=history)
+        pipeline.checkpoints.close()
+        return answer, history, pipeline
+
+    def test_rerun_replays_completed_steps(self):
+        def answer(msg):
+            return '{"content": ["GOOG"]}' if "which tickers?" in msg else f"reviewed {_prompt(msg)}"
+        first = FakeAgent(answer=answer)
+        first_answer, first_history, _ = self._run(first)
+        second = FakeAgent(answer=answer)
+
+        second_answer, second_history, pipeline = self._run(second)
+
+        self.assertEqual(len(first.received), 2)
+        self.assertEqual(second.received, [])
+        self.assertEqual(second_answer, first_answer)
+        self.assertEqual([event.id for event in second_history], [event.id for event in first_history])
+        self.assertEqual(pipeline.checkpoints.hits, 2)
+
+    def test_changed_input_history_runs_the_step_again(self):
+        self._run(FakeAgent(answer=lambda msg: '{"content": ["GOOG"]}' if "which" in msg else "ok"))
+        fake = FakeAgent(answer=lambda msg: '{"content": ["MSFT"]}' if "which" in msg else "ok")
+        store = CheckpointStore(self.path)
+        self.assertEqual(store.invalidate(prompt="which tickers?"), 1)
+        store.close()
+
+        self._run(fake)
+
+        # the tickers changed, so the review's input history did as well
+        self.assertEqual([_prompt(msg) for msg, _ in fake.received], ["which tickers?", "review MSFT"])
+
+    def test_failed_steps_are_not_stored(self):
+        pipeline = Pipeline(default_agent=FakeAgent(), checkpoints=CheckpointStore(":memory:"))
+        pipeline.agent.send_message = lambda msg, *, events=None: ("An API error occurred.", [_event(msg, "user")])
+
+        pipeline.step("fails")
+
+        self.assertEqual(pipeline.checkpoints.stats()["steps"], 0)
+
+    def test_invalid_typed_answers_are_not_stored(self):
+        answers = ["not a number", '{"content": 42}']
+        fake = FakeAgent(answer=lambda msg: answers.pop(0))
+
+        for _ in range(2):
+            pipeline = Pipeline(default_agent=fake, checkpoints=self.path)
+            try:
+                answer, _ = pipeline.int_step("how many?")
+            except TypedAnswerError:
+                answer = None
+            pipeline.checkpoints.close()
+
+        # the invalid first answer is asked again instead of replayed
+        self.assertEqual(answer, 42)
+        self.assertEqual(len(fake.received), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
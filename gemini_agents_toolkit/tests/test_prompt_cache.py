@@ -0,0 +1,200 @@
+import asyncio
+import threading
+import unittest
+
+from google.adk.agents import LlmAgent
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types as genai_types
+
+from gemini_agents_toolkit.agent import ADKAgentService
+from gemini_agents_toolkit.prompt_cache import CachedPrefix, ContextCachedLlm, PrefixCacheBackend, PrefixCacheManager
+
+LONG_INSTRUCTION = "You convert answers to the requested schema. " * 200
+
+
+class StubBackend(PrefixCacheBackend):
+    """Keeps the prefixes in a dict, like the provider would"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.prefixes = {}
+        self.refreshed = []
+        self.fail = False
+
+    async def create(self, *, model, system_instruction, tools, contents, ttl):
+        if self.fail:
+            raise ValueError("caching not supported")
+        name = f"cachedContents/{len(self.prefixes)}"
+        self.prefixes[name] = (system_instruction, tools, contents)
+        return CachedPrefix(name=name, expire_time=self.clock() + ttl, tokens=1000)
+
+    async def refresh(self, name, *, ttl):
+        self.refreshed.append(name)
+        return self.clock() + ttl
+
+    async def delete(self, name):
+        del self.prefixes[name]
+
+
+class RecordingLlm(BaseLlm):
+    """Records the requests it gets, fails the ones using a cached prefix when told to"""
+    requests: list = []
+    fail_cached: bool = False
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.requests.append(llm_request)
+        if self.fail_cached and llm_request.config.cached_content:
+            raise ValueError("cached content not found")
+        yield LlmResponse(content=genai_types.Content(role="model", parts=[genai_types.Part(text="ok")]))
+
+
+def _request(text="hi", instruction=LONG_INSTRUCTION, contents=None):
+    return LlmRequest(model="gemini", contents=contents or [genai_types.Content(role="user", parts=[genai_types.Part(text=text)])],
+                      config=genai_types.GenerateContentConfig(system_instruction=instruction))
+
+
+class TestPrefixCacheManager(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.backend = StubBackend(lambda: self.now)
+        self.manager = PrefixCacheManager(self.backend, ttl=600, refresh_before=60, min_tokens=1000,
+                                          clock=lambda: self.now)
+        self.model = RecordingLlm(model="gemini")
+        self.llm = ContextCachedLlm(inner=self.model, model="gemini", manager=self.manager)
+
+    def _generate(self, request):
+        async def collect():
+            return [response async for response in self.llm.generate_content_async(request)]
+        return asyncio.run(collect())
+
+    def test_prefix_is_cached_once_and_not_sent_again(self):
+        original = _request("first")
+        self._generate(original)
+        self._generate(_request("second"))
+
+        self.assertEqual(len(self.backend.prefixes), 1)
+        for sent in self.model.requests:
+            self.assertEqual(sent.config.cached_content, "cachedContents/0")
+            self.assertIsNone(sent.config.system_instruction)
+        self.assertEqual(self.model.requests[1].contents[0].parts[0].text, "second")
+        # the caller's request is left as it was
+        self.assertEqual(original.config.system_instruction, LONG_INSTRUCTION)
+        self.assertEqual(self.manager.stats()["tokens_saved"], 2000)
+
+    def test_concurrent_first_requests_create_the_prefix_once(self):
+        created = threading.Event()
+        create = self.backend.create
+
+        async def slow_create(**kwargs):
+            await asyncio.sleep(0.2)
+            created.set()
+            return await create(**kwargs)
+        self.backend.create = slow_create
+
+        # every thread runs its own event loop, like the runner threads of send_message
+        threads = [threading.Thread(target=self._generate, args=(_request(f"request {i}"),)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(created.is_set())
+        self.assertEqual(list(self.backend.prefixes), ["cachedContents/0"])
+        self.assertEqual(self.manager.stats()["creations"], 1)
+        self.assertEqual({sent.config.cached_content for sent in self.model.requests}, {"cachedContents/0"})
+        self.assertEqual(len(self.model.requests), 4)
+
+    def test_cancelled_waiter_does_not_cancel_the_prefix_creation(self):
+        create = self.backend.create
+
+        async def slow_create(**kwargs):
+            await asyncio.sleep(0.2)
+            return await create(**kwargs)
+        self.backend.create = slow_create
+
+        async def apply_all():
+            tasks = [asyncio.create_task(self.manager.apply(_request(f"request {i}"))) for i in range(3)]
+            await asyncio.sleep(0.05)
+            tasks[1].cancel()
+            return await asyncio.gather(*tasks, return_exceptions=True)
+        results = asyncio.run(apply_all())
+
+        self.assertIsInstance(results[1], asyncio.CancelledError)
+        for cached_request, key in (results[0], results[2]):
+            self.assertIsNotNone(key)
+            self.assertEqual(cached_request.config.cached_content, "cachedContents/0")
+        self.assertEqual(self.manager.stats()["creations"], 1)
+
+    def test_small_prefix_is_sent_as_is(self):
+        self._generate(_request(instruction="be brief"))
+
+        self.assertEqual(self.backend.prefixes, {})
+        self.assertEqual(self.model.requests[0].config.system_instruction, "be brief")
+
+    def test_refresh_before_expiry_and_recreate_after(self):
+        self._generate(_request())
+        self.now += 550
+        self._generate(_request())
+        self.assertEqual(self.backend.refreshed, ["cachedContents/0"])
+
+        self.now += 10000
+        self._generate(_request())
+        self.assertEqual(len(self.backend.prefixes), 2)
+        self.assertEqual(self.manager.stats()["creations"], 2)
+
+    def test_refused_prefix_is_not_retried_until_failure_ttl(self):
+        self.backend.fail = True
+        self._generate(_request())
+        self._generate(_request())
+        self.assertEqual(self.manager.stats()["failures"], 1)
+        self.assertEqual(self.model.requests[1].config.system_instruction, LONG_INSTRUCTION)
+
+        self.backend.fail = False
+        self.now += self.manager.failure_ttl
+        self._generate(_request())
+        self.assertEqual(self.model.requests[2].config.cached_content, "cachedContents/0")
+
+    def test_request_is_resent_in_full_when_the_cached_prefix_fails(self):
+        self.model.fail_cached = True
+
+        responses = self._generate(_request())
+
+        self.assertEqual(len(responses), 1)
+        self.assertEqual(self.model.requests[-1].config.system_instruction, LONG_INSTRUCTION)
+        self.assertEqual(self.manager.stats()["prefixes"], 0)
+
+    def test_pinned_contents_are_part_of_the_prefix(self):
+        self.manager.pinned_contents = 1
+        document = genai_types.Content(role="user", parts=[genai_types.Part(text="document " * 1000)])
+        question = genai_types.Content(role="user", parts=[genai_types.Part(text="question")])
+
+        self._generate(_request(instruction=None, contents=[document, question]))
+
+        self.assertEqual(self.backend.prefixes["cachedContents/0"][2], [document])
+        self.assertEqual(self.model.requests[0].contents, [question])
+
+    def test_service_caches_the_agent_prefix(self):
+        service = ADKAgentService(agent=LlmAgent(model=self.model, name="convert_agent", instruction=LONG_INSTRUCTION),
+                                  context_cache=self.manager)
+
+        service.send_message("one")
+        service.send_message("two")
+
+        self.assertEqual(self.manager.stats()["hits"], 2)
+        self.assertEqual(len(self.backend.prefixes), 1)
+
+    def test_services_sharing_an_agent_use_their_own_context_cache(self):
+        agent = LlmAgent(model=self.model, name="convert_agent", instruction=LONG_INSTRUCTION)
+        uncached = ADKAgentService(agent=agent)
+        cached = ADKAgentService(agent=agent, context_cache=self.manager)
+
+        uncached.send_message("one")
+        cached.send_message("two")
+
+        self.assertEqual([sent.config.cached_content for sent in self.model.requests], [None, "cachedContents/0"])
+        self.assertEqual(self.manager.stats()["creations"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
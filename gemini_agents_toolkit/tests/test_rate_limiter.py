@@ -0,0 +1,114 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from google.adk.agents import LlmAgent
+from google.adk.models import LlmRequest
+from google.adk.sessions import InMemorySessionService
+from google.genai import types as genai_types
+
+from gemini_agents_toolkit.agent import ADKAgentService
+from gemini_agents_toolkit.llm import RateLimitedLlm
+from gemini_agents_toolkit.rate_limiter import RateLimiter, TokenBucket
+from gemini_agents_toolkit.tests.fakes import EchoLlm, FakeClock
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_reservations_queue_up_instead_of_failing(self):
+        clock = FakeClock()
+        bucket = TokenBucket(60, burst=2, clock=clock)
+
+        self.assertEqual(bucket.reserve(1), 0)
+        self.assertEqual(bucket.reserve(1), 0)
+        # one token a second, each new caller waits one second longer than the previous one
+        self.assertAlmostEqual(bucket.reserve(1), 1)
+        self.assertAlmostEqual(bucket.reserve(1), 2)
+
+        clock.now = 10
+        self.assertEqual(bucket.available, 2)
+
+    def test_refund(self):
+        bucket = TokenBucket(60, burst=1, clock=FakeClock())
+        bucket.reserve(1)
+        bucket.refund(1)
+        self.assertEqual(bucket.reserve(1), 0)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_models_without_quota_are_not_limited(self):
+        limiter = RateLimiter(clock=FakeClock())
+        self.assertEqual(limiter.reserve("model", 10 ** 9), 0)
+
+    def test_request_and_token_quotas_per_model(self):
+        limiter = RateLimiter(burst_seconds=1, clock=FakeClock())
+        limiter.set_quota("flash", rpm=60)
+        limiter.set_quota("pro", tpm=600)
+
+        self.assertEqual(limiter.reserve("flash", 1000), 0)
+        self.assertAlmostEqual(limiter.reserve("flash", 1000), 1)
+        # 10 tokens a second with a burst of 10
+        self.assertEqual(limiter.reserve("pro", 10), 0)
+        self.assertAlmostEqual(limiter.reserve("pro", 20), 2)
+        self.assertEqual(limiter.stats()["waits"], 2)
+
+    def test_default_quota_applies_to_every_model(self):
+        limiter = RateLimiter(default_rpm=60, burst_seconds=1, clock=FakeClock())
+        self.assertEqual(limiter.reserve("a", 1), 0)
+        self.assertEqual(limiter.reserve("b", 1), 0)
+        self.assertGreater(limiter.reserve("a", 1), 0)
+
+
+class TestRateLimitedLlm(unittest.TestCase):
+
+    def test_model_calls_wait_for_the_limiter(self):
+        clock = FakeClock()
+        limiter = RateLimiter(burst_seconds=1, clock=clock)
+        limiter.set_quota("echo", rpm=60, tpm=6000)
+        llm = RateLimitedLlm(model="echo", inner=EchoLlm(model="echo", answer=lambda llm_request: "x" * 400), limiter=limiter)
+        request = LlmRequest(contents=[genai_types.Content(role="user", parts=[genai_types.Part(text="hi")])])
+        sleeps = []
+
+        async def fake_sleep(seconds):
+            sleeps.append(seconds)
+
+        async def call():
+            return [response async for response in llm.generate_content_async(request)]
+
+        with patch("asyncio.sleep", fake_sleep):
+            for _ in range(3):
+                responses = asyncio.run(call())
+
+        self.assertEqual(len(responses), 1)
+        # the first request fits the burst, the next ones wait for the request bucket
+        self.assertEqual(sleeps, [1.0, 2.0])
+
+    def test_services_sharing_an_agent_wait_for_their_own_limiter(self):
+        class CountingRateLimiter(RateLimiter):
+            def __init__(self):
+                super().__init__()
+                self.acquired = 0
+
+            async def acquire(self, model, tokens):
+                self.acquired += 1
+
+        first, second = CountingRateLimiter(), CountingRateLimiter()
+        agent = LlmAgent(model=EchoLlm(model="echo"), name="shared_agent")
+        first_service = ADKAgentService(agent=agent, session_service=InMemorySessionService(), rate_limiter=first)
+        second_service = ADKAgentService(agent=agent, session_service=InMemorySessionService(), rate_limiter=second)
+
+        first_service.send_message("hi")
+        second_service.send_message("hi")
+        second_service.send_message("hi again")
+
+        self.assertEqual(first.acquired, 1)
+        self.assertEqual(second.acquired, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from google.adk.agents import LlmAgent
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService
+from google.genai import types as genai_types
+
+from gemini_agents_toolkit.agent import ADKAgentService
+from gemini_agents_toolkit.response_cache import ResponseCache
+
+
+def _text_event(text):
+    return Event(author="test_agent", content=genai_types.Content(role="model", parts=[genai_types.Part(text=text)]))
+
+
+def _function_call_event(name):
+    return Event(author="test_agent", content=genai_types.Content(
+        role="model", parts=[genai_types.Part(function_call=genai_types.FunctionCall(name=name, args={}))]))
+
+
+def send_email():
+    """send an email"""
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        patcher_runner = patch('gemini_agents_toolkit.agent.Runner')
+        self.mock_runner_instance = patcher_runner.start().return_value
+        self.addCleanup(patcher_runner.stop)
+        self.agent = LlmAgent(model="gemini-2.0-flash", name="test_agent", instruction="be nice", tools=[send_email])
+        self.session_service = InMemorySessionService()
+
+    def _service(self, cache):
+        return ADKAgentService(agent=self.agent, session_service=self.session_service, response_cache=cache)
+
+    def test_identical_turn_is_answered_from_cache(self):
+        cache = ResponseCache()
+        service = self._service(cache)
+        self.mock_runner_instance.run.side_effect = lambda **kwargs: iter([_text_event("cached answer")])
+
+        first_response, _ = service.send_message("hello")
+        second_response, second_events = service.send_message("hello", session_id="second")
+
+        self.assertEqual(first_response, second_response)
+        self.assertEqual(self.mock_runner_instance.run.call_count, 1)
+        self.assertEqual([e.author for e in second_events], ["user", "test_agent"])
+        stored = self.session_service.get_session(app_name=service.app_name, user_id="default_user", session_id="second")
+        self.assertEqual(len(stored.events), 2)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_different_message_or_agent_misses(self):
+        cache = ResponseCache()
+        self.mock_runner_instance.run.side_effect = lambda **kwargs: iter([_text_event("answer")])
+
+        self._service(cache).send_message("hello")
+        self._service(cache).send_message("hello again")
+        self.agent.instruction = "be rude"
+        self._service(cache).send_message("hello")
+
+        self.assertEqual(self.mock_runner_instance.run.call_count, 3)
+
+    def test_turns_calling_side_effecting_tools_are_not_cached(self):
+        cache = ResponseCache(side_effecting_tools=["send_email"])
+        service = self._service(cache)
+        self.mock_runner_instance.run.side_effect = lambda **kwargs: iter([_function_call_event("send_email"), _text_event("sent")])
+
+        service.send_message("email bob")
+        service.send_message("email bob")
+
+        self.assertEqual(self.mock_runner_instance.run.call_count, 2)
+        self.assertEqual(cache.stats()["bypasses"], 2)
+
+    def test_sqlite_tier_survives_new_cache_instances(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "responses.db")
+            self.mock_runner_instance.run.side_effect = lambda **kwargs: iter([_text_event("persisted")])
+            self._service(ResponseCache(sqlite_path=path)).send_message("hello")
+
+            cache = ResponseCache(sqlite_path=path)
+            response, _ = self._service(cache).send_message("hello")
+
+            self.assertEqual(response, "persisted")
+            self.assertEqual(self.mock_runner_instance.run.call_count, 1)
+            self.assertEqual(cache.stats()["disk_hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import Mock
+
+from gemini_agents_toolkit.cache_utils import TTLCache
+from gemini_agents_toolkit.runner_pool import RunnerPool
+from gemini_agents_toolkit.tests.fakes import FakeClock
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used_entry(self):
+        cache = TTLCache(capacity=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        cache = TTLCache(capacity=10, ttl=5, clock=clock)
+        cache.put("a", 1)
+        cache.put("b", 2, ttl=20)
+
+        clock.now = 10
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), 2)
+        stats = cache.stats()
+        self.assertEqual(stats["expirations"], 1)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_get_or_create_calls_factory_only_on_miss(self):
+        cache = TTLCache()
+        factory = Mock(return_value="value")
+
+        self.assertEqual(cache.get_or_create("key", factory), "value")
+        self.assertEqual(cache.get_or_create("key", factory), "value")
+        factory.assert_called_once()
+
+    def test_rejects_non_positive_capacity(self):
+        with self.assertRaises(ValueError):
+            TTLCache(capacity=0)
+
+
+class TestRunnerPool(unittest.TestCase):
+
+    def test_one_runner_per_agent_app_and_session_service(self):
+        pool = RunnerPool(capacity=10)
+        agent, other_agent, session_service = Mock(), Mock(), Mock()
+        factory = Mock(side_effect=lambda: Mock())
+
+        runner = pool.get_runner(agent=agent, app_name="app", session_service=session_service, factory=factory)
+        same_runner = pool.get_runner(agent=agent, app_name="app", session_service=session_service, factory=factory)
+        other_runner = pool.get_runner(agent=other_agent, app_name="app", session_service=session_service, factory=factory)
+
+        self.assertIs(runner, same_runner)
+        self.assertIsNot(runner, other_runner)
+        self.assertEqual(factory.call_count, 2)
+        self.assertEqual(pool.stats()["hits"], 1)
+
+    def test_pool_is_bounded(self):
+        pool = RunnerPool(capacity=2)
+        session_service = Mock()
+        for _ in range(5):
+            pool.get_runner(agent=Mock(), app_name="app", session_service=session_service, factory=Mock)
+
+        self.assertEqual(len(pool), 2)
+        self.assertEqual(pool.stats()["evictions"], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from gemini_agents_toolkit.session_locks import SessionLockTable
+
+
+class TestSessionLockTable(unittest.TestCase):
+
+    def test_same_key_is_served_in_arrival_order(self):
+        locks = SessionLockTable()
+        order = []
+        locks.acquire("s1")
+        threads = []
+        for i in range(5):
+            def worker(i=i):
+                with locks.hold("s1"):
+                    order.append(i)
+            thread = threading.Thread(target=worker)
+            thread.start()
+            threads.append(thread)
+            # make sure the waiters are enqueued in a known order
+            while len(locks._queues["s1"]) != i + 2:
+                time.sleep(0.001)
+        locks.release("s1")
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order, [0, 1, 2, 3, 4])
+        self.assertEqual(len(locks), 0)
+
+    def test_different_keys_do_not_contend(self):
+        locks = SessionLockTable()
+        acquired = threading.Event()
+        with locks.hold("s1"):
+            def worker():
+                with locks.hold("s2"):
+                    acquired.set()
+            thread = threading.Thread(target=worker)
+            thread.start()
+            self.assertTrue(acquired.wait(timeout=1))
+            thread.join()
+
+    def test_async_waiters_and_cancellation(self):
+        locks = SessionLockTable()
+        order = []
+
+        async def worker(name):
+            async with locks.hold_async("s1"):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        async def main():
+            await locks.acquire_async("s1")
+            first = asyncio.ensure_future(worker("first"))
+            cancelled = asyncio.ensure_future(worker("cancelled"))
+            last = asyncio.ensure_future(worker("last"))
+            await asyncio.sleep(0.01)
+            cancelled.cancel()
+            locks.release("s1")
+            await asyncio.gather(first, last, return_exceptions=True)
+
+        asyncio.run(main())
+
+        self.assertEqual(order, ["first", "last"])
+        self.assertEqual(len(locks), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+
+from google.adk.agents import LlmAgent
+from google.adk.events import Event, EventActions
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.genai import types as genai_types
+
+from gemini_agents_toolkit.agent import ADKAgentService
+from gemini_agents_toolkit.sessions import SqliteSessionService
+from gemini_agents_toolkit.tests.fakes import EchoLlm
+
+
+def _text_event(text, author="user"):
+    return Event(author=author, content=genai_types.Content(role="user", parts=[genai_types.Part(text=text)]))
+
+
+class TestSqliteSessionService(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "sessions.db")
+        self.service = SqliteSessionService(self.path)
+        self.addCleanup(self.service.close)
+
+    def test_create_get_list_delete(self):
+        session = self.service.create_session(app_name="app", user_id="u", session_id="s1", state={"k": 1})
+        self.assertEqual(session.id, "s1")
+        self.assertIsNone(self.service.get_session(app_name="app", user_id="other", session_id="s1"))
+
+        fetched = self.service.get_session(app_name="app", user_id="u", session_id="s1")
+        self.assertEqual(fetched.state, {"k": 1})
+        self.assertEqual(fetched.events, [])
+        self.assertEqual([s.id for s in self.service.list_sessions(app_name="app", user_id="u").sessions], ["s1"])
+
+        self.service.delete_session(app_name="app", user_id="u", session_id="s1")
+        self.assertIsNone(self.service.get_session(app_name="app", user_id="u", session_id="s1"))
+
+    def test_events_survive_reopening_and_recent_events_are_read_in_sql(self):
+        session = self.service.create_session(app_name="app", user_id="u", session_id="s1")
+        for i in range(5):
+            self.service.append_event(session=session, event=_text_event(f"msg {i}"))
+        self.assertEqual(len(session.events), 5)
+        self.service.close()
+
+        reopened = SqliteSessionService(self.path)
+        self.addCleanup(reopened.close)
+        full = reopened.get_session(app_name="app", user_id="u", session_id="s1")
+        recent = reopened.get_session(app_name="app", user_id="u", session_id="s1",
+                                      config=GetSessionConfig(num_recent_events=2))
+
+        self.assertEqual([e.content.parts[0].text for e in full.events], [f"msg {i}" for i in range(5)])
+        self.assertEqual([e.content.parts[0].text for e in recent.events], ["msg 3", "msg 4"])
+        self.assertEqual(len(reopened.list_events(app_name="app", user_id="u", session_id="s1").events), 5)
+
+    def test_replace_events_keeps_events_appended_by_other_processes(self):
+        session = self.service.create_session(app_name="app", user_id="u", session_id="s1", state={"k": 1})
+        events = [_text_event(f"msg {i}") for i in range(3)]
+        for event in events:
+            self.service.append_event(session=session, event=event)
+        # another process appends to the same file
+        other = SqliteSessionService(self.path)
+        self.addCleanup(other.close)
+        other.append_event(session=other.get_session(app_name="app", user_id="u", session_id="s1"),
+                           event=_text_event("from elsewhere"))
+
+        kept = self.service.replace_events(app_name="app", user_id="u", session_id="s1",
+                                           prefix_ids=[events[0].id, events[1].id], events=[_text_event("summary")])
+        stale = self.service.replace_events(app_name="app", user_id="u", session_id="s1",
+                                            prefix_ids=[events[0].id], events=[_text_event("summary")])
+
+        self.assertEqual(kept, 2)
+        self.assertIsNone(stale)
+        fetched = other.get_session(app_name="app", user_id="u", session_id="s1")
+        self.assertEqual([e.content.parts[0].text for e in fetched.events], ["summary", "msg 2", "from elsewhere"])
+        self.assertEqual(fetched.state, {"k": 1})
+
+    def test_state_deltas(self):
+        session = self.service.create_session(app_name="app", user_id="u", session_id="s1")
+        event = _text_event("hi")
+        event.actions = EventActions(state_delta={"topic": "weather", "app:lang": "en", "user:name": "Ann", "temp:x": 1})
+        self.service.append_event(session=session, event=event)
+
+        fetched = self.service.get_session(app_name="app", user_id="u", session_id="s1")
+        self.assertEqual(fetched.state, {"topic": "weather", "app:lang": "en", "user:name": "Ann"})
+        # app and user state are shared with the other sessions
+        other = self.service.create_session(app_name="app", user_id="u", session_id="s2")
+        self.assertEqual(other.state, {"app:lang": "en", "user:name": "Ann"})
+
+    def test_partial_events_are_not_stored(self):
+        session = self.service.create_session(app_name="app", user_id="u", session_id="s1")
+        event = _text_event("par")
+        event.partial = True
+        self.service.append_event(session=session, event=event)
+        self.assertEqual(self.service.get_session(app_name="app", user_id="u", session_id="s1").events, [])
+
+    def test_drop_in_for_adk_agent_service(self):
+        agent = LlmAgent(model=EchoLlm(model="echo", answer=lambda llm_request: f"seen {len(llm_request.contents)}"), name="echo_agent")
+        service = ADKAgentService(agent=agent, session_service=self.service, events_per_session=2)
+
+        service.send_message("one", session_id="s1")
+        service.send_message("two", session_id="s1")
+        response, _ = service.send_message("three", session_id="s1")
+
+        # the runner loads the whole history from the database
+        self.assertEqual(response, "seen 5")
+        self.assertEqual(len(self.service.list_events(app_name=service.app_name, user_id="default_user",
+                                                      session_id="s1").events), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
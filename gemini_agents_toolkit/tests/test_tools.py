@@ -0,0 +1,216 @@
+import threading
+import time
+import unittest
+
+from google.adk.agents import LlmAgent
+from google.adk.models import LlmResponse
+from google.genai import types as genai_types
+
+from gemini_agents_toolkit.agent import ADKAgentService
+from gemini_agents_toolkit.tools import ToolCache, ToolConcurrency, memoize_tool
+from gemini_agents_toolkit.tests.fakes import ScriptedLlm
+
+
+def _calls_response(*calls):
+    return LlmResponse(content=genai_types.Content(role="model", parts=[
+        genai_types.Part(function_call=genai_types.FunctionCall(name=name, args=args)) for name, args in calls]))
+
+
+def _text_response(text):
+    return LlmResponse(content=genai_types.Content(role="model", parts=[genai_types.Part(text=text)]))
+
+
+class TestToolConcurrency(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def _slow_tool(self, name):
+        def tool(city: str) -> str:
+            with self.lock:
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+            time.sleep(0.2)
+            with self.lock:
+                self.running -= 1
+            return f"{name} {city}"
+        tool.__name__ = name
+        tool.__doc__ = f"returns the {name} in the city"
+        return tool
+
+    def _service(self, concurrency, *tools, earlier_services=0):
+        calls = [(tool.__name__, {"city": city}) for tool in tools for city in ("Paris", "Rome")]
+        llm = ScriptedLlm(model="scripted", responses=[_calls_response(*calls), _text_response("done")])
+        agent = LlmAgent(model=llm, name="tool_agent", tools=list(tools))
+        self.addCleanup(concurrency.shutdown)
+        for _ in range(earlier_services):
+            ADKAgentService(agent=agent)
+        return ADKAgentService(agent=agent, tool_concurrency=concurrency)
+
+    def test_agent_shared_with_earlier_services(self):
+        concurrency = ToolConcurrency()
+        service = self._service(concurrency, self._slow_tool("weather"), earlier_services=2)
+
+        self.assertEqual(service._concurrent_tool_agents, {"tool_agent"})
+        service.send_message("weather")
+        self.assertEqual(concurrency.prefetched, 2)
+
+    def test_calls_of_one_response_run_concurrently(self):
+        concurrency = ToolConcurrency()
+        service = self._service(concurrency, self._slow_tool("weather"), self._slow_tool("time"))
+
+        started = time.monotonic()
+        response, history = service.send_message("weather and time")
+
+        self.assertEqual(response, "done")
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertEqual(self.max_running, 4)
+        self.assertEqual(concurrency.prefetched, 4)
+        responses = [r.response for event in history for r in event.get_function_responses()]
+        self.assertEqual(responses, [{"result": "weather Paris"}, {"result": "weather Rome"},
+                                     {"result": "time Paris"}, {"result": "time Rome"}])
+
+    def test_per_tool_limit(self):
+        concurrency = ToolConcurrency(per_tool_limits={"weather": 1})
+        service = self._service(concurrency, self._slow_tool("weather"))
+
+        service.send_message("weather")
+
+        self.assertEqual(self.max_running, 1)
+
+    def test_serialized_tools_run_in_the_runner(self):
+        concurrency = ToolConcurrency(serialized_tools=["weather"])
+        service = self._service(concurrency, self._slow_tool("weather"), self._slow_tool("time"))
+
+        response, _ = service.send_message("weather and time")
+
+        self.assertEqual(response, "done")
+        self.assertEqual(self.max_running, 1)
+        self.assertEqual(concurrency.prefetched, 0)
+
+    def test_user_before_tool_callback_keeps_calls_sequential(self):
+        seen = []
+        concurrency = ToolConcurrency()
+        weather = self._slow_tool("weather")
+        llm = ScriptedLlm(model="scripted", responses=[
+            _calls_response(("weather", {"city": "Paris"}), ("weather", {"city": "Rome"})), _text_response("done")])
+        agent = LlmAgent(model=llm, name="tool_agent", tools=[weather],
+                         before_tool_callback=lambda tool, args, tool_context: seen.append(args["city"]))
+        self.addCleanup(concurrency.shutdown)
+        service = ADKAgentService(agent=agent, tool_concurrency=concurrency)
+
+        service.send_message("weather")
+
+        self.assertEqual(seen, ["Paris", "Rome"])
+        self.assertEqual(self.max_running, 1)
+
+
+class TestMemoizeTool(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.calls = []
+        self.cache = ToolCache()
+
+    def _price_tool(self, **options):
+        @memoize_tool(cache=self.cache, **options)
+        def get_price(ticker: str, currency: str = "USD") -> dict:
+            """returns the price of the ticker"""
+            self.calls.append((ticker, currency))
+            return {"price": len(self.calls)}
+        return get_price
+
+    def test_same_arguments_are_served_from_the_cache(self):
+        get_price = self._price_tool()
+
+        self.assertEqual(get_price("GOOG"), {"price": 1})
+        self.assertEqual(get_price(ticker="GOOG", currency="USD"), {"price": 1})
+        self.assertEqual(get_price("GOOG", "EUR"), {"price": 2})
+
+        self.assertEqual(self.calls, [("GOOG", "USD"), ("GOOG", "EUR")])
+        stats = self.cache.stats()[get_price.qualified_name]
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+        self.assertEqual(get_price.__name__, "get_price")
+        self.assertEqual(get_price.__doc__, "returns the price of the ticker")
+
+    def test_ttl_capacity_and_invalidation(self):
+        get_price = self._price_tool(ttl=10, capacity=2)
+        get_price.cache._clock = lambda: self.now
+
+        get_price("A")
+        self.now = 11
+        get_price("A")
+        self.assertEqual(len(self.calls), 2)
+
+        get_price("B")
+        get_price("C")
+        self.assertEqual(self.cache.stats()[get_price.qualified_name]["evictions"], 1)
+
+        self.cache.invalidate("get_price", ticker="C")
+        get_price("C")
+        get_price("B")
+        self.assertEqual(self.calls[-1:], [("C", "USD")])
+
+        get_price.invalidate()
+        get_price("B")
+        self.assertEqual(self.calls[-1], ("B", "USD"))
+
+    def test_tools_with_the_same_name_in_different_modules(self):
+        first = self._price_tool()
+
+        def get_price(ticker: str) -> dict:
+            """returns the price of the ticker in another market"""
+            self.calls.append((ticker, "other"))
+            return {"price": len(self.calls)}
+        get_price.__module__ = "other_module"
+        get_price.__qualname__ = first.__qualname__
+        second = memoize_tool(get_price, cache=self.cache)
+
+        first("GOOG")
+        second("GOOG")
+
+        self.assertEqual(sorted(self.cache.stats()), sorted([first.qualified_name, second.qualified_name]))
+        self.assertNotEqual(first.qualified_name, second.qualified_name)
+        self.assertEqual(self.cache.stats()[first.qualified_name]["misses"], 1)
+        # a bare name reaches the tools of that name in every module
+        self.cache.invalidate("get_price")
+        first("GOOG")
+        second("GOOG")
+        self.assertEqual(len(self.calls), 4)
+
+    def test_exceptions_are_not_cached(self):
+        attempts = []
+
+        @memoize_tool(cache=self.cache)
+        def flaky(path: str) -> str:
+            """reads the path"""
+            attempts.append(path)
+            if len(attempts) == 1:
+                raise OSError("busy")
+            return "content"
+
+        with self.assertRaises(OSError):
+            flaky("a.txt")
+        self.assertEqual(flaky("a.txt"), "content")
+        self.assertEqual(flaky("a.txt"), "content")
+        self.assertEqual(len(attempts), 2)
+
+    def test_agent_calls_the_memoized_tool_once(self):
+        get_price = self._price_tool()
+        llm = ScriptedLlm(model="scripted", responses=[
+            _calls_response(("get_price", {"ticker": "GOOG"})), _text_response("first"),
+            _calls_response(("get_price", {"ticker": "GOOG"})), _text_response("second")])
+        service = ADKAgentService(agent=LlmAgent(model=llm, name="price_agent", tools=[get_price]))
+
+        service.send_message("price?")
+        _, history = service.send_message("price again?")
+
+        self.assertEqual(self.calls, [("GOOG", "USD")])
+        responses = [r.response for event in history for r in event.get_function_responses()]
+        self.assertEqual(responses, [{"price": 1}])
+
+
+if __name__ == "__main__":
+    unittest.main()
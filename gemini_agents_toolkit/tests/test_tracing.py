@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+
+from google.adk.agents import LlmAgent
+from google.adk.sessions import InMemorySessionService
+from google.genai import types as genai_types
+
+from gemini_agents_toolkit.agent import ADKAgentService
+from gemini_agents_toolkit.tracing import Tracer
+from gemini_agents_toolkit.tests.fakes import ScriptedLlm, model_response
+
+
+def get_weather(city: str) -> str:
+    """returns the weather in the city"""
+    return f"sunny in {city}"
+
+
+def _weather_service(tracer):
+    llm = ScriptedLlm(model="scripted", responses=[
+        model_response(genai_types.Part(function_call=genai_types.FunctionCall(name="get_weather", args={"city": "Paris"}))),
+        model_response(genai_types.Part(text="It is sunny")),
+    ])
+    agent = LlmAgent(model=llm, name="weather_agent", tools=[get_weather])
+    return ADKAgentService(agent=agent, session_service=InMemorySessionService(), tracer=tracer)
+
+
+class TestTracer(unittest.TestCase):
+
+    def test_turn_is_traced_with_model_tool_and_session_spans(self):
+        tracer = Tracer()
+        service = _weather_service(tracer)
+
+        response, _ = service.send_message("weather in Paris?", session_id="s1")
+
+        self.assertEqual(response, "It is sunny")
+        self.assertEqual(len(tracer.traces), 1)
+        trace = tracer.traces[0]
+        names = [span.name for span in trace.spans]
+        self.assertEqual(trace.root.name, "send_message")
+        self.assertEqual(names.count("model_call"), 2)
+        self.assertEqual(names.count("tool_call"), 1)
+        self.assertIn("maybe_create_chat_session", names)
+        self.assertIn("session.append_event", names)
+        self.assertTrue(all(span.end is not None for span in trace.spans))
+        # the session lookup is nested under maybe_create_chat_session
+        parent = next(span for span in trace.spans if span.name == "maybe_create_chat_session")
+        session_get = next(span for span in trace.spans if span.name == "session.get")
+        self.assertEqual(session_get.parent_id, parent.span_id)
+
+    def test_chrome_trace_export(self):
+        tracer = Tracer()
+        _weather_service(tracer).send_message("weather in Paris?")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.json")
+            tracer.export_chrome_trace(path)
+            with open(path, encoding="utf-8") as f:
+                exported = json.load(f)
+
+        events = exported["traceEvents"]
+        self.assertEqual(len(events), len(tracer.traces[0].spans))
+        root = next(event for event in events if event["name"] == "send_message")
+        self.assertEqual(root["ph"], "X")
+        self.assertTrue(all(root["ts"] <= event["ts"] and event["dur"] >= 0 for event in events))
+
+    def test_sampling_and_slow_turn_filter(self):
+        tracer = Tracer(sample_rate=0.0)
+        _weather_service(tracer).send_message("weather in Paris?")
+        self.assertEqual(len(tracer.traces), 0)
+
+        tracer = Tracer(keep_slower_than=3600)
+        _weather_service(tracer).send_message("weather in Paris?")
+        self.assertEqual(len(tracer.traces), 0)
+
+        with self.assertRaises(ValueError):
+            Tracer(sample_rate=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import asyncio
+import gc
+import time
+import weakref
+import unittest
+
+from google.adk.agents import LlmAgent
+from google.adk.models import BaseLlm, LlmResponse
+from google.genai import types as genai_types
+
+from gemini_agents_toolkit.agent import (ADKAgentService, TokenBudgetExceededException, TooManyFunctionCallsException,
+                                         TurnTimeoutException, _should_replay_turn)
+
+
+class LoopingLlm(BaseLlm):
+    """Never gives a final answer, asks for one more lookup on every call"""
+    calls: int = 0
+    lookups_per_call: int = 1
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.calls += 1
+        parts = [genai_types.Part(text=f"step {self.calls}")]
+        parts += [genai_types.Part(function_call=genai_types.FunctionCall(name="lookup", args={"step": self.calls}))
+                  for _ in range(self.lookups_per_call)]
+        yield LlmResponse(content=genai_types.Content(role="model", parts=parts))
+
+
+class TestTurnLimits(unittest.TestCase):
+
+    def setUp(self):
+        self.lookups = []
+        self.delay = 0
+
+        def lookup(step: int) -> str:
+            """looks something up"""
+            time.sleep(self.delay)
+            self.lookups.append(step)
+            return "nothing found"
+
+        self.llm = LoopingLlm(model="looping")
+        self.agent = LlmAgent(model=self.llm, name="looping_agent", tools=[lookup])
+
+    def test_function_call_limit_counts_function_calls(self):
+        self.llm.lookups_per_call = 2
+        service = ADKAgentService(agent=self.agent, function_call_limit_per_chat=5)
+
+        with self.assertRaises(TooManyFunctionCallsException) as raised:
+            service.send_message("find it")
+
+        # the third response asks for calls 5 and 6, the 6th is refused and the agent stops
+        self.assertEqual(len(self.lookups), 5)
+        self.assertEqual(self.llm.calls, 3)
+        self.assertEqual(raised.exception.partial_response, "step 1\nstep 2\nstep 3")
+        self.assertEqual(raised.exception.call_history[0].author, "user")
+        self.assertFalse(_should_replay_turn(raised.exception))
+
+    def test_timeout_stops_the_runner(self):
+        self.delay = 0.1
+        service = ADKAgentService(agent=self.agent, turn_timeout=10)
+
+        started = time.monotonic()
+        with self.assertRaises(TurnTimeoutException):
+            service.send_message("find it", timeout=0.25)
+        elapsed = time.monotonic() - started
+        calls = self.llm.calls
+
+        self.assertLess(elapsed, 1)
+        time.sleep(0.3)
+        # nothing keeps running in the background after the turn returned
+        self.assertEqual(self.llm.calls, calls)
+        self.assertLessEqual(len(self.lookups), 3)
+
+    def test_token_budget(self):
+        service = ADKAgentService(agent=self.agent, max_tokens_per_turn=200)
+
+        with self.assertRaises(TokenBudgetExceededException) as raised:
+            service.send_message("find it")
+
+        self.assertGreater(self.llm.calls, 1)
+        self.assertIn("allowed: 200", str(raised.exception))
+
+    def test_limits_of_the_async_api(self):
+        service = ADKAgentService(agent=self.agent)
+
+        with self.assertRaises(TooManyFunctionCallsException) as raised:
+            asyncio.run(service.send_message_async("find it", max_function_calls=2))
+
+        self.assertEqual(self.lookups, [1, 2])
+        self.assertTrue(raised.exception.partial_response.startswith("step 1"))
+
+
+class TestAgentCallbacks(unittest.TestCase):
+
+    def test_services_sharing_an_agent_are_freed(self):
+        user_calls = []
+
+        def before_model_callback(*, callback_context, llm_request):
+            user_calls.append(callback_context.agent_name)
+            return None
+
+        def lookup(step: int) -> str:
+            """looks something up"""
+            return "nothing found"
+
+        agent = LlmAgent(model=LoopingLlm(model="looping"), name="looping_agent", tools=[lookup],
+                         before_model_callback=before_model_callback)
+        gone = weakref.ref(ADKAgentService(agent=agent))
+        installed = agent.before_model_callback
+        services = [ADKAgentService(agent=agent) for _ in range(3)]
+        gc.collect()
+
+        self.assertIsNone(gone())
+        # the callbacks are installed once, later services only register with them
+        self.assertIs(agent.before_model_callback, installed)
+        self.assertEqual(len(agent.before_model_callback.agent_callbacks.services), 3)
+
+        with self.assertRaises(TooManyFunctionCallsException):
+            services[-1].send_message("find it", max_function_calls=0)
+        self.assertEqual(user_calls, ["looping_agent"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,197 @@
+"""Helpers for the tools (functions) agents call"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from gemini_agents_toolkit.cache_utils import TTLCache
+
+_MISSING = object()
+
+
+def _tool_function(tool):
+    """The plain function behind an ADK FunctionTool, None for tools that can not run outside the runner"""
+    func = getattr(tool, "func", None)
+    if func is None or getattr(tool, "is_long_running", False) or not callable(func):
+        return None
+    # tools that take the tool context read or change the session, they stay with the runner
+    if "tool_context" in inspect.signature(func).parameters:
+        return None
+    return func
+
+
+def _call_function(func, args):
+    if inspect.iscoroutinefunction(func):
+        result = asyncio.run(func(**args))
+    else:
+        result = func(**args)
+    # the runner treats a falsy callback result as "run the tool", so empty results are wrapped
+    return result if result else {"result": result}
+
+
+class ToolConcurrency:
+    """Runs the function calls of one model response at the same time instead of one after another.
+
+    ADK executes the function calls of a response sequentially. When the model asks for several calls at
+    once, ADKAgentService starts all of them on this pool as soon as the response arrives, the runner then
+    picks up the results in its usual order, so the calls take as long as the slowest one.
+
+    per_tool_limits caps the number of concurrent calls of a tool (by name, across all turns). Calls of
+    serialized_tools are never run concurrently: they and every call after them in the response are left
+    to the runner. Tools taking tool_context always run in the runner.
+    """
+
+    def __init__(self, *, max_workers=8, per_tool_limits=None, serialized_tools=None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool_call")
+        self.serialized_tools = set(serialized_tools or [])
+        self._limits = {name: threading.BoundedSemaphore(limit) for name, limit in (per_tool_limits or {}).items()}
+        self._lock = threading.Lock()
+        self.prefetched = 0
+
+    def _run(self, name, func, args):
+        limit = self._limits.get(name)
+        if limit is None:
+            return _call_function(func, args)
+        with limit:
+            return _call_function(func, args)
+
+    def prefetch(self, function_calls, tools_dict):
+        """Starts the calls that can run concurrently, returns {function call id: Future}.
+
+        Calls without an id get one (the runner keeps ids that are already set).
+        """
+        runnable = []
+        for function_call in function_calls:
+            if function_call.name in self.serialized_tools:
+                break
+            func = _tool_function(tools_dict.get(function_call.name))
+            if func is not None:
+                runnable.append((function_call, func))
+        if len(runnable) < 2:
+            return {}
+
+        futures = {}
+        for function_call, func in runnable:
+            if not function_call.id:
+                function_call.id = f"adk-{uuid.uuid4()}"
+            logging.debug(f"Starting tool call '{function_call.name}' ({function_call.id}) concurrently")
+            futures[function_call.id] = self._executor.submit(self._run, function_call.name, func, dict(function_call.args or {}))
+        with self._lock:
+            self.prefetched += len(futures)
+        return futures
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class ToolCache:
+    """Registry of the result caches of memoized tools, one size-bounded TTLCache per tool.
+
+    Tools are registered under their qualified name (module.qualname), so tools with the same name from
+    different modules keep separate caches.
+    """
+
+    def __init__(self, *, capacity=256, ttl=None):
+        self.capacity = capacity
+        self.ttl = ttl
+        # qualified tool name -> (function computing the key from the call arguments, TTLCache)
+        self._tools = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, key_function, *, capacity=None, ttl=None):
+        """Creates an empty cache for the tool, a tool registered again under the same qualified name gets a new cache"""
+        cache = TTLCache(capacity=capacity or self.capacity, ttl=ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._tools[name] = (key_function, cache)
+        return cache
+
+    def invalidate(self, name=None, /, **args):
+        """Drops cached results: of the call with args, of every call of the tool, or of all tools.
+
+        name is the qualified name of a tool or a bare tool name, which matches the tools of that name in every module.
+        """
+        with self._lock:
+            if name is None:
+                tools = dict(self._tools)
+            else:
+                tools = {qualified: tool for qualified, tool in self._tools.items()
+                         if qualified == name or qualified.rsplit(".", 1)[-1] == name}
+        for key_function, cache in tools.values():
+            if args:
+                cache.pop(key_function((), args))
+            else:
+                cache.clear()
+
+    def stats(self):
+        """Returns the hit/miss/eviction counters per qualified tool name"""
+        with self._lock:
+            return {name: cache.stats() for name, (_, cache) in self._tools.items()}
+
+
+default_tool_cache = ToolCache()
+
+
+def _call_key_function(func):
+    signature = inspect.signature(func)
+
+    def call_key(args, kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = {name: value for name, value in bound.arguments.items() if name != "tool_context"}
+        payload = json.dumps(arguments, sort_keys=True, default=repr)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return call_key
+
+
+def memoize_tool(func=None, *, ttl=None, capacity=None, cache=None):
+    """Caches the results of a deterministic tool by its arguments.
+
+    Usable as @memoize_tool or @memoize_tool(ttl=60, capacity=100). Results are stored in cache (a ToolCache,
+    default_tool_cache by default) under the tool's qualified name (wrapper.qualified_name), calls with the same arguments within ttl seconds
+    return the stored result instead of running the tool, exceptions are never cached. The wrapper keeps the
+    name, signature and docstring of the tool, so agents see the same function declaration. tool_context is
+    not part of the key. Stale entries can be dropped with wrapper.invalidate(**args) or cache.invalidate(name).
+    """
+    if func is None:
+        return lambda f: memoize_tool(f, ttl=ttl, capacity=capacity, cache=cache)
+
+    registry = cache if cache is not None else default_tool_cache
+    name = func.__name__
+    qualified_name = f"{func.__module__}.{func.__qualname__}"
+    call_key = _call_key_function(func)
+    results = registry.register(qualified_name, call_key, capacity=capacity, ttl=ttl)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = call_key(args, kwargs)
+            result = results.get(key, _MISSING)
+            if result is _MISSING:
+                result = await func(*args, **kwargs)
+                results.put(key, result)
+            else:
+                logging.debug(f"Tool '{name}' answered from the cache")
+            return result
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = call_key(args, kwargs)
+            result = results.get(key, _MISSING)
+            if result is _MISSING:
+                # not under the cache lock, concurrent calls of slow tools must not wait for each other
+                result = func(*args, **kwargs)
+                results.put(key, result)
+            else:
+                logging.debug(f"Tool '{name}' answered from the cache")
+            return result
+
+    wrapper.cache = results
+    wrapper.qualified_name = qualified_name
+    wrapper.invalidate = lambda **args: registry.invalidate(qualified_name, **args) if args else results.clear()
+    return wrapper
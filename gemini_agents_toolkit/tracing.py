@@ -0,0 +1,181 @@
+"""Span tracing of ADKAgentService turns with export to the Chrome trace event format"""
+
+import contextlib
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from google.adk.sessions import BaseSessionService
+
+
+class Span:
+    """A timed operation inside a trace, times are time.perf_counter() seconds"""
+
+    def __init__(self, span_id, name, parent_id, attributes):
+        self.span_id = span_id
+        self.name = name
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.thread_id = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def finish(self, **attributes):
+        self.attributes.update(attributes)
+        if self.end is None:
+            self.end = time.perf_counter()
+
+
+class Trace:
+    """The spans of one turn, the first span (root) covers the whole turn"""
+
+    def __init__(self, trace_id, name, attributes):
+        self.trace_id = trace_id
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # per thread stack of open spans entered with span(), new spans are nested under its top
+        self._local = threading.local()
+        self.root = Span(0, name, None, attributes)
+        self.spans = [self.root]
+
+    def _current_parent_id(self):
+        stack = getattr(self._local, "stack", None)
+        return stack[-1].span_id if stack else self.root.span_id
+
+    def start_span(self, name, **attributes):
+        """Starts a span that the caller has to finish(), for operations that start and end in different callbacks"""
+        with self._lock:
+            span = Span(next(self._ids), name, self._current_parent_id(), attributes)
+            self.spans.append(span)
+        return span
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        span = self.start_span(name, **attributes)
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            stack.pop()
+            span.finish()
+
+    @property
+    def duration(self):
+        return self.root.duration
+
+
+class Tracer:
+    """Traces a sample_rate fraction of the turns and keeps the last max_traces finished ones.
+
+    With keep_slower_than (seconds) only turns that took longer are kept, which makes it cheap to leave
+    tracing on and collect just the slow turns. export_chrome_trace() writes the kept traces as Chrome
+    trace event JSON, to be opened in chrome://tracing or https://ui.perfetto.dev as a flame chart.
+    """
+
+    def __init__(self, sample_rate=1.0, *, max_traces=100, keep_slower_than=None):
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0 and 1")
+        self.sample_rate = sample_rate
+        self.keep_slower_than = keep_slower_than
+        self.traces = deque(maxlen=max_traces)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start_trace(self, name, **attributes):
+        """Returns a new Trace, or None when the turn is not sampled"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return None
+        with self._lock:
+            trace_id = next(self._ids)
+        return Trace(trace_id, name, attributes)
+
+    def finish_trace(self, trace, **attributes):
+        trace.root.finish(**attributes)
+        if self.keep_slower_than is not None and trace.duration <= self.keep_slower_than:
+            return
+        with self._lock:
+            self.traces.append(trace)
+
+    def to_chrome_trace(self, traces=None):
+        """Returns the traces as a Chrome trace event dict, every trace is drawn on its own row"""
+        with self._lock:
+            traces = list(self.traces) if traces is None else list(traces)
+        pid = os.getpid()
+        trace_events = []
+        for trace in traces:
+            for span in trace.spans:
+                if span.end is None:
+                    continue
+                trace_events.append({
+                    "name": span.name,
+                    "cat": "gemini_agents",
+                    "ph": "X",
+                    "ts": span.start * 1e6,
+                    "dur": (span.end - span.start) * 1e6,
+                    "pid": pid,
+                    "tid": trace.trace_id,
+                    "args": {**span.attributes, "span_id": span.span_id, "parent_id": span.parent_id,
+                             "thread_id": span.thread_id},
+                })
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path, traces=None):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(traces), f, default=str)
+
+    def clear(self):
+        with self._lock:
+            self.traces.clear()
+
+
+class TracedSessionService(BaseSessionService):
+    """Wraps a session service and records its calls as spans of the trace of the session's turn.
+
+    find_trace(user_id, session_id) returns the trace of the turn in progress or None.
+    """
+
+    def __init__(self, inner, find_trace):
+        self.inner = inner
+        self._find_trace = find_trace
+
+    def _span(self, name, user_id, session_id):
+        trace = self._find_trace(user_id, session_id)
+        return trace.span(name) if trace else contextlib.nullcontext()
+
+    def create_session(self, *, app_name, user_id, state=None, session_id=None):
+        with self._span("session.create", user_id, session_id):
+            return self.inner.create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+
+    def get_session(self, *, app_name, user_id, session_id, config=None):
+        with self._span("session.get", user_id, session_id):
+            return self.inner.get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+
+    def list_sessions(self, *, app_name, user_id):
+        return self.inner.list_sessions(app_name=app_name, user_id=user_id)
+
+    def delete_session(self, *, app_name, user_id, session_id):
+        return self.inner.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    def list_events(self, *, app_name, user_id, session_id):
+        with self._span("session.list_events", user_id, session_id):
+            return self.inner.list_events(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    def close_session(self, *, session):
+        return self.inner.close_session(session=session)
+
+    def append_event(self, session, event):
+        with self._span("session.append_event", session.user_id, session.id):
+            return self.inner.append_event(session=session, event=event)
+
+    def __getattr__(self, name):
+        # anything specific to the wrapped service (e.g. InMemorySessionService.sessions)
+        return getattr(self.inner, name)